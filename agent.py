@@ -7,7 +7,10 @@ Module with a class Agent used to modelize an agent in a multi-agent system.
 @authors: Nathan Etourneau, Paul Flagel
 """
 
-import random
+from categories import EMPTY, misclassify
+from memory import Memory
+from population import decision_tables
+from rng import BlockRandom
 
 
 class Agent:
@@ -17,7 +20,10 @@ class Agent:
     purpose.
     """
 
-    def __init__(self, key, kplus, kminus, memory_buffer_size=15, error_rate=0):
+    __slots__ = ("memory", "n_categories", "key", "kplus", "kminus",
+                 "memory_buffer_size", "object", "error_rate", "rng", "tables")
+
+    def __init__(self, key, kplus, kminus, memory_buffer_size=15, error_rate=0, rng=None, n_categories=2):
         """Instanciates an Agent object
 
         Args:
@@ -32,14 +38,26 @@ class Agent:
 
             - error_rate (float, optional): Error rate in the object class 
             recognition, as described in the paper. Defaults to 0.
+
+            - rng (random.Random, optional): The random stream of the agent.
+            Defaults to None, for a new stream seeded from the OS entropy.
+
+            - n_categories (int, optional): The number of categories of
+            objects. Defaults to 2.
         """
-        self.memory = ""
+        self.memory = Memory(memory_buffer_size, n_categories)
+        self.n_categories = n_categories
         self.key = key
         self.kplus = kplus
         self.kminus = kminus
         self.memory_buffer_size = memory_buffer_size
         self.object = None
         self.error_rate = error_rate
+        self.rng = rng if rng is not None else BlockRandom()
+
+        # Probabilities of picking and dropping, shared by the agents with the
+        # same parameters
+        self.tables = decision_tables(kplus, kminus, memory_buffer_size, error_rate)
 
     def perception(self, environment):
         """Request to the environment the empty (without an agent) cells positions
@@ -49,7 +67,7 @@ class Agent:
             - environment (Environment): The Environment object.
 
         Returns:
-            - List[tuple[int, int]]: The list of the directions leading to an 
+            - tuple[tuple[int, int], ...]: The directions leading to an
             empty cell
         """
         return environment.empty_cells(self.key)
@@ -70,95 +88,131 @@ class Agent:
         Args:
             - environment (Environment)): The Environment object.
 
-            - empty_cells (List[tuple[int, int]]): The list of the empty cells 
-            around this current Agent instance.
+            - empty_cells (Sequence[tuple[int, int]]): The empty cells around
+            this current Agent instance.
         """
 
         # In the article, the first step is to move randomly
 
         # If there are available cells around, we choose one and we go there
         if empty_cells:
-            destination = random.choice(empty_cells)
+            destination = self.rng.choice(empty_cells)
             environment.move(self.key, destination)
 
         # We keep in mind the current cell category
         cell = environment.get_agent_cell(self.key)
-        to_push = cell.object.category if cell.object is not None else '0'
-
-        # If the error rate is enabled, there can be an error of classification
-        if self.error_rate > 0:
-            if random.random() <= self.error_rate:
-                if to_push == 'A':
-                    to_push = 'B'
-                elif to_push == 'B':
-                    to_push = 'A'
+        to_push = self.observe(cell)
 
         # If an object is bound :
         if self.object:
             # If the cell is empty and the random event of dropping occurs :
             if cell.object is None and self.will_drop(self.object.category):
+                self.drop(environment, cell)
 
-                # The object is freed from the agent, and bound to the cell
-                cell.object = self.object
+        # If no object is bound, there is an object on the cell and the random event of picking it occurs :
+        elif cell.object is not None and self.will_pick(cell.object.category):
+            self.pick(environment, cell)
 
-                # No object is left to the agent
-                self.object = None
+        # We update the memory with what was in the cell before we picked/dropped anything
+        self.update_memory(to_push)
 
-                # The parent of the object becomes the cell, no longer the agent
-                cell.object.parent = cell
+    def observe(self, cell):
+        """Returns the category of the object of the given cell, as seen by
+        the agent : if the error rate is enabled, there can be an error of
+        classification, for one of the other categories drawn uniformly.
 
-                # We update object position (when bound, it is None)
-                cell.object.position = cell.position
+        Args:
+            - cell (Cell): The cell of the agent.
 
-        # If no object is bound, there is an object on the cell and the random event of picking it occurs :
-        elif cell.object is not None and self.will_pick(cell.object.category):
+        Returns:
+            int: The category code seen, EMPTY if there is no object on the
+            cell.
+        """
+        category = cell.object.category if cell.object is not None else EMPTY
 
-            # The object is freed from the cell, and bound to the agent
-            self.object = cell.object
+        if self.error_rate > 0:
+            if self.rng.random() <= self.error_rate and category != EMPTY:
+                category = misclassify(
+                    category, self.n_categories, self.rng.random)
+        return category
 
-            # There is no object left in the cell
-            cell.object = None
+    def drop(self, environment, cell):
+        """Drops the bound object on the given (empty) cell.
 
-            # Until it is dropped, the position is not defined
-            self.object.position = None
+        Args:
+            - environment (Environment): The Environment object, notified of
+            the drop.
 
-            # The parent of the object becomes the agent, it's no longer the cell
-            self.object.parent = self
+            - cell (Cell): The cell of the agent.
+        """
+        # The object is freed from the agent, and bound to the cell
+        cell.object = self.object
 
-        # We update the memory with what was in the cell before we picked/dropped anything
-        self.update_memory(to_push)
+        # No object is left to the agent
+        self.object = None
+
+        # The object lies on the grid again, it has no longer a parent
+        cell.object.parent = None
+
+        # We update object position (when bound, it is None)
+        cell.object.position = cell.position
+
+        environment.on_drop(self.key, cell.object.key,
+                            cell.object.category, cell.position)
+
+    def pick(self, environment, cell):
+        """Picks the object of the given cell.
+
+        Args:
+            - environment (Environment): The Environment object, notified of
+            the pick.
+
+            - cell (Cell): The cell of the agent.
+        """
+        # The object is freed from the cell, and bound to the agent
+        self.object = cell.object
+
+        # There is no object left in the cell
+        cell.object = None
+
+        # Until it is dropped, the position is not defined
+        self.object.position = None
+
+        # The parent of the object becomes the agent, it's no longer the cell
+        self.object.parent = self.key
+
+        environment.on_pick(self.key, self.object.key,
+                            self.object.category, cell.position)
 
     def update_memory(self, category):
-        """Updates the memory with the new category observed (it can be '0' 
+        """Updates the memory with the new category observed (it can be EMPTY 
         if there is no object on a cell)
 
         Args:
-            category (str or None): The category of the last object seen.
+            category (int or None): The category code of the last object seen.
         """
         if category is None:
-            category = '0'
+            category = EMPTY
 
-        if len(self.memory) >= self.memory_buffer_size:
-            self.memory = category + self.memory[:self.memory_buffer_size-1]
-        else:
-            self.memory = category + self.memory
+        self.memory.push(category)
 
     def get_frequency(self, category):
         """Computes the frequency of appearance of the given category in the 
         memory, and takes into account the error rate.
 
         Args:
-            - category (str): The object category one wants to compute the 
+            - category (int): The object category code one wants to compute the 
             frequency.
 
         Returns:
             float: The frequency in the memory of the given object category.
         """
-        if self.memory:
+        length = len(self.memory)
+        if length:
             count = self.memory.count(category)
-            count_empty = self.memory.count('0')
-            count_other = len(self.memory) - count - count_empty
-            return (count + self.error_rate * count_other) / len(self.memory)
+            count_empty = self.memory.count(EMPTY)
+            count_other = length - count - count_empty
+            return (count + self.error_rate * count_other) / length
         return 0
 
     def will_pick(self, category):
@@ -166,27 +220,23 @@ class Agent:
         given the memory state.
 
         Args:
-            - category (str): The object category one wants to know whether to 
+            - category (int): The object category code one wants to know whether to 
             pick it or not
 
         Returns:
             bool: True if the Agent object picks the object, False otherwise.
         """
-        f = self.get_frequency(category)
-        p = (self.kplus / (self.kplus + f)) ** 2
-        return random.random() <= p
+        return self.rng.random() <= self.tables.pick(self.memory, category)
 
     def will_drop(self, category):
         """Returns a boolean whether to drop an object of the given category, 
         given the memory state.
 
         Args:
-            - category (str): The object category one wants to know whether to 
+            - category (int): The object category code one wants to know whether to 
             drop it or not
 
         Returns:
             bool: True if the Agent object drops the object, False otherwise.
         """
-        f = self.get_frequency(category)
-        p = (f / (self.kminus + f)) ** 2
-        return random.random() <= p
+        return self.rng.random() <= self.tables.drop(self.memory, category)
@@ -16,6 +16,8 @@ main purpose is to store the position of the agents without the position being
 an attribute of the agent. It has two attributes : agent : the agent whose data
 is being stored, and position : the position of the same agent."""
 
+    __slots__ = ("agent", "position")
+
     def __init__(self, agent, position):
         """Instanciates an AgentData object
 
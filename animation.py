@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline export of a run as an animation (GIF, or any video format of ffmpeg),
+from a recording of the run (see recorder.py) : its keyframes, captured every
+K rounds while the run goes on, or any rounds when the picks and drops were
+also recorded. The frames are drawn in a process pool, with the
+non-interactive Agg backend of matplotlib, then assembled in a single file :
+the run itself never waits for a plot.
+
+Usage : python animation.py RECORDING_DIR sorting.gif --fps 10 --workers 8
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from recorder import Replay
+from snapshot import MAX_BINS, RASTER_THRESHOLD, Snapshot, draw_raster
+
+# Frames per second of the animation
+FPS = 10
+
+# Size of the frames, in inches, and their resolution
+FIGSIZE = (8, 6)
+DPI = 100
+
+# Name of the frame files, in the order of the animation
+FRAME_NAME = "frame_{:06d}.png"
+
+
+def render_frame(replay, round, path, figsize=FIGSIZE, dpi=DPI, raster_threshold=RASTER_THRESHOLD, max_bins=MAX_BINS):
+    """Draws the layout of a recorded run at a given round in a PNG file, as
+    update_matplotlib_plot does, without pyplot, so that it does not depend
+    on the backend of the process.
+
+    Args:
+        - replay (Replay): The recording.
+
+        - round (int): The round.
+
+        - path (str): The path of the PNG file.
+
+        - figsize (tuple[float, float], optional): Size of the frame, in
+        inches. Defaults to FIGSIZE.
+
+        - dpi (int, optional): Resolution of the frame. Defaults to DPI.
+
+        - raster_threshold (int, optional): Number of objects above which the
+        layout is drawn as a raster. Defaults to RASTER_THRESHOLD.
+
+        - max_bins (int, optional): Largest number of bins along a side of the
+        raster. Defaults to MAX_BINS.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    snapshot = Snapshot.of(replay.frame(round))
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+
+    if len(snapshot) <= raster_threshold:
+        for i, category in enumerate(snapshot.categories):
+            rows, cols = snapshot.coordinates(category)
+            ax.scatter(cols, rows, s=4, linewidths=0, color=f"C{i % 10}")
+    else:
+        draw_raster(ax, snapshot, max_bins)
+
+    ax.set_xlim(-1, replay.M)
+    ax.set_ylim(-1, replay.N)
+    ax.set_title(f"Round n°{round}")
+    figure.savefig(path)
+
+
+def render_frames(directory, frames, frames_dir, figsize=FIGSIZE, dpi=DPI):
+    """Draws a batch of frames, in a worker of the pool.
+
+    Args:
+        - directory (str): The directory of the recording.
+
+        - frames (List[tuple[int, int]]): The index in the animation and the
+        round of each frame.
+
+        - frames_dir (str): The directory of the PNG files.
+
+        - figsize (tuple[float, float], optional): Size of the frames.
+        Defaults to FIGSIZE.
+
+        - dpi (int, optional): Resolution of the frames. Defaults to DPI.
+    """
+    replay = Replay(directory)
+    for index, round in frames:
+        render_frame(replay, round,
+                     os.path.join(frames_dir, FRAME_NAME.format(index)), figsize, dpi)
+
+
+def frame_rounds(replay, every=None):
+    """Returns the rounds of the frames of an animation.
+
+    Args:
+        - replay (Replay): The recording.
+
+        - every (int, optional): Number of rounds between two frames, which
+        needs the picks and drops to be recorded. Defaults to None, for the
+        rounds of the keyframes.
+
+    Returns:
+        List[int]: The rounds.
+
+    Raises:
+        - ValueError: every is given, and the picks and drops were not
+        recorded.
+    """
+    if every is not None and not replay.has_events:
+        raise ValueError("The recording only holds keyframes (a capture) : "
+                         "the frames can only be drawn at the keyframes, without every")
+    if every is None:
+        return replay.index["round"].tolist()
+    return list(range(replay.first_round, replay.last_round + 1, every))
+
+
+def assemble(frames_dir, n_frames, output, fps=FPS):
+    """Assembles the PNG frames into an animation. A GIF is written with
+    Pillow, any other format with ffmpeg.
+
+    Args:
+        - frames_dir (str): The directory of the PNG files.
+
+        - n_frames (int): Number of frames.
+
+        - output (str): The path of the animation file.
+
+        - fps (int, optional): Frames per second. Defaults to FPS.
+
+    Raises:
+        - ValueError: There is no frame.
+
+        - RuntimeError: ffmpeg is needed and not installed.
+    """
+    if not n_frames:
+        raise ValueError(f"No frame to write to {output}")
+    paths = [os.path.join(frames_dir, FRAME_NAME.format(i)) for i in range(n_frames)]
+
+    if output.lower().endswith(".gif"):
+        from PIL import Image
+
+        first, *others = [Image.open(path) for path in paths]
+        first.save(output, save_all=True, append_images=others,
+                   duration=int(1000 / fps), loop=0)
+        return
+
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError(f"ffmpeg is needed to write {output}, or export a .gif")
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-framerate", str(fps),
+                    "-i", os.path.join(frames_dir, FRAME_NAME.replace("{:06d}", "%06d")),
+                    "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                    output], check=True)
+
+
+def export(directory, output, fps=FPS, every=None, workers=None, figsize=FIGSIZE, dpi=DPI):
+    """Exports a recorded run as an animation, the frames being drawn in a
+    process pool.
+
+    Args:
+        - directory (str): The directory of the recording.
+
+        - output (str): The path of the animation file, a GIF or any video
+        format of ffmpeg.
+
+        - fps (int, optional): Frames per second. Defaults to FPS.
+
+        - every (int, optional): Number of rounds between two frames, see
+        frame_rounds. Defaults to None, for one frame per keyframe.
+
+        - workers (int, optional): Number of processes. Defaults to None, for
+        the number of CPUs.
+
+        - figsize (tuple[float, float], optional): Size of the frames.
+        Defaults to FIGSIZE.
+
+        - dpi (int, optional): Resolution of the frames. Defaults to DPI.
+
+    Returns:
+        int: The number of frames.
+    """
+    rounds = frame_rounds(Replay(directory), every)
+    workers = min(workers or os.cpu_count(), len(rounds)) or 1
+
+    # Contiguous batches, one per worker, so that each worker seeks forward
+    frames = list(enumerate(rounds))
+    batches = [batch.tolist() for batch in np.array_split(np.array(frames).reshape(-1, 2), workers)]
+
+    with tempfile.TemporaryDirectory() as frames_dir:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_frames, directory, batch, frames_dir, figsize, dpi)
+                       for batch in batches if batch]
+            for future in futures:
+                future.result()
+        assemble(frames_dir, len(rounds), output, fps)
+    return len(rounds)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("recording", help="Directory of the recording")
+    parser.add_argument("output", help="Animation file, .gif or a video format of ffmpeg")
+    parser.add_argument("--fps", type=int, default=FPS)
+    parser.add_argument("--every", type=int, default=None,
+                        help="Rounds between two frames (needs the events), "
+                        "one frame per keyframe by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dpi", type=int, default=DPI)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    n_frames = export(args.recording, args.output, args.fps, args.every,
+                      args.workers, dpi=args.dpi)
+    print(f"{n_frames} frames written to {args.output}")
@@ -14,12 +14,15 @@ the Altair plotting library.
 @authors: Nathan Etourneau, Paul Flagel
 """
 
-import random
-
 import streamlit as st
 
+from controller import RunController
 from environment import Environment
+from recorder import Recorder, Replay
+from snapshot import Snapshot
+from vectorized import VectorizedEnvironment
 from visualization import update_altair_plot
+from worker import STOP_TIMEOUT, SimulationWorker
 
 # Sidebar
 
@@ -45,9 +48,25 @@ N_ROUNDS = st.sidebar.number_input(
     label="Number of rounds ?", min_value=1, max_value=1000000000, value=1000000)
 ERROR_RATE = st.sidebar.slider(
     label="Error rate", min_value=0., max_value=1., value=0., step=0.05)
+ENGINE = st.sidebar.selectbox(
+    label="Simulation engine ?", options=["python", "numpy"])
+SEED = st.sidebar.number_input(
+    label="Seed ?", min_value=0, max_value=2**32 - 1, value=0)
+STOP_ON_CONVERGENCE = st.sidebar.checkbox(
+    label="Stop once the sorting has converged ?", value=True)
+
+RECORD_DIR = st.sidebar.text_input(
+    label="Record the run in directory (optional)", value="")
 
 start = st.sidebar.button("Run")
-_ = st.sidebar.button("Stop")
+pause = st.sidebar.button("Pause")
+resume = st.sidebar.button("Resume")
+stop = st.sidebar.button("Stop")
+
+st.sidebar.header("Replay")
+
+REPLAY_DIR = st.sidebar.text_input(
+    label="Recorded run directory", value="")
 
 # Layout
 
@@ -67,30 +86,87 @@ st.header('Graph of the objects')
 plot_placeholder = st.empty()
 
 
-def main(n_rounds, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size, error_rate):
-    env = Environment(N, M, na, nb, n_agents, kplus, kminus,
-                      memory_buffer_size, error_rate)
+def main(n_rounds, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size, error_rate, engine, seed, record_dir, stop_on_convergence):
+    """Starts the run in a background worker, kept in the session state so
+    that it survives the reruns of the script."""
+    engine_class = VectorizedEnvironment if engine == "numpy" else Environment
+    env = engine_class(N, M, na, nb, n_agents, kplus, kminus,
+                       memory_buffer_size, error_rate, seed)
+
+    after_round, at_end = [], []
+    if record_dir:
+        recorder = Recorder(record_dir, env)
+        env.observers.append(recorder)
+        after_round.append(recorder.update)
+        at_end.append(recorder.close)
+
+    # Index of the objects on the grid, for the plots
+    env.observers.append(Snapshot(env.N, env.M, env.objects.values()))
+
+    # Frames follow the changes of the layout, and the run stops once the
+    # sorting has converged
+    controller = RunController() if stop_on_convergence else None
+    if controller:
+        env.observers.append(controller)
+
+    worker = SimulationWorker(env, n_rounds, update_altair_plot,
+                              after_round, at_end, controller=controller)
+    worker.start()
+    st.session_state["worker"] = worker
+
 
-    # Loop
-    keys = list(env.agents.keys())
+def follow(worker):
+    """Shows the frames of the worker until the end of the run. A click on a
+    button reruns the script, which interrupts this loop."""
+    for round, fig in worker.frames_until_done():
+        if worker.controller and worker.controller.converged:
+            state = " (converged)"
+        else:
+            state = " (paused)" if worker.paused else ""
+        status.text(f'Round n°{round}/{worker.n_rounds}{state}')
+        round_progress_bar.progress(round/worker.n_rounds)
+        plot_placeholder.altair_chart(fig, use_container_width=True)
 
-    for round in range(1, n_rounds + 1):
-        status.text(f'Round n°{round}/{N_ROUNDS}')
-        round_progress_bar.progress(round/N_ROUNDS)
+    if worker.error:
+        st.error(f"The run failed : {worker.error!r}")
 
-        # Shuffle the agents to mimic the fact that the movement is erratic
-        random.shuffle(keys)
 
-        for key in keys:
-            agent = env.agents[key].agent
-            empty_cells = agent.perception(env)
-            agent.action(env, empty_cells)
+def replay(directory):
+    """Scrubs through a recorded run with a slider, without re-simulating it."""
+    recording = Replay(directory)
+    round = st.slider(label="Round", min_value=recording.first_round,
+                      max_value=recording.last_round, value=recording.last_round)
+    status.text(f'Round n°{round}/{recording.last_round}')
+    fig = update_altair_plot(recording.frame(round))
+    plot_placeholder.altair_chart(fig, use_container_width=True)
 
-        if round % 50 == 0 or round == 1:
-            fig = update_altair_plot(env)
-            plot_placeholder.altair_chart(fig, use_container_width=True)
 
+worker = st.session_state.get("worker")
 
 if start:
-    main(N_ROUNDS, N, M, NA, NB, N_AGENTS, KPLUS,
-         KMINUS, MEMORY_BUFFER_SIZE, ERROR_RATE)
+    # The previous run must be over before the next one starts, so that two
+    # threads never run at the same time
+    if worker:
+        worker.stop()
+        worker.join(STOP_TIMEOUT)
+    if worker and worker.is_alive():
+        st.error(f"The previous run did not stop within {STOP_TIMEOUT} s, "
+                 "try again in a moment")
+    else:
+        main(N_ROUNDS, N, M, NA, NB, N_AGENTS, KPLUS,
+             KMINUS, MEMORY_BUFFER_SIZE, ERROR_RATE, ENGINE, SEED, RECORD_DIR,
+             STOP_ON_CONVERGENCE)
+        follow(st.session_state["worker"])
+elif worker and worker.is_alive():
+    if stop:
+        worker.stop()
+    elif pause:
+        worker.pause()
+    elif resume:
+        worker.resume()
+    follow(worker)
+elif REPLAY_DIR:
+    replay(REPLAY_DIR)
+elif worker:
+    # The last frame of the finished run
+    follow(worker)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite of the simulation engines : the reference object model
+(Environment) and the NumPy engine (VectorizedEnvironment). Every combination
+of the given grid sizes, agent counts, object densities, memory sizes and error
+rates is run under a fixed seed, and its number of rounds per second and the
+time spent in each phase of a round are measured.
+
+The results can be saved as a JSON baseline, and are compared with the last
+baseline saved : a case whose number of rounds per second dropped by more than
+the tolerance is flagged as a regression, and the script exits with an error.
+
+Usage : python benchmark.py --rounds 200 --save
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+from environment import Environment
+from instrumentation import Instrumentation
+from sweep import expand_grid
+from vectorized import VectorizedEnvironment
+
+ENGINES = {"python": Environment, "numpy": VectorizedEnvironment}
+
+# Benchmarked parameters, with their type and default values
+MATRIX = {
+    "size": (str, ["100x100", "200x300"]),
+    "n_agents": (int, [50, 200]),
+    "density": (float, [0.02, 0.1]),
+    "memory_buffer_size": (int, [10, 50]),
+    "error_rate": (float, [0., 0.1]),
+}
+
+KPLUS = 0.1
+KMINUS = 0.3
+SEED = 0
+
+BASELINE_DIR = "benchmarks"
+TOLERANCE = 0.1
+
+# The best of several runs is kept, as it is the least affected by the noise
+# of the machine
+REPEATS = 3
+
+
+def make_env(engine, case):
+    """Instanciates the environment of a benchmark case.
+
+    Args:
+        - engine (str): The name of the engine.
+
+        - case (dict): The benchmarked parameters.
+
+    Returns:
+        Environment or VectorizedEnvironment: The environment.
+    """
+    N, M = map(int, case["size"].split("x"))
+    n_objects = int(case["density"] * N * M)
+    return ENGINES[engine](N, M, n_objects // 2, n_objects - n_objects // 2,
+                           case["n_agents"], KPLUS, KMINUS,
+                           case["memory_buffer_size"], case["error_rate"], SEED)
+
+
+def rounds_per_second(env, n_rounds):
+    """Runs n_rounds rounds of the given environment and returns the number
+    of rounds per second.
+
+    Args:
+        - env (Environment or VectorizedEnvironment): The environment to run.
+
+        - n_rounds (int): Number of rounds to run.
+
+    Returns:
+        float: The number of rounds per second.
+    """
+    start = time.perf_counter()
+    for _ in range(n_rounds):
+        env.step()
+    return n_rounds / (time.perf_counter() - start)
+
+
+def phase_times(env, n_rounds):
+    """Runs n_rounds rounds of the given instrumented environment, and returns
+    the time spent in each phase.
+
+    Args:
+        - env (Environment or VectorizedEnvironment): The environment to run.
+
+        - n_rounds (int): Number of rounds to run.
+
+    Returns:
+        dict[str, float]: The seconds spent in each phase, and in the rest of
+        the rounds as "other".
+    """
+    instrumentation = Instrumentation(every=n_rounds)
+    instrumentation.attach(env)
+    for _ in range(n_rounds):
+        env.step()
+        instrumentation.update(env)
+    return instrumentation.records[-1]["phases"]
+
+
+def run_case(engine, case, n_rounds, repeats=REPEATS):
+    """Benchmarks one case : the number of rounds per second is measured
+    without the phase timers, whose overhead would bias it, as the best of
+    several runs, then the phases are timed on another run of the same seed.
+
+    Returns:
+        dict: The engine, the case, the rounds per second and the share of
+        the time spent in each phase.
+    """
+    rate = max(rounds_per_second(make_env(engine, case), n_rounds)
+               for _ in range(repeats))
+    times = phase_times(make_env(engine, case), n_rounds)
+    total = sum(times.values())
+    return {"engine": engine, **case, "rounds_per_second": rate,
+            "phases": {phase: time_ / total for phase, time_ in times.items()}}
+
+
+def case_id(result):
+    """Returns the identifier of the case of a result, to match it with the
+    baseline."""
+    return "|".join(f"{name}={result[name]}" for name in ["engine"] + list(MATRIX))
+
+
+def latest_baseline(directory):
+    """Returns the path of the last baseline saved in a directory, None if
+    there is none."""
+    baselines = sorted(glob.glob(os.path.join(directory, "baseline_*.json")))
+    return baselines[-1] if baselines else None
+
+
+def compare(results, baseline, tolerance):
+    """Compares the results with a baseline.
+
+    Args:
+        - results (List[dict]): The results of the benchmark.
+
+        - baseline (List[dict]): The results of the baseline.
+
+        - tolerance (float): The relative drop of rounds per second above
+        which a case is a regression.
+
+    Returns:
+        List[tuple[str, float, float]]: The id, the baseline and the current
+        rounds per second of the regressed cases.
+    """
+    reference = {case_id(result): result["rounds_per_second"] for result in baseline}
+    regressions = []
+    for result in results:
+        before = reference.get(case_id(result))
+        if before and result["rounds_per_second"] < (1 - tolerance) * before:
+            regressions.append((case_id(result), before, result["rounds_per_second"]))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    for name, (type_, default) in MATRIX.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name,
+                            type=type_, nargs="+", default=default)
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES),
+                        default=list(ENGINES))
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--baseline-dir", default=BASELINE_DIR)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Relative slowdown flagged as a regression")
+    parser.add_argument("--save", action="store_true",
+                        help="Save the results as the new baseline")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    cases = expand_grid({name: getattr(args, name) for name in MATRIX})
+
+    results = []
+    for engine in args.engines:
+        for case in cases:
+            result = run_case(engine, case, args.rounds, args.repeats)
+            results.append(result)
+            phases = ", ".join(f"{phase} {share:.0%}"
+                               for phase, share in result["phases"].items())
+            print(f"{case_id(result)} : "
+                  f"{result['rounds_per_second']:10.1f} rounds/s ({phases})")
+
+    regressions = []
+    baseline_path = latest_baseline(args.baseline_dir)
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        print(f"\nCompared with {baseline_path} : "
+              f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        for case, before, after in regressions:
+            print(f"  {case} : {before:.1f} -> {after:.1f} rounds/s "
+                  f"({after / before - 1:+.0%})")
+
+    if args.save:
+        os.makedirs(args.baseline_dir, exist_ok=True)
+        path = os.path.join(args.baseline_dir, time.strftime(
+            "baseline_%Y%m%d-%H%M%S.json"))
+        with open(path, "w") as file:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "machine": platform.platform(),
+                       "python": platform.python_version(),
+                       "rounds": args.rounds, "repeats": args.repeats,
+                       "seed": SEED,
+                       "results": results}, file, indent=1)
+        print(f"Baseline saved to {path}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
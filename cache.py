@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a ResultCache class, a local store of the results of the
+simulation runs, so that a parameter study never runs twice the same
+configuration. A run is identified by a hash of its engine, its parameters,
+its seed, its number of rounds and the version of the simulation code (a hash
+of its source files), so that a change of the code invalidates the results.
+
+The cache is a directory with :
+    - index.sqlite : one row per run, with its key, the key of its prefix
+    (the same run without the number of rounds), its final metrics, the size
+    of its files and the time of its last access,
+
+    - <key>/state.npz : the final state of the run, a checkpoint of the
+    environment, optional,
+
+    - <key>/snapshots.npz : the positions of the objects every so many rounds,
+    optional.
+
+A run longer than a cached run of the same prefix resumes from its final
+state, instead of starting over : the checkpoints continue the runs
+bit-for-bit, so that the result is the same. The cache is bounded in size,
+the least recently used runs being evicted first.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+from functools import lru_cache
+
+import numpy as np
+
+from environment import Environment
+from vectorized import VectorizedEnvironment
+
+# Default directory and size of the cache
+CACHE_DIR = ".cache/runs"
+MAX_BYTES = 2 * 1024 ** 3
+
+ENGINES = {"python": Environment, "numpy": VectorizedEnvironment}
+
+# Source files of the simulation, whose hash is the code version
+SOURCES = ["agent.py", "categories.py", "cell.py", "environment.py", "grid.py",
+           "memory.py", "metrics.py", "object_.py", "occupancy.py",
+           "population.py", "rng.py", "vectorized.py"]
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    prefix TEXT NOT NULL,
+    n_rounds INTEGER NOT NULL,
+    config TEXT NOT NULL,
+    metrics TEXT NOT NULL,
+    has_state INTEGER NOT NULL,
+    has_snapshots INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL)"""
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Returns the version of the simulation code, a hash of its sources."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCES:
+        with open(os.path.join(directory, name), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def run_key(engine, config, seed, n_rounds=None, snapshot_every=None):
+    """Returns the key of a run, a hash of its description. The runs storing
+    snapshots have other keys than the runs without, and than the runs storing
+    them at another cadence.
+
+    Args:
+        - engine (str): "python" or "numpy".
+
+        - config (dict): The parameters of the environment.
+
+        - seed (int): The seed of the run.
+
+        - n_rounds (int, optional): The number of rounds. Defaults to None,
+        for the key of the prefix, shared by the runs of any length.
+
+        - snapshot_every (int, optional): Number of rounds between two stored
+        snapshots. Defaults to None, for no snapshot.
+
+    Returns:
+        str: The key.
+    """
+    description = {"engine": engine, "config": config, "seed": seed,
+                   "version": code_version()}
+    if n_rounds is not None:
+        description["n_rounds"] = n_rounds
+    if snapshot_every:
+        description["snapshot_every"] = snapshot_every
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def final_metrics(env):
+    """Returns the metrics stored for a run, from its environment."""
+    return {"round": env.round,
+            "sortedness": env.metrics.same_category_fraction,
+            "n_clusters": env.metrics.n_clusters,
+            "mean_cluster_size": env.metrics.mean_cluster_size}
+
+
+class ResultCache:
+    """A ResultCache class, the store of the runs already simulated, indexed
+    in a SQLite database. It can be shared by several processes."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        """Instanciates a ResultCache object
+
+        Args:
+            - directory (str, optional): The directory of the cache, created
+            if needed. Defaults to CACHE_DIR.
+
+            - max_bytes (int, optional): The size above which the least
+            recently used runs are evicted. Defaults to MAX_BYTES.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        with closing(self.connect()) as db, db:
+            db.execute(SCHEMA)
+
+    def connect(self):
+        """Returns a connection to the index, waiting for the other processes
+        writing to it."""
+        return sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=60)
+
+    def path(self, key, name):
+        return os.path.join(self.directory, key, name)
+
+    def entry(self, row):
+        """Returns the dict of a row of the index."""
+        key, n_rounds, metrics, has_state, has_snapshots = row
+        return {"key": key, "n_rounds": n_rounds, "metrics": json.loads(metrics),
+                "state": self.path(key, "state.npz") if has_state else None,
+                "snapshots": self.path(key, "snapshots.npz") if has_snapshots else None}
+
+    def lookup(self, query, parameters):
+        """Returns the entry of the first row of the query, None if there is
+        none, and marks it as used."""
+        with closing(self.connect()) as db, db:
+            row = db.execute("SELECT key, n_rounds, metrics, has_state, has_snapshots "
+                             "FROM runs " + query, parameters).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE runs SET last_access = ? WHERE key = ?",
+                       (time.time(), row[0]))
+        return self.entry(row)
+
+    def get(self, engine, config, seed, n_rounds, snapshot_every=None):
+        """Returns the cached result of a run, None if it is not cached.
+
+        Args:
+            - engine (str): "python" or "numpy".
+
+            - config (dict): The parameters of the environment.
+
+            - seed (int): The seed of the run.
+
+            - n_rounds (int): The number of rounds.
+
+            - snapshot_every (int, optional): The cadence of the snapshots of
+            the run. Defaults to None, for a run without snapshots.
+
+        Returns:
+            dict or None: The key, the number of rounds, the final metrics,
+            and the paths of the state and snapshots files (None if they were
+            not kept).
+        """
+        return self.lookup("WHERE key = ?",
+                           (run_key(engine, config, seed, n_rounds, snapshot_every),))
+
+    def longest_prefix(self, engine, config, seed, n_rounds, snapshot_every=None):
+        """Returns the cached run of the same prefix with the most rounds, up
+        to n_rounds, whose final state was kept, None if there is none. The
+        prefix includes the cadence of the snapshots, so that a resumed run
+        continues snapshots of the same cadence, taken from the first round."""
+        return self.lookup("WHERE prefix = ? AND n_rounds <= ? AND has_state "
+                           "ORDER BY n_rounds DESC",
+                           (run_key(engine, config, seed, None, snapshot_every), n_rounds))
+
+    def run(self, engine, config, seed, n_rounds, keep_state=True, snapshot_every=None):
+        """Returns the result of a run, from the cache if it was already
+        simulated, otherwise by simulating it, from the final state of the
+        longest cached run of the same prefix if any, and storing it. Runs
+        without a seed are not reproducible, and never cached.
+
+        Args:
+            - engine (str): "python" or "numpy".
+
+            - config (dict): The parameters of the environment.
+
+            - seed (int): The seed of the run.
+
+            - n_rounds (int): The number of rounds.
+
+            - keep_state (bool, optional): Whether the final state is stored,
+            for the final layout and for resuming longer runs. Defaults to
+            True.
+
+            - snapshot_every (int, optional): Number of rounds between two
+            stored snapshots of the object positions. Defaults to None, for
+            no snapshot.
+
+        Returns:
+            dict: The entry of the run, as returned by get, with a "cached"
+            item telling whether it was found in the cache.
+        """
+        cached = self.get(engine, config, seed, n_rounds, snapshot_every) if seed is not None else None
+        if cached:
+            return {**cached, "cached": True}
+
+        prefix = self.longest_prefix(engine, config, seed, n_rounds, snapshot_every) \
+            if seed is not None else None
+        if prefix:
+            env = ENGINES[engine].load(prefix["state"])
+            snapshots = load_snapshots(prefix["snapshots"]) if prefix["snapshots"] else ([], [])
+        else:
+            env = ENGINES[engine](**config, seed=seed)
+            snapshots = ([], [])
+
+        rounds, positions = snapshots
+        while env.round < n_rounds:
+            env.step()
+            if snapshot_every and env.round % snapshot_every == 0:
+                rounds.append(env.round)
+                positions.append(object_positions(env))
+
+        if seed is None:
+            return {"key": None, "n_rounds": n_rounds, "metrics": final_metrics(env),
+                    "state": None, "snapshots": None, "cached": False}
+        entry = self.store(engine, config, seed, env, keep_state,
+                           (rounds, positions) if snapshot_every else None, snapshot_every)
+        return {**entry, "cached": False}
+
+    def store(self, engine, config, seed, env, keep_state=True, snapshots=None, snapshot_every=None):
+        """Stores the result of a run, then evicts the least recently used
+        runs if the cache is too large.
+
+        Args:
+            - engine (str): "python" or "numpy".
+
+            - config (dict): The parameters of the environment.
+
+            - seed (int): The seed of the run.
+
+            - env (Environment or VectorizedEnvironment): The environment at
+            the end of the run, its round being the number of rounds.
+
+            - keep_state (bool, optional): Whether the final state is stored.
+            Defaults to True.
+
+            - snapshots (tuple[List[int], List[np.ndarray]], optional): The
+            rounds of the snapshots and the positions of the objects at each
+            one. Defaults to None.
+
+            - snapshot_every (int, optional): The cadence of the snapshots,
+            part of the key of the run. Defaults to None.
+
+        Returns:
+            dict: The entry of the run, as returned by get.
+        """
+        key = run_key(engine, config, seed, env.round, snapshot_every)
+
+        # The files are written aside, then moved in place, so that a reader
+        # never sees a partial entry
+        staging = os.path.join(self.directory, f"{key}.{os.getpid()}.tmp")
+        os.makedirs(staging, exist_ok=True)
+        if keep_state:
+            env.save(os.path.join(staging, "state.npz"))
+        if snapshots and snapshots[0]:
+            rounds, positions = snapshots
+            with open(os.path.join(staging, "snapshots.npz"), "wb") as file:
+                np.savez_compressed(file, rounds=np.array(rounds),
+                                    positions=np.stack(positions))
+
+        # Another process may store the same run at the same time : the first
+        # entry moved in place is kept, the runs being the same
+        dest = os.path.join(self.directory, key)
+        if os.path.isdir(dest):
+            shutil.rmtree(staging, ignore_errors=True)
+        else:
+            try:
+                os.replace(staging, dest)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+
+        # The entry describes the files in place, whichever process wrote them
+        size = sum(os.path.getsize(os.path.join(dest, name))
+                   for name in os.listdir(dest))
+        keep_state = os.path.exists(os.path.join(dest, "state.npz"))
+        has_snapshots = os.path.exists(os.path.join(dest, "snapshots.npz"))
+
+        metrics = json.dumps(final_metrics(env))
+        with closing(self.connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key, run_key(engine, config, seed, None, snapshot_every), env.round,
+                        json.dumps({"engine": engine, "config": config, "seed": seed,
+                                    "snapshot_every": snapshot_every}),
+                        metrics, keep_state, has_snapshots, size, time.time()))
+
+        self.evict(keep=key)
+        return self.entry((key, env.round, metrics, keep_state, has_snapshots))
+
+    def load(self, entry):
+        """Returns the environment at the end of a cached run, from its final
+        state.
+
+        Args:
+            - entry (dict): The entry of the run, with a state.
+
+        Returns:
+            Environment or VectorizedEnvironment: The environment.
+        """
+        with closing(self.connect()) as db:
+            engine = json.loads(db.execute("SELECT config FROM runs WHERE key = ?",
+                                           (entry["key"],)).fetchone()[0])["engine"]
+        return ENGINES[engine].load(entry["state"])
+
+    def size(self):
+        """Returns the number of bytes of the files of the cache."""
+        with closing(self.connect()) as db:
+            return db.execute("SELECT COALESCE(SUM(size), 0) FROM runs").fetchone()[0]
+
+    def evict(self, keep=None):
+        """Removes the least recently used runs until the cache fits in
+        max_bytes, and the staging directories left by the interrupted stores
+        (of the processes no longer running).
+
+        Args:
+            - keep (str, optional): The key of a run never evicted, such as
+            the one just stored. Defaults to None.
+        """
+        with closing(self.connect()) as db, db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM runs").fetchone()[0]
+            rows = db.execute("SELECT key, size FROM runs ORDER BY last_access").fetchall()
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                db.execute("DELETE FROM runs WHERE key = ?", (key,))
+                shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+                total -= size
+
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp") and not running(int(name.split(".")[-2])):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+def running(pid):
+    """Returns whether a process is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def object_positions(env):
+    """Returns the positions of the objects of an environment, by key, (-1, -1)
+    for the carried ones, as an (n_objects, 2) array."""
+    objects = env.objects
+    return np.array([objects[key].position or (-1, -1) for key in sorted(objects)],
+                    dtype=np.int32).reshape(-1, 2)
+
+
+def load_snapshots(path):
+    """Returns the rounds and the object positions of a snapshots file, as
+    written by ResultCache.store.
+
+    Args:
+        - path (str): The path of the snapshots file.
+
+    Returns:
+        tuple[List[int], List[np.ndarray]]: The rounds, and the (n_objects, 2)
+        positions at each round.
+    """
+    with np.load(path) as data:
+        return data["rounds"].tolist(), list(data["positions"])
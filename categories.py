@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with the helpers for the categories of the objects. A category is a
+small integer code, from 1 to the number of categories, 0 meaning that there
+is no object (an empty cell, in a memory). Its name, for display, is a letter
+for the first 26 categories ('A', 'B', ...), then a pair of letters ('AA',
+'AB', ...), as spreadsheet columns.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+# The code of an empty cell
+EMPTY = 0
+
+
+def category_name(code):
+    """Returns the name of a category.
+
+    Args:
+        - code (int): The code of the category.
+
+    Returns:
+        str: Its name, '0' for EMPTY.
+    """
+    if code == EMPTY:
+        return '0'
+    name = ""
+    while code:
+        code, letter = divmod(code - 1, 26)
+        name = chr(ord('A') + letter) + name
+    return name
+
+
+def category_code(name):
+    """Returns the code of a category from its name, the inverse of
+    category_name.
+
+    Args:
+        - name (str): The name of the category.
+
+    Returns:
+        int: Its code.
+    """
+    if name == '0':
+        return EMPTY
+    code = 0
+    for letter in name:
+        code = code * 26 + ord(letter) - ord('A') + 1
+    return code
+
+
+def category_codes(counts):
+    """Returns the list of the codes of the objects, given the number of
+    objects of each category, the objects of the first category first.
+
+    Args:
+        - counts (List[int]): The number of objects of each category.
+
+    Returns:
+        List[int]: The codes, counts[0] times 1, then counts[1] times 2...
+    """
+    return [code for code, count in enumerate(counts, 1) for _ in range(count)]
+
+
+def misclassify(code, n_categories, random):
+    """Returns a category drawn uniformly among the categories other than the
+    given one. With two categories, it is the other one, without any draw.
+
+    Args:
+        - code (int): The code of the category (not EMPTY).
+
+        - n_categories (int): The number of categories.
+
+        - random (Callable[[], float]): Draws a float in [0, 1).
+
+    Returns:
+        int: The code of the misclassified category.
+    """
+    if n_categories == 2:
+        return 3 - code
+    if n_categories < 2:
+        return code
+    shift = 1 + int(random() * (n_categories - 1))
+    return (code - 1 + shift) % n_categories + 1
@@ -6,6 +6,10 @@ Module with a Cell class that encapsulates the logic that happens in a cell of
 the grid. A cell can hold an object, an agent or both. The cell object also 
 stores its position on the grid.
 
+A dense grid holds one Cell per cell of the grid : the class has no instance
+dict, and the position is stored as two integers, the tuple being only built
+when it is read.
+
 @authors: Nathan Etourneau, Paul Flagel
 """
 
@@ -23,6 +27,8 @@ The cell object has 3 attributes :
     - object : if there is an object on the cell, contains that object, otherwise it contains None.
     """
 
+    __slots__ = ("row", "col", "agent", "object")
+
     def __init__(self, position, agent=None, obj=None):
         """Instanciates a Cell object
 
@@ -36,6 +42,10 @@ The cell object has 3 attributes :
             - obj (Object, optional): The potential object on the cell. 
             Defaults to None.
         """
-        self.position = position
+        self.row, self.col = position
         self.agent = agent
         self.object = obj
+
+    @property
+    def position(self):
+        return (self.row, self.col)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a Checkpointer class, that periodically saves the environment of a
+long simulation to disk, keeping only the most recent checkpoints, so that a
+crashed run can be resumed.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import glob
+import os
+
+# Name of the checkpoint files, the round being zero-padded so that the
+# alphabetical order is the chronological order
+FILENAME = "checkpoint_{:010d}.npz"
+
+
+class Checkpointer:
+    """A Checkpointer class that saves the environment every K rounds in a
+    directory, and removes the oldest checkpoints to bound the disk usage."""
+
+    def __init__(self, directory, every, keep=2):
+        """Instanciates a Checkpointer object
+
+        Args:
+            - directory (str): The directory of the checkpoints, created if
+            needed.
+
+            - every (int): Number of rounds between two checkpoints.
+
+            - keep (int, optional): Number of checkpoints kept on disk.
+            Defaults to 2.
+        """
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def update(self, env):
+        """Saves the environment if its round is a multiple of every. The
+        checkpoint is first written to a temporary file, so that a crash while
+        saving never leaves a corrupted checkpoint behind.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The environment.
+        """
+        if env.round % self.every:
+            return
+
+        path = os.path.join(self.directory, FILENAME.format(env.round))
+        env.save(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+        for old in list_checkpoints(self.directory)[:-self.keep]:
+            os.remove(old)
+
+
+def list_checkpoints(directory):
+    """Returns the paths of the checkpoints of a directory, the oldest first.
+
+    Args:
+        - directory (str): The directory of the checkpoints.
+
+    Returns:
+        List[str]: The paths of the checkpoints.
+    """
+    return sorted(glob.glob(os.path.join(directory, FILENAME.replace("{:010d}", "*"))))
+
+
+def latest_checkpoint(directory):
+    """Returns the path of the most recent checkpoint of a directory.
+
+    Args:
+        - directory (str): The directory of the checkpoints.
+
+    Returns:
+        str or None: The path of the checkpoint, None if there is none.
+    """
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
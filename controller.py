@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a RunController class, that decides when a run is over and when
+it is worth drawing a new frame, instead of a fixed number of rounds and a
+fixed plotting period :
+    - a cheap sortedness statistic, the fraction of same-category neighbours
+    maintained by the ClusterMetrics, or the rate of pick and drop events, is
+    sampled every so many rounds, and the run has converged once it stayed
+    within a tolerance over a window of samples,
+
+    - a frame is due once the layout changed enough since the last one, as
+    measured by the number of clusters and the sortedness, so that the plots
+    follow the changes of the layout : often while the clusters form, seldom
+    once they are stable.
+
+It is meant to be registered as an observer of the environment, and updated
+at the end of every round.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+from collections import deque
+
+# Rounds between two samples of the statistic
+EVERY = 1000
+
+# Number of samples over which the statistic must plateau
+WINDOW = 20
+
+# Largest spread of the statistic over the window of a converged run
+TOLERANCE = 0.005
+
+# Change of the layout since the last frame that makes a new frame due
+FRAME_CHANGE = 0.02
+
+# Smallest number of rounds between two frames
+MIN_FRAME_GAP = 1000
+
+STATISTICS = ["sortedness", "event_rate"]
+
+
+class RunController:
+    """A RunController class, that tracks a sortedness statistic to stop a run
+    once it has converged, and the changes of the layout to adapt the period
+    of the frames. It is an observer of the picks and drops."""
+
+    def __init__(self, statistic="sortedness", every=EVERY, window=WINDOW, tolerance=TOLERANCE, min_rounds=0, frame_change=FRAME_CHANGE, min_frame_gap=MIN_FRAME_GAP):
+        """Instanciates a RunController object
+
+        Args:
+            - statistic (str, optional): The statistic tracked, "sortedness"
+            for the fraction of same-category neighbours, or "event_rate" for
+            the number of picks and drops per round. Defaults to "sortedness".
+
+            - every (int, optional): Number of rounds between two samples of
+            the statistic. Defaults to EVERY.
+
+            - window (int, optional): Number of samples over which the
+            statistic must plateau. Defaults to WINDOW.
+
+            - tolerance (float, optional): Largest spread, max - min, of the
+            statistic over the window of a converged run. Defaults to
+            TOLERANCE.
+
+            - min_rounds (int, optional): Round before which the run never
+            converges. Defaults to 0.
+
+            - frame_change (float, optional): Change of the layout since the
+            last frame that makes a new frame due, see layout_change. Defaults
+            to FRAME_CHANGE.
+
+            - min_frame_gap (int, optional): Smallest number of rounds between
+            two frames. Defaults to MIN_FRAME_GAP.
+
+        Raises:
+            - ValueError: The statistic is unknown.
+        """
+        if statistic not in STATISTICS:
+            raise ValueError(
+                f"Unknown statistic {statistic!r}, expected one of {STATISTICS}")
+
+        self.statistic = statistic
+        self.every = every
+        self.tolerance = tolerance
+        self.min_rounds = min_rounds
+        self.frame_change = frame_change
+        self.min_frame_gap = min_frame_gap
+
+        self.samples = deque(maxlen=window)
+        self.converged = False
+
+        # Picks and drops since the last sample
+        self.events = 0
+
+        # Round, number of clusters and sortedness of the last frame
+        self.last_frame = None
+
+    def on_pick(self, env, key, object_key, category, position):
+        self.events += 1
+
+    def on_drop(self, env, key, object_key, category, position):
+        self.events += 1
+
+    def sample(self, env):
+        """Returns the current value of the statistic, and starts counting
+        the events of the next sample."""
+        if self.statistic == "sortedness":
+            value = env.metrics.same_category_fraction
+        else:
+            value = self.events / self.every
+        self.events = 0
+        return value
+
+    def update(self, env):
+        """Samples the statistic if the round of the environment is a multiple
+        of every, and checks whether the run has converged. Meant to be called
+        at the end of every round.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The environment.
+
+        Returns:
+            bool: True if the run has converged.
+        """
+        if env.round % self.every == 0:
+            self.samples.append(self.sample(env))
+            self.converged = (env.round >= self.min_rounds
+                              and len(self.samples) == self.samples.maxlen
+                              and max(self.samples) - min(self.samples) <= self.tolerance)
+        return self.converged
+
+    def layout_change(self, env):
+        """Returns how much the layout changed since the last frame : the
+        relative change of the number of clusters, plus the change of the
+        fraction of same-category neighbours.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The environment.
+
+        Returns:
+            float: The change, 0 if the layout is the same.
+        """
+        _, clusters, sortedness = self.last_frame
+        metrics = env.metrics
+        return (abs(metrics.n_clusters - clusters) / max(clusters, 1)
+                + abs(metrics.same_category_fraction - sortedness))
+
+    def frame_due(self, env):
+        """Returns whether a new frame is worth drawing : the first one, then
+        once the layout changed enough since the last one, at least
+        min_frame_gap rounds later.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The environment.
+
+        Returns:
+            bool: True if a frame is due.
+        """
+        if self.last_frame is None:
+            return True
+        if env.round - self.last_frame[0] < self.min_frame_gap:
+            return False
+        return self.layout_change(env) >= self.frame_change
+
+    def frame_drawn(self, env):
+        """Records that a frame of the current round was drawn."""
+        self.last_frame = (env.round, env.metrics.n_clusters,
+                           env.metrics.same_category_fraction)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with an EnsembleEnvironment class, that runs R independent replicas of
+the same configuration in a single VectorizedEnvironment, for the statistics
+over many runs. The grids of the replicas are stacked along the rows : the
+grid planes have a leading replica dimension, (R, N, M), viewed as an
+(R x N) x M grid, the agents cannot move from a replica to another, and the
+objects and agents of replica r have consecutive keys. All the agents of all
+the replicas are advanced in one batched round, so that R small grids cost
+about as much as one grid of the same total size.
+
+The clustering metrics are maintained per replica, and aggregated over the
+replicas.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import numpy as np
+
+from metrics import ClusterMetrics
+from object_ import Object
+from vectorized import VectorizedEnvironment
+
+# Per-replica metrics reported by EnsembleMetrics
+METRICS = ["same_category_fraction", "n_clusters", "mean_cluster_size"]
+
+
+class EnsembleEnvironment(VectorizedEnvironment):
+    """An EnsembleEnvironment class, R replicas of a VectorizedEnvironment,
+    with independent initial layouts, advanced together. N and M are the
+    dimensions of the grid of one replica, n_agents counts the agents of all
+    the replicas."""
+
+    HEADER = VectorizedEnvironment.HEADER + ["n_replicas"]
+
+    def __init__(self, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size=15, error_rate=0, seed=None, category_counts=None, n_replicas=10):
+        """Instanciates the EnsembleEnvironment object.
+
+        Args:
+            - N (int): Number of rows in the grid of a replica.
+
+            - M (int): Number of columns in the grid of a replica.
+
+            - na, nb, n_agents, kplus, kminus, memory_buffer_size, error_rate,
+            category_counts : The parameters of each replica, as for
+            VectorizedEnvironment.
+
+            - seed (int, optional): Seed of the random generator shared by the
+            replicas. Defaults to None.
+
+            - n_replicas (int, optional): Number of replicas. Defaults to 10.
+        """
+        self.n_replicas = n_replicas
+        super().__init__(N, M, na, nb, n_agents, kplus, kminus,
+                         memory_buffer_size, error_rate, seed, category_counts)
+
+    def init_observers(self):
+        """Registers the clustering metrics of each replica, behind an
+        EnsembleMetrics that routes the picks and drops to them."""
+        self.metrics = EnsembleMetrics(
+            [ClusterMetrics(self.replica_objects(replica).values())
+             for replica in range(self.n_replicas)], self.N)
+        self.observers = [self.metrics]
+
+    def init_objects(self, category_counts):
+        """Places the objects of each category at random positions on the
+        grid of each replica. The objects of replica r have the keys
+        r * n_objects + 1 to (r + 1) * n_objects.
+
+        Args:
+            - category_counts (List[int]): The number of objects of each
+            category, in each replica.
+        """
+        R, N, M = self.n_replicas, self.N, self.M
+        n_objects = sum(category_counts)
+        codes = np.repeat(np.arange(1, self.n_categories + 1, dtype=np.int16),
+                          category_counts)
+
+        # Indexed by object key
+        self.object_category = np.zeros(R * n_objects + 1, dtype=np.int16)
+        self.object_rows = np.full(R * n_objects + 1, -1, dtype=np.int64)
+        self.object_cols = np.full(R * n_objects + 1, -1, dtype=np.int64)
+        for replica in range(R):
+            keys = slice(replica * n_objects + 1, (replica + 1) * n_objects + 1)
+            positions = self.rng.choice(N * M, n_objects, replace=False)
+            self.object_category[keys] = self.rng.permutation(codes)
+            rows, self.object_cols[keys] = np.divmod(positions, M)
+            self.object_rows[keys] = rows + replica * N
+
+        # Grid planes, the replicas being stacked along the rows
+        self.object_grid = np.zeros((R * N, M), dtype=np.int32)
+        self.category_grid = np.zeros((R * N, M), dtype=np.int16)
+        self.object_grid[self.object_rows[1:], self.object_cols[1:]] = \
+            np.arange(1, R * n_objects + 1)
+        self.category_grid[self.object_rows[1:], self.object_cols[1:]] = \
+            self.object_category[1:]
+
+    def init_agents(self, n_agents):
+        """Places n_agents agents at random positions on the grid of each
+        replica, with an empty memory and no object carried. The agents of
+        replica r have the keys r * n_agents + 1 to (r + 1) * n_agents.
+
+        Args:
+            - n_agents (int): Number of agents of each replica.
+        """
+        R, N, M = self.n_replicas, self.N, self.M
+        self.rows = np.empty(R * n_agents, dtype=np.int64)
+        self.cols = np.empty(R * n_agents, dtype=np.int64)
+        for replica in range(R):
+            agents = slice(replica * n_agents, (replica + 1) * n_agents)
+            positions = self.rng.choice(N * M, n_agents, replace=False)
+            rows, self.cols[agents] = np.divmod(positions, M)
+            self.rows[agents] = rows + replica * N
+
+        self.agent_grid = np.zeros((R * N, M), dtype=np.int32)
+        self.agent_grid[self.rows, self.cols] = np.arange(1, R * n_agents + 1)
+
+        self.carried = np.zeros(R * n_agents, dtype=np.int32)
+        self.memory = np.zeros(
+            (R * n_agents, self.memory_buffer_size), dtype=np.int16)
+        self.memory_head = 0
+        self.memory_len = 0
+        self.memory_counts = np.zeros(
+            (R * n_agents, self.n_categories + 1), dtype=np.int32)
+
+    def in_grid(self, agents, rows, cols):
+        """Returns whether the target cells of the given agents are in the
+        grid of their own replica."""
+        top = (self.rows[agents] // self.N * self.N)[:, None]
+        return (rows >= top) & (rows < top + self.N) & (cols >= 0) & (cols < self.M)
+
+    def grids(self, name):
+        """Returns a grid plane ("object_grid", "category_grid" or
+        "agent_grid") with its leading replica dimension, as an (R, N, M)
+        view."""
+        return getattr(self, name).reshape(self.n_replicas, self.N, self.M)
+
+    def replica_objects(self, replica):
+        """Dict of the Object instances of a replica, with their positions in
+        the grid of the replica, as the objects of a VectorizedEnvironment.
+
+        Args:
+            - replica (int): The index of the replica.
+
+        Returns:
+            dict[int, Object]: The objects, by key.
+        """
+        n_objects = (len(self.object_category) - 1) // self.n_replicas
+        first = replica * n_objects + 1
+        rows = self.object_rows[first:first + n_objects].tolist()
+        cols = self.object_cols[first:first + n_objects].tolist()
+        codes = self.object_category[first:first + n_objects].tolist()
+        return {key: Object(key, code, (row - replica * self.N, col) if row >= 0 else None)
+                for key, row, col, code in zip(range(first, first + n_objects), rows, cols, codes)}
+
+
+class EnsembleMetrics:
+    """An EnsembleMetrics class, the ClusterMetrics of the replicas of an
+    EnsembleEnvironment. It is an observer of the picks and drops, routed to
+    the metrics of their replica, and exposes the means of the metrics over
+    the replicas with the names of ClusterMetrics, so that it can stand for
+    them (as in RunController)."""
+
+    def __init__(self, replicas, N):
+        """Instanciates an EnsembleMetrics object
+
+        Args:
+            - replicas (List[ClusterMetrics]): The metrics of each replica.
+
+            - N (int): Number of rows in the grid of a replica.
+        """
+        self.replicas = replicas
+        self.N = N
+
+    def route(self, position):
+        """Returns the metrics of the replica of a cell of the stacked grid,
+        and the position of the cell in the grid of the replica."""
+        replica, row = divmod(position[0], self.N)
+        return self.replicas[replica], (row, position[1])
+
+    def on_pick(self, env, key, object_key, category, position):
+        metrics, position = self.route(position)
+        metrics.on_pick(env, key, object_key, category, position)
+
+    def on_drop(self, env, key, object_key, category, position):
+        metrics, position = self.route(position)
+        metrics.on_drop(env, key, object_key, category, position)
+
+    def per_replica(self):
+        """Returns the metrics of each replica.
+
+        Returns:
+            List[dict[str, float]]: The metrics of METRICS, for each replica.
+        """
+        return [{name: getattr(metrics, name) for name in METRICS}
+                for metrics in self.replicas]
+
+    def summary(self):
+        """Returns the mean, the standard deviation, the minimum and the
+        maximum of each metric over the replicas.
+
+        Returns:
+            dict[str, dict[str, float]]: The statistics of each metric.
+        """
+        summary = {}
+        for name in METRICS:
+            values = np.array([getattr(metrics, name) for metrics in self.replicas])
+            summary[name] = {"mean": float(values.mean()), "std": float(values.std()),
+                             "min": float(values.min()), "max": float(values.max())}
+        return summary
+
+    @property
+    def same_category_fraction(self):
+        return float(np.mean([metrics.same_category_fraction for metrics in self.replicas]))
+
+    @property
+    def n_clusters(self):
+        return float(np.mean([metrics.n_clusters for metrics in self.replicas]))
+
+    @property
+    def mean_cluster_size(self):
+        return float(np.mean([metrics.mean_cluster_size for metrics in self.replicas]))
@@ -8,12 +8,20 @@ multi-agent system.
 @authors: Nathan Etourneau, Paul Flagel
 """
 
-import random
+import json
+
+import numpy as np
 
 from agent import Agent
 from agentdata import AgentData
-from cell import Cell
+from categories import category_code, category_codes
+from footprint import deep_sizeof
+from grid import SparseGrid, make_grid
+from metrics import ClusterMetrics
 from object_ import Object
+from occupancy import MAX_RADIUS, OccupancyIndex
+from population import AgentConfig
+from rng import BlockRandom
 
 
 class Environment:
@@ -22,7 +30,7 @@ class Environment:
     object. Is instancied only once.
     """
 
-    def __init__(self, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size=15, error_rate=0):
+    def __init__(self, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size=15, error_rate=0, seed=None, sparse=None, population=None, category_counts=None, grid_dir=None):
         """Instanciates the Environment object. The environment contains a 
         dict of Agent objects, a dict of Object objects, a grid containing 
         Cell objects.
@@ -47,88 +55,139 @@ class Environment:
 
             - error_rate (float, optional): Error rate in the object class 
             recognition, as described in the paper. Defaults to 0.
+
+            - seed (int, optional): Seed of the run. The environment and each
+            agent get an independent random stream derived from it. Defaults
+            to None, for a seed drawn from the OS entropy.
+
+            - sparse (bool, optional): Whether the grid only stores the cells
+            holding an agent or an object, see grid.py. Defaults to None, for
+            a sparse grid on large grids.
+
+            - population (List[AgentConfig], optional): The parameters of each
+            agent, see population.py. Defaults to None, for n_agents agents
+            with the given kplus, kminus, memory_buffer_size and error_rate.
+
+            - category_counts (List[int], optional): The number of objects of
+            each category, for more than two categories. Defaults to None, for
+            [na, nb].
+
+            - grid_dir (str, optional): The directory of memory-mapped planes
+            holding the grid, for grids larger than the memory, see
+            grid.MappedGrid. Defaults to None, for a grid in memory.
+
+        Raises:
+            - ValueError: The population is not made of n_agents agents.
         """
 
         self.N = N
         self.M = M
 
-        self.grid = [[Cell(position=(row, col))
-                      for col in range(M)] for row in range(N)]
-        self.init_grid(na, nb, n_agents, kplus, kminus,
-                       memory_buffer_size, error_rate)
+        if category_counts is None:
+            category_counts = [na, nb]
+        self.n_categories = len(category_counts)
 
-    def init_grid(self, na, nb, n_agents, kplus, kminus, memory_buffer_size, error_rate):
-        self.init_objects(na, nb)
-        self.init_agents(n_agents, kplus, kminus,
-                         memory_buffer_size, error_rate)
+        if population is None:
+            population = [AgentConfig(kplus, kminus, memory_buffer_size,
+                                      error_rate)] * n_agents
+        elif len(population) != n_agents:
+            raise ValueError(
+                f"The population has {len(population)} agents instead of {n_agents}")
 
-        for obj in self.objects.values():
-            row, col = obj.position
-            self.grid[row][col].object = obj
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.rng = BlockRandom(self.seed_sequence.spawn(1)[0])
 
-        for agent_data in self.agents.values():
-            row, col = agent_data.position
-            self.grid[row][col].agent = agent_data.agent
+        self.grid = make_grid(N, M, sparse, grid_dir)
+        self.init_grid(category_counts, population)
 
-    def init_objects(self, na, nb):
-        """Instanciates na objects of category A and nb objects of category B 
-        at na + nb random positions on the grid
+        self.keys = list(self.agents.keys())
+        self.round = 0
 
-        Args:
-            - na (int): Number of objects of class A.
+        # Round at which each agent ends its walk, indexed by key - 1, when
+        # the run is advanced by a FastForwardScheduler (see scheduler.py)
+        self.walk_ends = None
 
-            - nb (int): Number of objects of class B.
-        """
+        self.init_occupancy()
+        self.init_observers()
+
+    def init_occupancy(self):
+        """Builds the index of the cells occupied by the agents, kept up to
+        date by move."""
+        self.occupancy = OccupancyIndex(
+            self.N, self.M, (data.position for data in self.agents.values()))
+
+    def init_observers(self):
+        """Registers the observers notified of every pick and drop, the
+        clustering metrics being always maintained."""
+        self.metrics = ClusterMetrics(self.objects.values())
+        self.observers = [self.metrics]
 
-        grid = [(row, col) for row in range(self.N)
-                for col in range(self.M)]
-        random_positions = random.sample(grid, na + nb)
-        random_object_category = random.sample(
-            na * "A" + nb * "B", na + nb)
+    def init_grid(self, category_counts, population):
+        """Places the objects and the agents on the grid, each one written to
+        its cell once."""
+        self.init_objects(category_counts)
+        self.init_agents(population)
+
+    def init_objects(self, category_counts):
+        """Instanciates the objects of each category at random positions on
+        the grid
+
+        Args:
+            - category_counts (List[int]): The number of objects of each
+            category, the code of a category being its index + 1.
+        """
+        n_objects = sum(category_counts)
+        random_positions = self.sample_positions(n_objects)
+        random_object_category = self.rng.sample(
+            category_codes(category_counts), n_objects)
 
         self.objects = {}
 
         for key, (category, position) in enumerate(zip(random_object_category, random_positions), 1):
-            row, col = position
-            cell = self.grid[row][col]
-            obj = Object(key, category, position, parent=cell)
+            cell = self.grid.cell(*position)
+            obj = Object(key, category, position)
             self.objects[key] = obj
             cell.object = obj
 
-    def init_agents(self, n_agents, kplus, kminus, memory_buffer_size, error_rate):
-        """Instanciates n_agents agents on the grid at n_agents random 
+    def init_agents(self, population):
+        """Instanciates the agents of the population on the grid at random 
         positions.
 
         Args:
-            - n_agents (int): Number of agents.
-
-            - kplus (float): Value of k+ as described in the paper.
-
-            - kminus (float): Value of k- as described in the paper.
-
-            - memory_buffer_size (int): Size of the memory as 
-            described in the paper.
-
-            - error_rate (float): Error rate in the object class 
-            recognition, as described in the paper.
+            - population (List[AgentConfig]): The parameters of each agent.
         """
-        grid = [(row, col) for row in range(self.N)
-                for col in range(self.M)]
-        random_positions = random.sample(grid, n_agents)
+        random_positions = self.sample_positions(len(population))
+
+        # Each agent draws from its own stream
+        seeds = self.seed_sequence.spawn(len(population))
 
         self.agents = {}
 
-        for key, position in enumerate(random_positions, 1):
+        for key, (position, seed, config) in enumerate(zip(random_positions, seeds, population), 1):
             # We instanciate an agent at the random position
-            row, col = position
-            cell = self.grid[row][col]
-            agent = Agent(key, kplus, kminus, memory_buffer_size, error_rate)
+            cell = self.grid.cell(*position)
+            agent = Agent(key, *config, BlockRandom(seed), self.n_categories)
             cell.agent = agent
 
             # We store this agent in an AgentData object that encapsulates the
             # agent and the position of the agent
             self.agents[key] = AgentData(agent, position)
 
+    def sample_positions(self, k):
+        """Draws k distinct random positions of the grid. The cells are
+        sampled by their index, the range of indices never being built, so
+        that it costs O(k) and not O(N x M). The positions are the same as
+        when sampling the list of all the positions.
+
+        Args:
+            - k (int): Number of positions.
+
+        Returns:
+            List[tuple[int, int]]: The positions, with the format (row, col).
+        """
+        return [divmod(index, self.M)
+                for index in self.rng.sample(range(self.N * self.M), k)]
+
     def valid_cell(self, row, col):
         """Checks if the cell located at (row, col) is in bounds or out of 
         bounds.
@@ -145,7 +204,7 @@ class Environment:
 
     def empty_cells(self, key, R=1):
         """Given an agent key, returns the empty cells around it, in the given 
-        radius.
+        radius. Up to MAX_RADIUS, they are read from the occupancy index.
 
         Args:
             - key (int): The key of the agent one wants the empty cells around.
@@ -154,11 +213,15 @@ class Environment:
             cells. Defaults to 1.
 
         Returns:
-            List[tuple[int, int]]: The list of the empty cells around the 
-            agent. The format is (drow, dcol) where drow is the vertical 
-            movement and dcol is the horizontal movement.
+            tuple[tuple[int, int], ...]: The empty cells around the agent.
+            The format is (drow, dcol) where drow is the vertical movement and
+            dcol is the horizontal movement. The tuple may be shared with the
+            other callers.
         """
         row, col = self.agents[key].position
+        if R <= MAX_RADIUS:
+            return self.occupancy.free_cells(row, col, R)
+
         iterable = ((drow, dcol) for drow in range(-R, R+1)
                     for dcol in range(-R, R+1) if drow != 0 or dcol != 0)
         empty = []
@@ -166,9 +229,11 @@ class Environment:
             new_row = row + drow
             new_col = col + dcol
 
-            if self.valid_cell(new_row, new_col) and self.grid[new_row][new_col].agent is None:
-                empty.append((drow, dcol))
-        return empty
+            if self.valid_cell(new_row, new_col):
+                cell = self.grid.peek(new_row, new_col)
+                if cell is None or cell.agent is None:
+                    empty.append((drow, dcol))
+        return tuple(empty)
 
     def move(self, key, direction):
         """Given an agent key, and a destination with the format (row, col), 
@@ -194,15 +259,33 @@ class Environment:
         new_col = old_col + dcol
         destination = (new_row, new_col)
 
-        agent = self.grid[old_row][old_col].agent
+        old_cell = self.grid.cell(old_row, old_col)
+        new_cell = self.grid.cell(new_row, new_col)
 
-        if self.grid[new_row][new_col].agent is not None:
+        if new_cell.agent is not None:
             raise ValueError(
                 f"There is already an agent in {(new_row, new_col)} where the agent {key} wants to go. Check the integrity")
 
         self.agents[key].position = destination
-        self.grid[new_row][new_col].agent = agent
-        self.grid[old_row][old_col].agent = None
+        new_cell.agent = old_cell.agent
+        old_cell.agent = None
+        self.grid.release(old_row, old_col)
+        self.occupancy.move((old_row, old_col), destination)
+
+    def count_agents(self, key, R):
+        """Given an agent key, returns the number of other agents within the
+        given radius.
+
+        Args:
+            - key (int): The key of the agent.
+
+            - R (int): The radius.
+
+        Returns:
+            int: The number of agents in the square of side 2R + 1 centered on
+            the agent, the agent excluded.
+        """
+        return self.occupancy.count(*self.agents[key].position, R) - 1
 
     def get_agent_cell(self, key):
         """Given an agent key, returns the Cell object where the agent is 
@@ -215,5 +298,226 @@ class Environment:
         Returns:
             - Cell: The cell where the agent with the given key is located.
         """
-        row, col = self.agents[key].position
-        return self.grid[row][col]
+        return self.grid.cell(*self.agents[key].position)
+
+    def step(self):
+        """Runs one round : every agent, in a random order, perceives the
+        empty cells around it and acts consequently."""
+
+        self.round += 1
+
+        # Shuffle the agents to mimic the fact that the movement is erratic
+        self.rng.shuffle(self.keys)
+
+        for key in self.keys:
+            agent = self.agents[key].agent
+            empty_cells = agent.perception(self)
+            agent.action(self, empty_cells)
+
+    def on_pick(self, key, object_key, category, position):
+        """Notifies the observers that an agent picked an object.
+
+        Args:
+            - key (int): The key of the agent.
+
+            - object_key (int): The key of the picked object.
+
+            - category (int): The category code of the picked object.
+
+            - position (tuple[int, int]): The cell where the object was.
+        """
+        for observer in self.observers:
+            observer.on_pick(self, key, object_key, category, position)
+
+    def on_drop(self, key, object_key, category, position):
+        """Notifies the observers that an agent dropped an object.
+
+        Args:
+            - key (int): The key of the agent.
+
+            - object_key (int): The key of the dropped object.
+
+            - category (int): The category code of the dropped object.
+
+            - position (tuple[int, int]): The cell where the object is dropped.
+        """
+        for observer in self.observers:
+            observer.on_drop(self, key, object_key, category, position)
+
+    def memory_report(self):
+        """Returns the number of bytes used by each structure of the
+        environment. The bytes of an object reachable from several structures
+        are counted in the first one : the agents and the objects are counted
+        apart from the grid cells holding them.
+
+        Returns:
+            dict[str, int]: The bytes of the objects, of the decision tables
+            shared by the agents, of the agents (with their memory and random
+            stream), of the grid, of the occupancy index, of the observers,
+            of the random stream of the environment, and their total.
+        """
+        seen = set()
+        tables = {id(data.agent.tables): data.agent.tables
+                  for data in self.agents.values()}
+        structures = {
+            "objects": [self.objects],
+            "decision_tables": list(tables.values()),
+            "agents": [self.agents, self.keys],
+            "grid": [self.grid],
+            "occupancy": [self.occupancy],
+            "observers": [self.observers],
+            "rng": [self.rng],
+        }
+        report = {name: deep_sizeof(roots, seen)
+                  for name, roots in structures.items()}
+        report["total"] = sum(report.values())
+        return report
+
+    def save(self, path):
+        """Writes a compact binary checkpoint of the environment : the objects,
+        the agents with their position, carried object and memory, the order
+        of the agents, the state of every random stream and the walks of a
+        FastForwardScheduler. Loading it with Environment.load continues the
+        run bit-for-bit.
+
+        Args:
+            - path (str): The path of the checkpoint file.
+        """
+        objects = [self.objects[key] for key in sorted(self.objects)]
+        agents = [self.agents[key] for key in sorted(self.agents)]
+        states = [self.rng.getstate()] + \
+            [data.agent.rng.getstate() for data in agents]
+
+        # One row per memory, the most recent category first, padded with -1
+        width = max([data.agent.memory.size for data in agents], default=0)
+        memories = np.full((len(agents), width), -1, dtype=np.int16)
+        for i, data in enumerate(agents):
+            memory = list(data.agent.memory)
+            memories[i, :len(memory)] = memory
+
+        arrays = {
+            "header": json.dumps({"N": self.N, "M": self.M, "round": self.round,
+                                  "sparse": isinstance(self.grid, SparseGrid),
+                                  "grid_dir": getattr(self.grid, "directory", None),
+                                  "n_categories": self.n_categories}),
+            "object_keys": [obj.key for obj in objects],
+            "object_categories": [obj.category for obj in objects],
+            "object_positions": np.array(
+                [obj.position or (-1, -1) for obj in objects]).reshape(-1, 2),
+            "agent_keys": [data.agent.key for data in agents],
+            "agent_positions": np.array(
+                [data.position for data in agents]).reshape(-1, 2),
+            "agent_parameters": np.array(
+                [(data.agent.kplus, data.agent.kminus,
+                  data.agent.memory_buffer_size, data.agent.error_rate)
+                 for data in agents]).reshape(-1, 4),
+            "carried": [data.agent.object.key if data.agent.object else 0
+                        for data in agents],
+            "memories": memories,
+            "keys": self.keys,
+            "rng_states": json.dumps([state for state, _ in states]),
+            "rng_values": np.concatenate(
+                [np.asarray(values, dtype=np.float64) for _, values in states]),
+            "rng_lengths": [len(values) for _, values in states],
+        }
+        if self.walk_ends is not None:
+            arrays["walk_ends"] = self.walk_ends
+
+        # The planes of a memory-mapped grid are brought up to date as well
+        if hasattr(self.grid, "flush"):
+            self.grid.flush()
+
+        with open(path, "wb") as file:
+            np.savez_compressed(file, **arrays)
+
+    @classmethod
+    def load(cls, path, grid_dir=None):
+        """Reads a checkpoint written by Environment.save.
+
+        Args:
+            - path (str): The path of the checkpoint file.
+
+            - grid_dir (str, optional): The directory of the planes of a
+            memory-mapped grid, required for the checkpoints of a mapped grid.
+            Previous planes in it are overwritten. Defaults to None.
+
+        Returns:
+            Environment: The environment, in the state it was saved.
+
+        Raises:
+            - ValueError: The checkpoint is of a memory-mapped grid, and no
+            grid_dir is given.
+        """
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+
+        header = json.loads(str(arrays["header"]))
+        # The planes of the saved environment may still be in use : the
+        # directory of the new ones is up to the caller
+        if header.get("grid_dir") and grid_dir is None:
+            raise ValueError(f"{path} is a checkpoint of a memory-mapped grid "
+                             f"(saved in {header['grid_dir']}) : give the "
+                             "directory of the new planes with grid_dir")
+        env = cls.__new__(cls)
+        env.N, env.M, env.round = header["N"], header["M"], header["round"]
+        env.n_categories = header.get("n_categories", 2)
+        env.seed_sequence = None
+        env.grid = make_grid(env.N, env.M, header.get("sparse"),
+                             grid_dir if header.get("grid_dir") else None)
+
+        # Random streams, the first one being the one of the environment
+        offsets = np.cumsum(arrays["rng_lengths"])[:-1]
+        values = np.split(arrays["rng_values"], offsets)
+        streams = []
+        for state, remaining in zip(json.loads(str(arrays["rng_states"])), values):
+            stream = BlockRandom()
+            stream.setstate((state, remaining.tolist()))
+            streams.append(stream)
+        env.rng = streams[0]
+
+        # The checkpoints of the letter categories are converted to codes
+        categories = arrays["object_categories"].tolist()
+        memories = arrays["memories"].tolist()
+        if arrays["object_categories"].dtype.kind == "U":
+            categories = [category_code(name) for name in categories]
+            memories = [[category_code(name) for name in memory]
+                        for memory in memories]
+
+        env.objects = {}
+        for key, category, (row, col) in zip(arrays["object_keys"].tolist(),
+                                             categories,
+                                             arrays["object_positions"].tolist()):
+            if row >= 0:
+                cell = env.grid.cell(row, col)
+                obj = Object(key, category, (row, col))
+                cell.object = obj
+            else:
+                obj = Object(key, category, None)
+            env.objects[key] = obj
+
+        env.agents = {}
+        agents = zip(arrays["agent_keys"].tolist(), arrays["agent_positions"].tolist(),
+                     arrays["agent_parameters"].tolist(), arrays["carried"].tolist(),
+                     memories, streams[1:])
+        for key, (row, col), parameters, carried, memory, stream in agents:
+            kplus, kminus, memory_buffer_size, error_rate = parameters
+            agent = Agent(key, kplus, kminus, int(memory_buffer_size),
+                          error_rate, stream, env.n_categories)
+
+            # The memory starts with the most recent category
+            for category in reversed(memory):
+                if category >= 0:
+                    agent.memory.push(category)
+
+            if carried:
+                agent.object = env.objects[carried]
+                agent.object.parent = key
+
+            env.grid.cell(row, col).agent = agent
+            env.agents[key] = AgentData(agent, (row, col))
+
+        env.keys = arrays["keys"].tolist()
+        env.walk_ends = arrays.get("walk_ends")
+        env.init_occupancy()
+        env.init_observers()
+        return env
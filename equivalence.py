@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Statistical equivalence harness between the reference object model
+(Environment, whose agents decide with Agent.action, will_pick and will_drop)
+and the alternative engines. Two engines cannot be compared run by run, as
+they do not draw the same random numbers : both are run over many seeds
+instead, the compared engines on other seeds than the reference (an engine
+reproducing the reference bit for bit would otherwise pass trivially), and
+the distributions over the seeds of their observables are compared with
+two-sample Kolmogorov-Smirnov tests, every so many rounds :
+    - the pick and drop rates, per agent and per round, over each interval,
+
+    - the number of clusters, their mean size and the fraction of
+    same-category neighbours,
+
+    - at the end of the runs, the size of the largest cluster, the median
+    size of the clusters and the fraction of isolated objects. The cluster
+    sizes of a run are not independent, and are summarized per seed rather
+    than pooled.
+
+An engine passes when no test rejects the equivalence at the significance
+level, with a Bonferroni correction over the number of tests. The default
+configuration is small, so that the harness can run alongside the benchmarks.
+
+Usage : python equivalence.py --engines numpy fast-forward --seeds 30 --rounds 3000
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from environment import Environment
+from scheduler import FastForwardScheduler
+from sharded import ShardedEnvironment
+from vectorized import VectorizedEnvironment
+
+# The reference engine, and the engines compared with it : the NumPy engine,
+# the fast-forward scheduler of the object model, and the NumPy engine sharded
+# over worker processes
+REFERENCE = "python"
+ENGINES = ["python", "numpy", "fast-forward", "sharded"]
+SHARDED_WORKERS = 2
+
+# Compared configuration, small enough for many seeds
+CONFIG = {"N": 40, "M": 50, "na": 150, "nb": 150, "n_agents": 20,
+          "kplus": 0.1, "kminus": 0.3, "memory_buffer_size": 15, "error_rate": 0.}
+
+SEEDS = 30
+N_ROUNDS = 3000
+EVERY = 500
+
+# Overall significance level, split over the tests
+ALPHA = 0.01
+
+# Observables sampled every EVERY rounds
+OBSERVABLES = ["pick_rate", "drop_rate", "n_clusters", "mean_cluster_size",
+               "same_category_fraction"]
+
+# Summaries of the cluster sizes at the end of a run
+CLUSTER_SUMMARIES = {
+    "largest_cluster": lambda sizes: float(sizes.max()),
+    "median_cluster": lambda sizes: float(np.median(sizes)),
+    "isolated_fraction": lambda sizes: float(np.mean(sizes == 1)),
+}
+
+
+def make_engine(engine, config, seed):
+    """Instanciates an engine.
+
+    Args:
+        - engine (str): The name of the engine, one of ENGINES.
+
+        - config (dict): The parameters of the environment.
+
+        - seed (int): The seed of the run.
+
+    Returns:
+        tuple: The environment, and the function running one round.
+    """
+    if engine == "numpy":
+        env = VectorizedEnvironment(**config, seed=seed)
+    elif engine == "sharded":
+        env = ShardedEnvironment(**config, seed=seed, n_workers=SHARDED_WORKERS)
+    else:
+        env = Environment(**config, seed=seed)
+    step = FastForwardScheduler(env).step if engine == "fast-forward" else env.step
+    return env, step
+
+
+class EventCounter:
+    """An EventCounter class, an observer counting the picks and drops."""
+
+    def __init__(self):
+        self.picks = 0
+        self.drops = 0
+
+    def on_pick(self, env, key, object_key, category, position):
+        self.picks += 1
+
+    def on_drop(self, env, key, object_key, category, position):
+        self.drops += 1
+
+
+def trajectory(engine, config, seed, n_rounds=N_ROUNDS, every=EVERY):
+    """Runs an engine and samples its observables.
+
+    Args:
+        - engine (str): The name of the engine.
+
+        - config (dict): The parameters of the environment.
+
+        - seed (int): The seed of the run.
+
+        - n_rounds (int, optional): Number of rounds. Defaults to N_ROUNDS.
+
+        - every (int, optional): Number of rounds between two samples.
+        Defaults to EVERY.
+
+    Returns:
+        dict: The values of each observable at each sample, and the
+        summaries of CLUSTER_SUMMARIES at the end of the run.
+    """
+    env, step = make_engine(engine, config, seed)
+    try:
+        counter = EventCounter()
+        env.observers.append(counter)
+        samples = {name: [] for name in OBSERVABLES}
+
+        for round in range(1, n_rounds + 1):
+            step()
+            if round % every:
+                continue
+            moves = every * config["n_agents"]
+            samples["pick_rate"].append(counter.picks / moves)
+            samples["drop_rate"].append(counter.drops / moves)
+            counter.picks = counter.drops = 0
+            for name in OBSERVABLES[2:]:
+                samples[name].append(getattr(env.metrics, name))
+
+        sizes = np.array(list(env.metrics.size.values()) or [0])
+        for name, summary in CLUSTER_SUMMARIES.items():
+            samples[name] = summary(sizes)
+        return samples
+    finally:
+        if hasattr(env, "close"):
+            env.close()
+
+
+def ks_test(first, second):
+    """Two-sample Kolmogorov-Smirnov test, with the asymptotic distribution of
+    the statistic (with the small-sample correction of Stephens).
+
+    Args:
+        - first (array-like): The first sample.
+
+        - second (array-like): The second sample.
+
+    Returns:
+        tuple[float, float]: The statistic, the largest distance between the
+        two empirical distribution functions, and the p-value.
+    """
+    first = np.sort(np.asarray(first, dtype=float))
+    second = np.sort(np.asarray(second, dtype=float))
+    n, m = len(first), len(second)
+    values = np.concatenate([first, second])
+    distance = np.abs(np.searchsorted(first, values, side="right") / n
+                      - np.searchsorted(second, values, side="right") / m).max()
+
+    effective = np.sqrt(n * m / (n + m))
+    lam = (effective + 0.12 + 0.11 / effective) * distance
+    if lam < 1e-3:
+        return float(distance), 1.
+    j = np.arange(1, 101)
+    p_value = 2 * np.sum((-1) ** (j - 1) * np.exp(-2 * j ** 2 * lam ** 2))
+    return float(distance), float(np.clip(p_value, 0., 1.))
+
+
+def compare(reference, candidate, every=EVERY):
+    """Compares the samples of two engines, run over disjoint seeds.
+
+    Args:
+        - reference (List[dict]): The trajectories of the reference engine,
+        one per seed.
+
+        - candidate (List[dict]): The trajectories of the compared engine.
+
+        - every (int, optional): Number of rounds between two samples.
+        Defaults to EVERY.
+
+    Returns:
+        List[dict]: One test per observable and per sampled round, and one per
+        summary of the final cluster sizes, with the statistic and the
+        p-value.
+    """
+    tests = []
+    for name in OBSERVABLES:
+        first = np.array([run[name] for run in reference])
+        second = np.array([run[name] for run in candidate])
+        for sample in range(first.shape[1]):
+            statistic, p_value = ks_test(first[:, sample], second[:, sample])
+            tests.append({"observable": name, "round": (sample + 1) * every,
+                          "statistic": statistic, "p_value": p_value})
+
+    for name in CLUSTER_SUMMARIES:
+        statistic, p_value = ks_test([run[name] for run in reference],
+                                     [run[name] for run in candidate])
+        tests.append({"observable": name, "round": None,
+                      "statistic": statistic, "p_value": p_value})
+    return tests
+
+
+def report(engine, tests, alpha=ALPHA):
+    """Returns the verdict of an engine.
+
+    Args:
+        - engine (str): The name of the engine.
+
+        - tests (List[dict]): Its tests, as returned by compare.
+
+        - alpha (float, optional): The overall significance level. Defaults
+        to ALPHA.
+
+    Returns:
+        dict: The engine, whether it passed, the corrected level, the number
+        of tests, and the tests that failed.
+    """
+    level = alpha / len(tests)
+    failures = [test for test in tests if test["p_value"] < level]
+    return {"engine": engine, "passed": not failures, "level": level,
+            "n_tests": len(tests), "failures": failures,
+            "min_p_value": min(test["p_value"] for test in tests)}
+
+
+def run_engine(executor, engine, config, seeds, n_rounds, every):
+    """Returns the trajectories of an engine over the seeds, run in a pool."""
+    futures = [executor.submit(trajectory, engine, config, seed, n_rounds, every)
+               for seed in seeds]
+    return [future.result() for future in futures]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    for name, default in CONFIG.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name,
+                            type=type(default), default=default)
+    parser.add_argument("--engines", nargs="+", default=["numpy", "fast-forward"],
+                        choices=[engine for engine in ENGINES if engine != REFERENCE])
+    parser.add_argument("--seeds", type=int, default=SEEDS)
+    parser.add_argument("--rounds", type=int, default=N_ROUNDS)
+    parser.add_argument("--every", type=int, default=EVERY)
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default=None,
+                        help="JSON file of the report")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = {name: getattr(args, name) for name in CONFIG}
+    seeds = range(args.seeds)
+
+    # The compared engines run on other seeds than the reference
+    candidate_seeds = range(args.seeds, 2 * args.seeds)
+
+    verdicts = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        reference = run_engine(executor, REFERENCE, config, seeds, args.rounds, args.every)
+        for engine in args.engines:
+            candidate = run_engine(executor, engine, config, candidate_seeds,
+                                   args.rounds, args.every)
+            verdict = report(engine, compare(reference, candidate, args.every), args.alpha)
+            verdicts.append(verdict)
+
+            print(f"{engine} : {'PASS' if verdict['passed'] else 'FAIL'} "
+                  f"({verdict['n_tests']} tests, smallest p-value "
+                  f"{verdict['min_p_value']:.3g}, level {verdict['level']:.2g})")
+            for test in verdict["failures"]:
+                at = f" at round {test['round']}" if test["round"] else ""
+                print(f"  {test['observable']}{at} : D = {test['statistic']:.3f}, "
+                      f"p = {test['p_value']:.3g}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"reference": REFERENCE, "config": config,
+                       "seeds": args.seeds, "rounds": args.rounds,
+                       "every": args.every, "alpha": args.alpha,
+                       "verdicts": verdicts}, file, indent=1)
+
+    if not all(verdict["passed"] for verdict in verdicts):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
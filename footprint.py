@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a helper measuring the memory used by a structure : the bytes of
+all the objects reachable from it, as reported by sys.getsizeof. The classes,
+the functions and the modules are shared by the whole program, and are not
+counted.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import gc
+import sys
+from types import BuiltinFunctionType, FunctionType, ModuleType
+
+# Objects reached but not counted, nor followed
+SHARED = (type, ModuleType, FunctionType, BuiltinFunctionType)
+
+
+def deep_sizeof(roots, seen=None):
+    """Returns the number of bytes of the objects reachable from the roots.
+
+    Args:
+        - roots (Iterable[object]): The roots of the structure.
+
+        - seen (set[int], optional): The ids of the objects already counted,
+        updated with the ones counted now, so that the objects shared between
+        several structures are only counted once. Defaults to None.
+
+    Returns:
+        int: The number of bytes.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
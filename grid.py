@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with the DenseGrid, SparseGrid and MappedGrid classes, the storages of
+the Cell objects of an Environment. The dense grid creates the N x M cells
+upfront, the sparse grid only stores the cells holding an agent or an object,
+so that its size scales with the number of entities and not with the area of
+the grid. The mapped grid keeps the keys of the agent and of the object of
+every cell in two planes of memory-mapped files, for worlds larger than the
+memory, read and written tile by tile through a small cache of hot tiles.
+
+All of them give access to the cells with :
+    - cell(row, col) : the cell at (row, col), created if needed,
+
+    - peek(row, col) : the cell at (row, col) if it holds something, None
+    otherwise (the dense and mapped grids always return the cell),
+
+    - release(row, col) : a hint that the cell may be empty now, so that the
+    sparse grid can forget it.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import os
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from cell import Cell
+
+# Above this number of cells, an Environment uses a sparse grid by default
+SPARSE_AREA = 10 ** 6
+
+# Side of the tiles of a mapped grid, and number of tiles kept in memory
+TILE = 64
+CACHE_TILES = 1024
+
+# Planes of a mapped grid : the key of the agent, and of the object, of each
+# cell, 0 if there is none
+PLANES = ["agent", "object"]
+
+
+class DenseGrid:
+    """A DenseGrid class, a list of lists holding the N x M cells."""
+
+    def __init__(self, N, M):
+        """Instanciates a DenseGrid object
+
+        Args:
+            - N (int): Number of rows in the grid.
+
+            - M (int): Number of columns in the grid.
+        """
+        self.N = N
+        self.M = M
+        self.rows = [[Cell(position=(row, col))
+                      for col in range(M)] for row in range(N)]
+
+    def cell(self, row, col):
+        return self.rows[row][col]
+
+    def peek(self, row, col):
+        return self.rows[row][col]
+
+    def release(self, row, col):
+        pass
+
+
+class SparseGrid:
+    """A SparseGrid class, a dict holding the cells that contain an agent or
+    an object, indexed by their position."""
+
+    def __init__(self, N, M):
+        """Instanciates a SparseGrid object
+
+        Args:
+            - N (int): Number of rows in the grid.
+
+            - M (int): Number of columns in the grid.
+        """
+        self.N = N
+        self.M = M
+        self.cells = {}
+
+    def cell(self, row, col):
+        cell = self.cells.get((row, col))
+        if cell is None:
+            cell = self.cells[row, col] = Cell(position=(row, col))
+        return cell
+
+    def peek(self, row, col):
+        return self.cells.get((row, col))
+
+    def release(self, row, col):
+        cell = self.cells.get((row, col))
+        if cell is not None and cell.agent is None and cell.object is None:
+            del self.cells[row, col]
+
+    def __len__(self):
+        return len(self.cells)
+
+
+class MappedCell:
+    """A MappedCell class, a view of a cell of a MappedGrid with the
+    attributes of a Cell : reading or setting its agent or its object reads
+    or writes the key in the planes of the grid."""
+
+    __slots__ = ("grid", "row", "col")
+
+    def __init__(self, grid, row, col):
+        self.grid = grid
+        self.row = row
+        self.col = col
+
+    @property
+    def position(self):
+        return (self.row, self.col)
+
+    @property
+    def agent(self):
+        key = self.grid.read(0, self.row, self.col)
+        return self.grid.agents[key] if key else None
+
+    @agent.setter
+    def agent(self, agent):
+        self.grid.write(0, self.row, self.col, agent)
+
+    @property
+    def object(self):
+        key = self.grid.read(1, self.row, self.col)
+        return self.grid.objects[key] if key else None
+
+    @object.setter
+    def object(self, obj):
+        self.grid.write(1, self.row, self.col, obj)
+
+
+class MappedGrid:
+    """A MappedGrid class, the agent and object planes of the grid in
+    memory-mapped files, laid out tile by tile so that a tile is contiguous
+    on disk. The tiles in use are copied in memory, and written back when they
+    leave the cache of the hot tiles : as the agents only move to the
+    neighbouring cells, the tiles around them stay in the cache."""
+
+    def __init__(self, N, M, directory, tile=TILE, cache_tiles=CACHE_TILES):
+        """Instanciates a MappedGrid object, with empty planes.
+
+        Args:
+            - N (int): Number of rows in the grid.
+
+            - M (int): Number of columns in the grid.
+
+            - directory (str): The directory of the plane files, created if
+            needed. Previous planes in it are overwritten.
+
+            - tile (int, optional): Side of the tiles. Defaults to TILE.
+
+            - cache_tiles (int, optional): Number of tiles kept in memory.
+            Defaults to CACHE_TILES.
+        """
+        self.N = N
+        self.M = M
+        self.directory = directory
+        self.tile = tile
+        self.cache_tiles = cache_tiles
+        os.makedirs(directory, exist_ok=True)
+
+        # The files are created sparse : only the written tiles use the disk
+        shape = (-(-N // tile), -(-M // tile), tile, tile)
+        self.planes = [np.memmap(os.path.join(directory, f"{name}.plane"),
+                                 dtype=np.int32, mode="w+", shape=shape)
+                       for name in PLANES]
+
+        # Hot tiles, the least recently used first : for each, one array per
+        # plane, and whether it was modified. The tiles never written back
+        # are empty, and are not read from the files
+        self.tiles = OrderedDict()
+        self.written = set()
+
+        # The agents and objects placed on the grid, by key
+        self.agents = {}
+        self.objects = {}
+
+        # The modified hot tiles are written back when the grid is collected,
+        # or at the exit of the interpreter
+        weakref.finalize(self, write_tiles, self.tiles, self.planes, self.written)
+
+    def load_tile(self, key):
+        """Copies a tile in the cache, writing back the least recently used
+        one if the cache is full."""
+        if len(self.tiles) >= self.cache_tiles:
+            old_key, old = self.tiles.popitem(last=False)
+            write_tile(self.planes, self.written, old_key, old)
+        if key in self.written:
+            arrays = [np.array(plane[key]) for plane in self.planes]
+        else:
+            arrays = [np.zeros((self.tile, self.tile), dtype=np.int32) for _ in self.planes]
+        tile = self.tiles[key] = [arrays, False]
+        return tile
+
+    def get_tile(self, row, col):
+        key = (row // self.tile, col // self.tile)
+        tile = self.tiles.get(key)
+        if tile is None:
+            return self.load_tile(key)
+        self.tiles.move_to_end(key)
+        return tile
+
+    def read(self, plane, row, col):
+        """Returns the key stored in a plane for a cell, 0 if there is none."""
+        arrays, _ = self.get_tile(row, col)
+        return int(arrays[plane][row % self.tile, col % self.tile])
+
+    def write(self, plane, row, col, entity):
+        """Stores the key of an agent or an object (plane 0 or 1) in a cell,
+        0 for None."""
+        tile = self.get_tile(row, col)
+        if entity is None:
+            key = 0
+        else:
+            key = entity.key
+            (self.agents if plane == 0 else self.objects)[key] = entity
+        tile[0][plane][row % self.tile, col % self.tile] = key
+        tile[1] = True
+
+    def cell(self, row, col):
+        return MappedCell(self, row, col)
+
+    def peek(self, row, col):
+        return MappedCell(self, row, col)
+
+    def release(self, row, col):
+        pass
+
+    def flush(self):
+        """Writes the modified hot tiles back to the files."""
+        write_tiles(self.tiles, self.planes, self.written)
+
+
+def write_tile(planes, written, key, tile):
+    """Writes a tile of a MappedGrid back to its planes if it was modified."""
+    arrays, dirty = tile
+    if dirty:
+        for plane, array in zip(planes, arrays):
+            plane[key] = array
+        written.add(key)
+        tile[1] = False
+
+
+def write_tiles(tiles, planes, written):
+    """Writes the modified hot tiles of a MappedGrid back to the files. It
+    takes the state of the grid rather than the grid, so that it can be called
+    once the grid is collected."""
+    for key, tile in tiles.items():
+        write_tile(planes, written, key, tile)
+    for plane in planes:
+        plane.flush()
+
+
+def make_grid(N, M, sparse=None, directory=None):
+    """Creates the grid of an Environment.
+
+    Args:
+        - N (int): Number of rows in the grid.
+
+        - M (int): Number of columns in the grid.
+
+        - sparse (bool, optional): Whether the grid is sparse. Defaults to
+        None, for a sparse grid above SPARSE_AREA cells.
+
+        - directory (str, optional): The directory of the planes of a
+        memory-mapped grid, which takes precedence over sparse. Defaults to
+        None.
+
+    Returns:
+        DenseGrid, SparseGrid or MappedGrid: The empty grid.
+    """
+    if directory is not None:
+        return MappedGrid(N, M, directory)
+    if sparse is None:
+        sparse = N * M > SPARSE_AREA
+    return SparseGrid(N, M) if sparse else DenseGrid(N, M)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with an opt-in instrumentation of the simulation : an Instrumentation
+object attached to an environment records the time spent in each phase of the
+rounds, and counts the moves, blocked moves, picks, drops and classification
+errors, then exports them as one record every K rounds. It can also run a
+SamplingProfiler over a range of rounds.
+
+Attaching it wraps the timed methods on the instance of the environment, and
+moves its agents, which have no instance dict, to a subclass of their class
+with the timed methods : an environment that is not instrumented runs the
+plain methods, at no cost.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from categories import EMPTY
+
+# Methods timed on the environment, by phase
+ENVIRONMENT_PHASES = {"shuffle": "rng.shuffle", "perception": "empty_cells",
+                      "move": "move"}
+AGENT_PHASES = {"observe": "observe", "decision": ["will_pick", "will_drop"],
+                "pick_drop": ["pick", "drop"], "memory": "update_memory"}
+VECTORIZED_PHASES = {"move": "move_agents", "observe": "misclassify",
+                     "pick_drop": "pick_and_drop",
+                     "memory": ["update_memory", "rotate_memory"]}
+
+COUNTERS = ["moves", "blocked_moves", "picks", "drops", "misclassifications"]
+
+
+class Instrumentation:
+    """An Instrumentation class, that times the phases of the rounds of an
+    environment, counts its events, and exports them every K rounds. It is an
+    observer of the picks and drops."""
+
+    def __init__(self, every=1000, path=None, profile_rounds=None, profile_path="profile.txt"):
+        """Instanciates an Instrumentation object
+
+        Args:
+            - every (int, optional): Number of rounds between two records.
+            Defaults to 1000.
+
+            - path (str, optional): JSON lines file the records are appended
+            to. Defaults to None, for keeping them in the records attribute.
+
+            - profile_rounds (tuple[int, int], optional): The first and last
+            rounds profiled with a SamplingProfiler. Defaults to None.
+
+            - profile_path (str, optional): The file of the profile, in the
+            collapsed stacks format. Defaults to "profile.txt".
+        """
+        self.every = every
+        self.path = path
+        self.profile_rounds = profile_rounds
+        self.profile_path = profile_path
+        self.profiler = None
+
+        self.records = []
+        self.reset()
+
+    def reset(self):
+        """Starts a new record."""
+        self.times = defaultdict(float)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.start = time.perf_counter()
+        self.rounds = 0
+
+    def timed(self, phase, method):
+        """Returns the method wrapped with a timer adding to the phase."""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.times[phase] += time.perf_counter() - start
+        return timed
+
+    def wrap(self, target, phases):
+        """Wraps the methods of each phase on the target instance.
+
+        Args:
+            - target (object): The instance.
+
+            - phases (dict[str, str or List[str]]): The dotted path of the
+            method, or methods, of each phase, from the target.
+        """
+        for phase, paths in phases.items():
+            for path in [paths] if isinstance(paths, str) else paths:
+                *owners, name = path.split(".")
+                owner = target
+                for attribute in owners:
+                    owner = getattr(owner, attribute)
+                setattr(owner, name, self.timed(phase, getattr(owner, name)))
+
+    def attach(self, env):
+        """Instruments an environment, an Environment or a
+        VectorizedEnvironment, and its agents.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The environment.
+        """
+        env.observers.append(self)
+
+        if hasattr(env, "move_agents"):
+            self.wrap(env, VECTORIZED_PHASES)
+            self.count_vectorized(env)
+        else:
+            self.wrap(env, ENVIRONMENT_PHASES)
+            self.count_environment(env)
+            classes = {}
+            for agent_data in env.agents.values():
+                agent = agent_data.agent
+                cls = type(agent)
+                if cls not in classes:
+                    classes[cls] = self.agent_class(cls)
+                agent.__class__ = classes[cls]
+
+        self.reset()
+        self.update_profiler(env)
+
+    def count_environment(self, env):
+        """Counts the moves and the blocked moves of an Environment, wrapping
+        its move and empty_cells methods."""
+        move, empty_cells = env.move, env.empty_cells
+
+        def counted_move(*args, **kwargs):
+            self.counts["moves"] += 1
+            return move(*args, **kwargs)
+
+        def counted_empty_cells(*args, **kwargs):
+            empty = empty_cells(*args, **kwargs)
+            if not empty:
+                self.counts["blocked_moves"] += 1
+            return empty
+
+        env.move, env.empty_cells = counted_move, counted_empty_cells
+
+    def agent_class(self, cls):
+        """Returns a subclass of an agent class whose methods are timed, and
+        whose observe method counts the classification errors. It adds no
+        slot, so that the agents can be moved to it.
+
+        Args:
+            - cls (type): The class of the agents.
+
+        Returns:
+            type: The instrumented subclass.
+        """
+        methods = {"__slots__": ()}
+        for phase, names in AGENT_PHASES.items():
+            for name in [names] if isinstance(names, str) else names:
+                methods[name] = self.timed(phase, getattr(cls, name))
+
+        observe = methods["observe"]
+
+        def counted_observe(agent, cell):
+            category = observe(agent, cell)
+            if category != (cell.object.category if cell.object is not None else EMPTY):
+                self.counts["misclassifications"] += 1
+            return category
+
+        methods["observe"] = counted_observe
+        return type(cls.__name__, (cls,), methods)
+
+    def count_vectorized(self, env):
+        """Counts the moves, the blocked moves and the classification errors
+        of a VectorizedEnvironment, wrapping its move_agents and misclassify
+        methods."""
+        move_agents, misclassify = env.move_agents, env.misclassify
+
+        def counted_move_agents(agents):
+            rows, cols = env.rows[agents], env.cols[agents]
+            result = move_agents(agents)
+            moved = int(((env.rows[agents] != rows) | (env.cols[agents] != cols)).sum())
+            self.counts["moves"] += moved
+            self.counts["blocked_moves"] += len(agents) - moved
+            return result
+
+        def counted_misclassify(codes):
+            self.counts["misclassifications"] += len(codes)
+            return misclassify(codes)
+
+        env.move_agents, env.misclassify = counted_move_agents, counted_misclassify
+
+    @contextmanager
+    def phase(self, name):
+        """Times a block of code as the given phase, for the phases outside of
+        the environment, such as the plots."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+
+    def on_pick(self, env, key, object_key, category, position):
+        self.counts["picks"] += 1
+
+    def on_drop(self, env, key, object_key, category, position):
+        self.counts["drops"] += 1
+
+    def update(self, env):
+        """Exports a record if the round of the environment is a multiple of
+        every, and starts or stops the profiler. Meant to be called at the end
+        of every round.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The environment.
+        """
+        self.rounds += 1
+        if env.round % self.every == 0:
+            self.export(env)
+        self.update_profiler(env)
+
+    def update_profiler(self, env):
+        """Starts the profiler before the first profiled round, and stops it
+        after the last one."""
+        if not self.profile_rounds:
+            return
+        first, last = self.profile_rounds
+        if self.profiler is None and first <= env.round + 1 <= last:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+        elif self.profiler is not None and env.round >= last:
+            self.profiler.stop()
+            self.profiler.save(self.profile_path)
+            self.profile_rounds = self.profiler = None
+
+    def record(self, env):
+        """Returns the record of the rounds since the last one.
+
+        Returns:
+            dict: The round, the number of rounds, their wall time, the time
+            spent in each phase (the rest being "other") and the counts.
+        """
+        wall_time = time.perf_counter() - self.start
+        phases = dict(self.times)
+        phases["other"] = max(wall_time - sum(phases.values()), 0.)
+        return {"round": env.round, "rounds": self.rounds,
+                "wall_time": wall_time,
+                "rounds_per_second": self.rounds / wall_time if wall_time else 0.,
+                "phases": phases, "counts": dict(self.counts)}
+
+    def export(self, env):
+        """Appends the record of the rounds since the last one to the file, or
+        to the records, and starts a new one."""
+        record = self.record(env)
+        if self.path:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(record) + "\n")
+        else:
+            self.records.append(record)
+        self.reset()
+
+
+class SamplingProfiler:
+    """A SamplingProfiler class, a thread that samples the call stack of the
+    thread that started it at a fixed interval. Unlike a deterministic
+    profiler, its overhead does not depend on the number of calls."""
+
+    def __init__(self, interval=0.005):
+        """Instanciates a SamplingProfiler object, profiling the current
+        thread once started.
+
+        Args:
+            - interval (float, optional): Seconds between two samples.
+            Defaults to 0.005.
+        """
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, path):
+        """Writes the samples in the collapsed stacks format, one line per
+        stack with its number of samples, readable by flame graph tools."""
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
@@ -8,15 +8,19 @@ of class B, n_agents agents, and the purpose of the agents is to walk randomly,
 and sort the objects with few rules described in Deneubourg, Jean-Louis et al. 
 “The dynamics of collective sorting robot-like ants and ant-like robots.”
 
+The progress, plots, checkpoints, recordings and instrumentation of the run
+are observers selected by name (see observers.py), imported only if they are
+requested : a run without observers only loads the simulation engine.
+
+Usage : python main.py --observe progress convergence --rounds 100000 --seed 0
+
 @authors: Nathan Etourneau, Paul Flagel
 """
 
-import random
-
-import matplotlib.pyplot as plt
+import argparse
+import importlib
 
-from environment import Environment
-from visualization import update_matplotlib_plot
+from observers import OBSERVERS, PLOT_EVERY, PROGRESS_EVERY, attach, run
 
 N = 200
 M = 300
@@ -28,34 +32,222 @@ KMINUS = 0.3
 MEMORY_BUFFER_SIZE = 50
 N_ROUNDS = 2000000
 ERROR_RATE = 0.
-
-
-def main(n_rounds, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size, error_rate):
-    env = Environment(N, M, na, nb, n_agents, kplus, kminus,
-                      memory_buffer_size, error_rate)
-
-    fig = plt.figure("Collective Sorting")
-    ax = fig.add_subplot(111)
-
-    # Loop
-    keys = list(env.agents.keys())
-
-    for round in range(1, n_rounds + 1):
-        if round % 1000 == 0:
-            print(f"Round n°{round}")
-
-        # Shuffle the agents to mimic the fact that the movement is erratic
-        random.shuffle(keys)
-
-        for key in keys:
-            agent = env.agents[key].agent
-            empty_cells = agent.perception(env)
-            agent.action(env, empty_cells)
-
-        if (round) % 50000 == 0:
-            update_matplotlib_plot(env, ax)
+ENGINE = "python"
+SEED = None
+
+# Fast-forward of the agents walking through empty space, for the engines of
+# FAST_FORWARD_ENGINES only
+FAST_FORWARD = False
+FAST_FORWARD_ENGINES = ["python"]
+
+# Observers of the run, by name (see observers.py), besides the ones enabled
+# by the settings below. Without a plot, matplotlib is never imported.
+OBSERVE = ["progress"]
+
+# Auto-checkpointing, disabled when CHECKPOINT_DIR is None. With RESUME, the
+# run continues from the latest checkpoint of CHECKPOINT_DIR, if any.
+CHECKPOINT_DIR = None
+CHECKPOINT_EVERY = 100000
+CHECKPOINT_KEEP = 2
+RESUME = False
+
+# Recording of the pick/drop events, disabled when RECORD_DIR is None
+RECORD_DIR = None
+RECORD_EVERY = 10000
+
+# Capture of the layout every CAPTURE_EVERY rounds, for an animation exported
+# afterwards with animation.py, disabled when CAPTURE_DIR is None. With
+# PLOT = False, the run draws nothing while it goes on.
+CAPTURE_DIR = None
+CAPTURE_EVERY = 10000
+PLOT = True
+
+# Instrumentation of the phases and events of the rounds, disabled when
+# INSTRUMENT_PATH is None : one JSON record is appended to it every
+# INSTRUMENT_EVERY rounds. PROFILE_ROUNDS, a (first, last) range of rounds, is
+# profiled with a sampling profiler if given.
+INSTRUMENT_PATH = None
+INSTRUMENT_EVERY = 10000
+PROFILE_ROUNDS = None
+PROFILE_PATH = "profile.txt"
+
+# Early stopping once the fraction of same-category neighbours stays within
+# CONVERGENCE_TOLERANCE over CONVERGENCE_WINDOW samples taken every
+# CONVERGENCE_EVERY rounds, N_ROUNDS being the upper bound. Disabled when
+# STOP_ON_CONVERGENCE is False.
+STOP_ON_CONVERGENCE = True
+CONVERGENCE_EVERY = 1000
+CONVERGENCE_WINDOW = 20
+CONVERGENCE_TOLERANCE = 0.005
+
+# The plot is redrawn once the layout changed by FRAME_CHANGE since the last
+# one (see controller.py), at least MIN_FRAME_GAP rounds later
+FRAME_CHANGE = 0.02
+MIN_FRAME_GAP = 10000
+
+# Result cache (see cache.py), disabled when CACHE_DIR is None or without a
+# SEED : a run starts from the longest cached run of the same configuration,
+# and its final state is stored at the end
+CACHE_DIR = None
+
+# Available simulation engines, by name, imported when selected
+ENGINES = {"python": "environment:Environment", "numpy": "vectorized:VectorizedEnvironment"}
+
+
+def load_engine(engine):
+    """Returns the environment class of an engine, importing its module."""
+    module, class_name = ENGINES[engine].split(":")
+    return getattr(importlib.import_module(module), class_name)
+
+
+def default_observers(settings):
+    """Returns the names of the observers enabled by the constants of this
+    module and by the settings of the run (a checkpoint directory enables the
+    checkpoints, and so on)."""
+    names = list(OBSERVE)
+    if STOP_ON_CONVERGENCE:
+        names.append("convergence")
+    if PLOT:
+        names.append("plot")
+    for name, setting in [("checkpoint", "checkpoint_dir"), ("record", "record_dir"),
+                          ("capture", "capture_dir"), ("instrument", "instrument_path")]:
+        if settings[setting]:
+            names.append(name)
+    return names
+
+
+def default_settings():
+    """Returns the settings of the observers, from the constants of this
+    module."""
+    return {"progress_every": PROGRESS_EVERY, "plot_every": PLOT_EVERY,
+            "convergence_every": CONVERGENCE_EVERY,
+            "convergence_window": CONVERGENCE_WINDOW,
+            "convergence_tolerance": CONVERGENCE_TOLERANCE,
+            "frame_change": FRAME_CHANGE, "min_frame_gap": MIN_FRAME_GAP,
+            "checkpoint_dir": CHECKPOINT_DIR, "checkpoint_every": CHECKPOINT_EVERY,
+            "checkpoint_keep": CHECKPOINT_KEEP,
+            "record_dir": RECORD_DIR, "record_every": RECORD_EVERY,
+            "capture_dir": CAPTURE_DIR, "capture_every": CAPTURE_EVERY,
+            "instrument_path": INSTRUMENT_PATH, "instrument_every": INSTRUMENT_EVERY,
+            "profile_rounds": PROFILE_ROUNDS, "profile_path": PROFILE_PATH}
+
+
+def main(n_rounds, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size, error_rate, engine=ENGINE, seed=SEED, observers=None, settings=None, resume=RESUME, cache_dir=CACHE_DIR, fast_forward=FAST_FORWARD):
+    """Runs the multi-agent system.
+
+    Args:
+        - n_rounds (int): The largest number of rounds.
+
+        - N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size,
+        error_rate : The parameters of the environment.
+
+        - engine (str, optional): The engine, a key of ENGINES. Defaults to
+        ENGINE.
+
+        - seed (int, optional): The seed of the run. Defaults to SEED.
+
+        - observers (List[str], optional): The names of the observers, see
+        observers.py. Defaults to None, for default_observers.
+
+        - settings (dict, optional): The settings of the observers, updating
+        default_settings(). Defaults to None.
+
+        - resume (bool, optional): Whether the run continues from the latest
+        checkpoint of the checkpoint directory. Defaults to RESUME.
+
+        - cache_dir (str, optional): The directory of the result cache.
+        Defaults to CACHE_DIR.
+
+        - fast_forward (bool, optional): Whether the python engine
+        fast-forwards the agents walking through empty space. Defaults to
+        FAST_FORWARD.
+    """
+    settings = {**default_settings(), **(settings or {})}
+    observers = default_observers(settings) if observers is None else observers
+    checkpoint_dir = settings["checkpoint_dir"]
+
+    checkpoint = None
+    if checkpoint_dir and resume:
+        from checkpoint import latest_checkpoint
+        checkpoint = latest_checkpoint(checkpoint_dir)
+
+    cache = None
+    if cache_dir and seed is not None:
+        from cache import ResultCache
+        cache = ResultCache(cache_dir)
+    config = {"N": N, "M": M, "na": na, "nb": nb, "n_agents": n_agents,
+              "kplus": kplus, "kminus": kminus,
+              "memory_buffer_size": memory_buffer_size, "error_rate": error_rate}
+    # The final states of the fast-forwarded runs hold walks in progress, so
+    # they are cached apart (the key of the other runs is the one of sweep.py)
+    if fast_forward:
+        config["fast_forward"] = True
+    cached = cache.longest_prefix(engine, config, seed, n_rounds) if (
+        cache and not checkpoint) else None
+
+    if checkpoint:
+        env = load_engine(engine).load(checkpoint)
+        print(f"Resuming from {checkpoint}")
+    elif cached:
+        env = cache.load(cached)
+        print(f"Resuming from the cached run of {env.round} rounds")
+    else:
+        env = load_engine(engine)(N, M, na, nb, n_agents, kplus, kminus,
+                                  memory_buffer_size, error_rate, seed)
+
+    walk_ends = getattr(env, "walk_ends", None)
+    walking = walk_ends is not None and (walk_ends > env.round).any()
+    if walking and not fast_forward:
+        raise ValueError("The run was saved in the middle of fast-forwarded walks, "
+                         "and must be resumed with the fast-forward")
+
+    step = env.step
+    if fast_forward:
+        from scheduler import FastForwardScheduler
+        step = FastForwardScheduler(env).step
+
+    run(env, step, n_rounds, attach(observers, env, settings))
+
+    if cache and not cache.get(engine, config, seed, env.round):
+        cache.store(engine, config, seed, env)
+    return env
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=N_ROUNDS)
+    for name, default in [("N", N), ("M", M), ("na", NA), ("nb", NB),
+                          ("n_agents", N_AGENTS), ("kplus", KPLUS), ("kminus", KMINUS),
+                          ("memory_buffer_size", MEMORY_BUFFER_SIZE),
+                          ("error_rate", ERROR_RATE)]:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name,
+                            type=type(default), default=default)
+    parser.add_argument("--engine", choices=list(ENGINES), default=ENGINE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--observe", nargs="*", default=None, metavar="OBSERVER",
+                        help=f"Observers of the run, among {list(OBSERVERS)} or "
+                        "module:Class, none for a pure-compute run. Defaults to "
+                        "the ones enabled in main.py")
+    parser.add_argument("--fast-forward", action="store_true", default=FAST_FORWARD)
+    parser.add_argument("--resume", action="store_true", default=RESUME)
+    parser.add_argument("--cache", default=CACHE_DIR,
+                        help="Directory of the result cache")
+    for name, default in default_settings().items():
+        if name != "profile_rounds":
+            parser.add_argument(f"--{name.replace('_', '-')}", dest=name,
+                                type=type(default) if default is not None else str,
+                                default=default)
+    args = parser.parse_args()
+    if args.fast_forward and args.engine not in FAST_FORWARD_ENGINES:
+        parser.error(f"--fast-forward is only supported by the engines "
+                     f"{FAST_FORWARD_ENGINES}, not by {args.engine!r}")
+    return args
 
 
 if __name__ == '__main__':
-    main(N_ROUNDS, N, M, NA, NB, N_AGENTS, KPLUS,
-         KMINUS, MEMORY_BUFFER_SIZE, ERROR_RATE)
+    args = parse_args()
+    main(args.rounds, args.N, args.M, args.na, args.nb, args.n_agents, args.kplus,
+         args.kminus, args.memory_buffer_size, args.error_rate, args.engine, args.seed,
+         args.observe, {name: getattr(args, name) for name in default_settings()
+                        if hasattr(args, name)},
+         args.resume, args.cache, args.fast_forward)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a Memory class, the fixed-size memory of an agent. It is a ring
+buffer of the last category codes seen, with running counts per category, so
+that pushing a category and counting a category are both O(1), whatever the
+number of categories.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+from categories import category_name
+
+
+class Memory:
+    """A Memory class that stores the last category codes seen by an agent
+    (0 when there was no object on the cell), up to a given size. When the
+    memory is full, pushing a category forgets the oldest one.
+    """
+
+    __slots__ = ("size", "buffer", "head", "length", "counts")
+
+    def __init__(self, size, n_categories=2):
+        """Instanciates an empty Memory object
+
+        Args:
+            - size (int): The maximum number of categories remembered.
+
+            - n_categories (int, optional): The number of categories. Defaults
+            to 2.
+        """
+        self.size = size
+        self.buffer = [0] * size
+        self.head = 0
+        self.length = 0
+        self.counts = [0] * (n_categories + 1)
+
+    def push(self, category):
+        """Remembers a new category, forgetting the oldest one if the memory
+        is full.
+
+        Args:
+            - category (int): The category code to remember.
+        """
+        if self.length == self.size:
+            oldest = self.buffer[self.head]
+            self.counts[oldest] -= 1
+        else:
+            self.length += 1
+
+        self.buffer[self.head] = category
+        self.counts[category] += 1
+        self.head = (self.head + 1) % self.size
+
+    def count(self, category):
+        """Returns the number of times the given category is remembered.
+
+        Args:
+            - category (int): The category code one wants to count.
+
+        Returns:
+            int: The number of occurrences of the category in the memory.
+        """
+        return self.counts[category]
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        """Iterates over the remembered category codes, the most recent
+        first."""
+        for i in range(1, self.length + 1):
+            yield self.buffer[(self.head - i) % self.size]
+
+    def __str__(self):
+        """The memory as a string of category names, the most recent
+        first."""
+        return ",".join(category_name(code) for code in self)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with helpers measuring how well the objects are sorted.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+# The eight neighbours of a cell
+NEIGHBOURS = [(drow, dcol) for drow in (-1, 0, 1)
+              for dcol in (-1, 0, 1) if drow != 0 or dcol != 0]
+
+
+def same_category_fraction(env):
+    """Computes the fraction of same-category neighbours : among all the
+    pairs of neighbouring objects on the grid, the fraction of pairs whose
+    objects share the same category. It is 1 when the categories are perfectly
+    segregated.
+
+    Args:
+        - env (Environment or VectorizedEnvironment): The environment.
+
+    Returns:
+        float: The fraction of same-category neighbours, 0 if no object has a
+        neighbour.
+    """
+    categories = {obj.position: obj.category for obj in env.objects.values()
+                  if obj.position is not None}
+
+    same = 0
+    total = 0
+    for (row, col), category in categories.items():
+        for drow, dcol in NEIGHBOURS:
+            neighbour = categories.get((row + drow, col + dcol))
+            if neighbour is not None:
+                total += 1
+                same += neighbour == category
+
+    return same / total if total else 0.
+
+
+class ClusterMetrics:
+    """A ClusterMetrics class that maintains clustering metrics of the objects
+    lying on the grid, updated at every pick and drop so that reading them is
+    O(1) :
+        - the fraction of same-category neighbours,
+
+        - the number of clusters per category (and in total), a cluster being a set of
+        neighbouring objects of the same category, tracked with a union-find
+        structure,
+
+        - the mean cluster size.
+
+    It is meant to be registered as an observer of an environment.
+    """
+
+    def __init__(self, objects=()):
+        """Instanciates a ClusterMetrics object
+
+        Args:
+            - objects (Iterable[Object], optional): The initial objects.
+            Carried objects (with a None position) are ignored. Defaults to
+            no object.
+        """
+        # Category of the object on each occupied cell
+        self.categories = {}
+
+        # Union-find forest over the occupied cells
+        self.parent = {}
+        self.size = {}
+
+        self.clusters = {}
+        self.counts = {}
+        self.n_clusters = 0
+
+        # Unordered pairs of neighbouring objects
+        self.same_pairs = 0
+        self.total_pairs = 0
+
+        for obj in objects:
+            if obj.position is not None:
+                self.add(obj.position, obj.category)
+
+    def find(self, position):
+        """Returns the root of the cluster of the object at the given position,
+        with path halving.
+
+        Args:
+            - position (tuple[int, int]): The position of an object.
+
+        Returns:
+            tuple[int, int]: The position of the root of its cluster.
+        """
+        parent = self.parent
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    def union(self, first, second):
+        """Merges the clusters of two objects.
+
+        Returns:
+            bool: True if two different clusters were merged.
+        """
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return False
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.size[first] += self.size.pop(second)
+        return True
+
+    def add(self, position, category):
+        """Takes into account an object placed at the given position.
+
+        Args:
+            - position (tuple[int, int]): The position of the object.
+
+            - category (int): The category code of the object.
+        """
+        self.categories[position] = category
+        self.parent[position] = position
+        self.size[position] = 1
+        self.clusters[category] = self.clusters.get(category, 0) + 1
+        self.counts[category] = self.counts.get(category, 0) + 1
+        self.n_clusters += 1
+
+        row, col = position
+        for drow, dcol in NEIGHBOURS:
+            neighbour = (row + drow, col + dcol)
+            neighbour_category = self.categories.get(neighbour)
+            if neighbour_category is None:
+                continue
+            self.total_pairs += 1
+            if neighbour_category == category:
+                self.same_pairs += 1
+                if self.union(position, neighbour):
+                    self.clusters[category] -= 1
+                    self.n_clusters -= 1
+
+    def remove(self, position):
+        """Takes into account the removal of the object at the given position.
+        As a union-find cannot be split, the cluster of the object is relabeled
+        by a traversal of its remaining members, which costs its size and never
+        a scan of the grid.
+
+        Args:
+            - position (tuple[int, int]): The position of the object.
+        """
+        root = self.find(position)
+        category = self.categories.pop(position)
+        self.counts[category] -= 1
+
+        row, col = position
+        same = []
+        for drow, dcol in NEIGHBOURS:
+            neighbour = (row + drow, col + dcol)
+            neighbour_category = self.categories.get(neighbour)
+            if neighbour_category is None:
+                continue
+            self.total_pairs -= 1
+            if neighbour_category == category:
+                self.same_pairs -= 1
+                same.append(neighbour)
+
+        del self.parent[position]
+        del self.size[root]
+        self.clusters[category] -= 1
+        self.n_clusters -= 1
+
+        # The remaining members form as many clusters as there are connected
+        # components reachable from the same-category neighbours
+        relabeled = set()
+        for start in same:
+            if start in relabeled:
+                continue
+            relabeled |= self.relabel(start, category)
+            self.clusters[category] += 1
+            self.n_clusters += 1
+
+    def relabel(self, start, category):
+        """Makes the connected component of start, among the objects of the
+        given category, a cluster rooted at start.
+
+        Returns:
+            set[tuple[int, int]]: The positions of the objects of the cluster.
+        """
+        self.parent[start] = start
+        visited = {start}
+        stack = [start]
+        while stack:
+            row, col = stack.pop()
+            for drow, dcol in NEIGHBOURS:
+                neighbour = (row + drow, col + dcol)
+                if neighbour not in visited and \
+                        self.categories.get(neighbour) == category:
+                    self.parent[neighbour] = start
+                    visited.add(neighbour)
+                    stack.append(neighbour)
+        self.size[start] = len(visited)
+        return visited
+
+    def on_pick(self, env, key, object_key, category, position):
+        self.remove(position)
+
+    def on_drop(self, env, key, object_key, category, position):
+        self.add(position, category)
+
+    @property
+    def same_category_fraction(self):
+        """Fraction of the pairs of neighbouring objects sharing the same
+        category, 0 if no object has a neighbour."""
+        return self.same_pairs / self.total_pairs if self.total_pairs else 0.
+
+    @property
+    def mean_cluster_size(self):
+        """Mean number of objects per cluster, 0 if there is no object."""
+        if not self.n_clusters:
+            return 0.
+        return len(self.categories) / self.n_clusters
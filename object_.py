@@ -3,8 +3,13 @@
 
 """
 Module with an Object class used to modelize the objects in the grid. An object 
-is described by its category, its position, and its parent : a Cell object, or
-an Agent object, depending on what kind of thing is holding the object.
+is described by its category, its position, and its parent : the key of the
+agent carrying it, or None when it lies on the grid, in the cell at its
+position.
+
+The parent is a key and not a reference to the Cell or the Agent, so that the
+objects, the cells and the agents do not form reference cycles, that the
+cyclic garbage collector would have to walk on long runs.
 
 @authors: Nathan Etourneau, Paul Flagel
 """
@@ -14,22 +19,26 @@ class Object:
     """An Object class used to modelize the objects in the grid. It has 4 
     attributes : key : the key of the object, category : the category of the 
     object, position : it the object is in the grid, its a tuple with its 
-    position, and if the object is carried by an agent, it is None."""
+    position, and if the object is carried by an agent, it is None, and
+    parent : the key of the agent carrying the object, None if it is in the
+    grid."""
+
+    __slots__ = ("key", "category", "position", "parent")
 
-    def __init__(self, key, category, position, parent):
+    def __init__(self, key, category, position, parent=None):
         """Instanciates an Object object
 
         Args:
             - key (str): The key of the object for further reference to it.
 
-            - category (str): A character encoding the category of the object.
+            - category (int): The code of the category of the object.
 
             - position (tuple[int, int] or None): If the object is in the grid, 
             a tuple in the form (row, col). If the object is carried by an 
             agent, it is None.
 
-            - parent (Cell or Agent): The object that holds the object. It can be
-            a Cell instance or an Agent instance.
+            - parent (int, optional): The key of the agent carrying the
+            object. Defaults to None, for an object lying in the grid.
         """
         self.key = key
         self.category = category
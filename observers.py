@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with the observers of the runs of main.py, selected by name : each one
+is only imported and built when it is requested, so that a run without plots
+never loads the plotting libraries, and an observer that is not attached
+costs nothing. An observer is built from the environment and the settings of
+the run, and may have :
+    - every (int) and update(env) : update is called at the end of every
+    round multiple of every, and returns True to stop the run,
+
+    - on_pick and on_drop : the observer is then registered on the picks and
+    drops of the environment,
+
+    - close(env) : called once at the end of the run,
+
+    - phase (str) : the name under which the time spent in update is
+    reported by the instrumentation, if it is attached.
+
+Besides the names of OBSERVERS, any class can be given as "module:Class".
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import importlib
+
+# Rounds between two lines of progress, and between two checks of whether a
+# new frame is due
+PROGRESS_EVERY = 1000
+PLOT_EVERY = 1000
+
+
+class Progress:
+    """Prints the round, the sortedness and the number of clusters."""
+
+    def __init__(self, env, settings):
+        self.every = settings.get("progress_every", PROGRESS_EVERY)
+
+    def update(self, env):
+        print(f"Round n°{env.round} - same-category neighbours : "
+              f"{env.metrics.same_category_fraction:.3f}, clusters : "
+              f"{env.metrics.n_clusters}")
+
+
+class Convergence:
+    """Stops the run once it has converged, see controller.py."""
+
+    def __init__(self, env, settings):
+        from controller import RunController
+
+        self.controller = RunController(
+            settings.get("convergence_statistic", "sortedness"),
+            settings["convergence_every"], settings["convergence_window"],
+            settings["convergence_tolerance"])
+        self.every = self.controller.every
+        env.observers.append(self.controller)
+
+    def update(self, env):
+        if not self.controller.update(env):
+            return False
+        print(f"Converged at round n°{env.round} - same-category neighbours : "
+              f"{env.metrics.same_category_fraction:.3f}")
+        return True
+
+
+class Plot:
+    """Draws the layout with matplotlib, once it changed enough since the
+    last frame (see RunController.frame_due), and at the end of the run."""
+
+    phase = "plotting"
+
+    def __init__(self, env, settings):
+        import matplotlib.pyplot as plt
+
+        from controller import RunController
+        from snapshot import Snapshot
+        from visualization import update_matplotlib_plot
+
+        self.draw = update_matplotlib_plot
+        self.every = settings.get("plot_every", PLOT_EVERY)
+        self.controller = RunController(frame_change=settings["frame_change"],
+                                        min_frame_gap=settings["min_frame_gap"])
+
+        # Index of the objects on the grid, for the plots
+        env.observers.append(Snapshot(env.N, env.M, env.objects.values()))
+
+        fig = plt.figure("Collective Sorting")
+        self.ax = fig.add_subplot(111)
+
+    def update(self, env):
+        if self.controller.frame_due(env):
+            self.draw(env, self.ax)
+            self.controller.frame_drawn(env)
+
+    def close(self, env):
+        if self.controller.last_frame is None or self.controller.last_frame[0] != env.round:
+            self.draw(env, self.ax)
+
+
+class Checkpoints:
+    """Checkpoints the run, see checkpoint.py."""
+
+    phase = "checkpointing"
+
+    def __init__(self, env, settings):
+        from checkpoint import Checkpointer
+
+        if not settings.get("checkpoint_dir"):
+            raise ValueError("The checkpoint observer needs a checkpoint directory")
+        self.checkpointer = Checkpointer(settings["checkpoint_dir"],
+                                         settings["checkpoint_every"],
+                                         settings["checkpoint_keep"])
+        self.every = self.checkpointer.every
+        self.update = self.checkpointer.update
+
+
+class Recording:
+    """Records the picks and drops, with keyframes, see recorder.py."""
+
+    phase = "recording"
+
+    def __init__(self, env, settings, prefix="record", events=True):
+        from recorder import Recorder
+
+        directory = settings.get(f"{prefix}_dir")
+        if not directory:
+            raise ValueError(f"The {prefix} observer needs a {prefix} directory")
+        self.recorder = Recorder(directory, env, settings[f"{prefix}_every"], events)
+        self.every = self.recorder.every
+        self.update = self.recorder.update
+        self.close = self.recorder.close
+        if events:
+            self.on_pick = self.recorder.on_pick
+            self.on_drop = self.recorder.on_drop
+
+
+class Capture(Recording):
+    """Captures the layout every so many rounds, without the events, for an
+    animation exported afterwards with animation.py."""
+
+    phase = "capture"
+
+    def __init__(self, env, settings):
+        super().__init__(env, settings, "capture", events=False)
+
+
+class Instrumented:
+    """Instruments the run, see instrumentation.py. It is updated at every
+    round, and times the updates of the other observers."""
+
+    def __init__(self, env, settings):
+        from instrumentation import Instrumentation
+
+        if not settings.get("instrument_path"):
+            raise ValueError("The instrument observer needs an output path")
+        self.instrumentation = Instrumentation(
+            settings["instrument_every"], settings["instrument_path"],
+            settings.get("profile_rounds"), settings["profile_path"])
+        self.instrumentation.attach(env)
+        self.every = 1
+        self.update = self.instrumentation.update
+
+    def time(self, observers):
+        """Times the updates of the observers having a phase."""
+        for observer in observers:
+            if getattr(observer, "phase", None) and hasattr(observer, "update"):
+                observer.update = self.timed(observer.phase, observer.update)
+
+    def timed(self, phase, update):
+        def timed_update(env):
+            with self.instrumentation.phase(phase):
+                return update(env)
+        return timed_update
+
+
+OBSERVERS = {"progress": Progress, "convergence": Convergence, "plot": Plot,
+             "checkpoint": Checkpoints, "record": Recording, "capture": Capture,
+             "instrument": Instrumented}
+
+
+def make_observer(name, env, settings):
+    """Builds an observer, importing it if needed.
+
+    Args:
+        - name (str): A name of OBSERVERS, or "module:Class".
+
+        - env (Environment or VectorizedEnvironment): The environment.
+
+        - settings (dict): The settings of the run.
+
+    Returns:
+        The observer.
+
+    Raises:
+        - ValueError: The name is unknown.
+    """
+    if name in OBSERVERS:
+        return OBSERVERS[name](env, settings)
+    if ":" not in name:
+        raise ValueError(f"Unknown observer {name!r}, expected one of "
+                         f"{list(OBSERVERS)} or module:Class")
+    module, class_name = name.split(":")
+    return getattr(importlib.import_module(module), class_name)(env, settings)
+
+
+def attach(names, env, settings):
+    """Builds the observers of a run, and registers the ones observing the
+    picks and drops on the environment.
+
+    Args:
+        - names (List[str]): The names of the observers.
+
+        - env (Environment or VectorizedEnvironment): The environment.
+
+        - settings (dict): The settings of the run.
+
+    Returns:
+        List: The observers.
+    """
+    observers = [make_observer(name, env, settings) for name in names]
+    for observer in observers:
+        if hasattr(observer, "on_pick"):
+            env.observers.append(observer)
+        if isinstance(observer, Instrumented):
+            observer.time(observers)
+    return observers
+
+
+def run(env, step, n_rounds, observers):
+    """Runs the rounds of an environment up to n_rounds, updating the
+    observers. The rounds between two updates are run back to back, so that
+    the observers cost nothing on the other rounds.
+
+    Args:
+        - env (Environment or VectorizedEnvironment): The environment.
+
+        - step (Callable): The function running one round.
+
+        - n_rounds (int): The last round.
+
+        - observers (List): The observers, as returned by attach.
+
+    Returns:
+        bool: True if an observer stopped the run.
+    """
+    hooks = [observer for observer in observers if getattr(observer, "every", None)]
+    stopped = False
+    while env.round < n_rounds and not stopped:
+        until = min([n_rounds] + [(env.round // hook.every + 1) * hook.every
+                                  for hook in hooks])
+        for _ in range(until - env.round):
+            step()
+        # All the due observers are updated, even if one of them stops the run
+        stopped = any([hook.update(env) for hook in hooks
+                       if env.round % hook.every == 0])
+
+    for observer in observers:
+        if hasattr(observer, "close"):
+            observer.close(env)
+    return stopped
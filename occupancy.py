@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with an OccupancyIndex class, an index of the cells occupied by an
+agent, kept up to date by Environment.move, that answers the two questions of
+the perception of the agents without visiting the cells one by one :
+    - which cells around an agent are free, as a bitmask of its neighbourhood,
+    turned into the list of free directions by a precomputed table,
+
+    - how many agents lie within a given radius, by counting the set bits of
+    the rows of the square around it.
+
+The occupancy is bit-packed in 64-bit words, row by row, on a grid padded with
+MAX_RADIUS occupied cells on each side, so that the border needs no bound
+check. Only the non-zero words are stored, so that the index of a sparse grid
+stays small.
+
+A move only flips two bits, and a count of radius R costs
+O(R (R / 64 + 1)) word reads, whatever the number of agents : no count
+structure is kept up to date at every move for the runs that never count the
+agents.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+from functools import lru_cache
+
+# Largest radius of the free cells queries, i.e. width of the padding
+MAX_RADIUS = 4
+
+WORD = 64
+
+
+@lru_cache(maxsize=1 << 16)
+def free_offsets(mask, R):
+    """Returns the directions of the bits set in a mask of free cells of
+    radius R, row by row, then column by column, as in
+    Environment.empty_cells. The results are cached, which makes it a lookup
+    table of the free directions, filled on the first calls : they are tuples,
+    so that a caller cannot modify the entries shared with the others.
+
+    Args:
+        - mask (int): The mask, bit (drow + R) * (2R + 1) + dcol + R being set
+        when the cell in the direction (drow, dcol) is free.
+
+        - R (int): The radius.
+
+    Returns:
+        tuple[tuple[int, int], ...]: The directions of the free cells.
+    """
+    width = 2 * R + 1
+    offsets = []
+    while mask:
+        low = mask & -mask
+        drow, dcol = divmod(low.bit_length() - 1, width)
+        offsets.append((drow - R, dcol - R))
+        mask ^= low
+    return tuple(offsets)
+
+
+class OccupancyIndex:
+    """An OccupancyIndex class, holding the occupancy of the cells by the
+    agents as padded bit-packed rows."""
+
+    def __init__(self, N, M, positions=()):
+        """Instanciates an OccupancyIndex object
+
+        Args:
+            - N (int): Number of rows in the grid.
+
+            - M (int): Number of columns in the grid.
+
+            - positions (Iterable[tuple[int, int]], optional): The occupied
+            cells. Defaults to ().
+        """
+        self.N = N
+        self.M = M
+        self.n_words = (M + 2 * MAX_RADIUS) // WORD + 1
+
+        # Bit col + MAX_RADIUS of word (row + MAX_RADIUS) * n_words + i is
+        # bit i * WORD + col + MAX_RADIUS of the padded row
+        self.words = {}
+
+        # The padding is occupied
+        for row in range(-MAX_RADIUS, N + MAX_RADIUS):
+            if 0 <= row < N:
+                columns = list(range(-MAX_RADIUS, 0)) + \
+                    list(range(M, M + MAX_RADIUS))
+            else:
+                columns = range(-MAX_RADIUS, M + MAX_RADIUS)
+            for col in columns:
+                self.toggle(row, col)
+
+        for row, col in positions:
+            self.toggle(row, col)
+
+    def toggle(self, row, col):
+        """Flips the occupancy bit of a cell."""
+        col += MAX_RADIUS
+        key = (row + MAX_RADIUS) * self.n_words + col // WORD
+        word = self.words.get(key, 0) ^ (1 << (col % WORD))
+        if word:
+            self.words[key] = word
+        else:
+            del self.words[key]
+
+    def move(self, old, new):
+        """Moves the occupancy of the cell old to the cell new.
+
+        Args:
+            - old (tuple[int, int]): The cell left.
+
+            - new (tuple[int, int]): The cell reached.
+        """
+        # Inlined toggles : the bit of old is set, the one of new is not
+        words = self.words
+        col = old[1] + MAX_RADIUS
+        key = (old[0] + MAX_RADIUS) * self.n_words + col // WORD
+        word = words[key] ^ (1 << (col % WORD))
+        if word:
+            words[key] = word
+        else:
+            del words[key]
+
+        col = new[1] + MAX_RADIUS
+        key = (new[0] + MAX_RADIUS) * self.n_words + col // WORD
+        words[key] = words.get(key, 0) | (1 << (col % WORD))
+
+    def occupied_mask(self, row, col, R=1):
+        """Returns the occupancy of the neighbourhood of radius R of a cell,
+        the cells out of the grid being occupied.
+
+        Args:
+            - row (int): The row of the cell.
+
+            - col (int): The column of the cell.
+
+            - R (int, optional): The radius, up to MAX_RADIUS. Defaults to 1.
+
+        Returns:
+            int: The mask, bit (drow + R) * (2R + 1) + dcol + R being set when
+            the cell at (row + drow, col + dcol) is occupied.
+        """
+        words = self.words
+        width = 2 * R + 1
+        window = (1 << width) - 1
+        word, shift = divmod(col + MAX_RADIUS - R, WORD)
+        key = (row + MAX_RADIUS - R) * self.n_words + word
+        straddles = shift + width > WORD
+
+        mask = 0
+        for i in range(0, width * width, width):
+            bits = words.get(key, 0) >> shift
+            if straddles:
+                bits |= words.get(key + 1, 0) << (WORD - shift)
+            mask |= (bits & window) << i
+            key += self.n_words
+        return mask
+
+    def free_cells(self, row, col, R=1):
+        """Returns the directions of the free cells around a cell, in the
+        order of Environment.empty_cells.
+
+        Args:
+            - row (int): The row of the cell.
+
+            - col (int): The column of the cell.
+
+            - R (int, optional): The radius, up to MAX_RADIUS. Defaults to 1.
+
+        Returns:
+            tuple[tuple[int, int], ...]: The (drow, dcol) directions of the
+            free cells.
+        """
+        width = 2 * R + 1
+        full = (1 << (width * width)) - 1
+        center = 1 << (R * width + R)
+        return free_offsets(~self.occupied_mask(row, col, R) & full & ~center, R)
+
+    def count(self, row, col, R):
+        """Returns the number of agents within radius R of a cell (in the
+        square of side 2R + 1 centered on it), the cell included. It reads
+        the 2R + 1 rows of the square, O(R (R / 64 + 1)) words.
+
+        Args:
+            - row (int): The row of the cell.
+
+            - col (int): The column of the cell.
+
+            - R (int): The radius.
+
+        Returns:
+            int: The number of agents.
+        """
+        words = self.words
+        top, bottom = max(row - R, 0), min(row + R, self.N - 1)
+
+        # Bits of the padded rows, the padding excluded
+        first = max(col - R, 0) + MAX_RADIUS
+        last = min(col + R, self.M - 1) + MAX_RADIUS
+
+        total = 0
+        for key in range((top + MAX_RADIUS) * self.n_words,
+                         (bottom + MAX_RADIUS + 1) * self.n_words, self.n_words):
+            for word in range(first // WORD, last // WORD + 1):
+                bits = words.get(key + word, 0)
+                if not bits:
+                    continue
+                low = max(first - word * WORD, 0)
+                high = min(last - word * WORD, WORD - 1)
+                total += bin((bits >> low) & ((1 << (high - low + 1)) - 1)).count("1")
+        return total
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module to spawn heterogeneous populations of agents, and with the decision
+tables shared by the agents of a same parameter set.
+
+A population is a list of AgentConfig, one per agent, given to Environment. It
+can be drawn from named agent classes, or from a distribution per parameter.
+
+The probabilities of picking and dropping only depend on the parameters of an
+agent and on the integer counts of its memory : for the full memories, the
+steady state of a run, they are computed once per distinct parameter set, in
+tables indexed by these counts, so that a decision is a table read and a
+comparison. The tables grow with the size of the memory (and with its square
+with an error rate) : above MAX_TABLE_SIZE entries, the probabilities are
+computed at each decision instead.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from categories import EMPTY
+
+AgentConfig = namedtuple(
+    "AgentConfig", ["kplus", "kminus", "memory_buffer_size", "error_rate"])
+AgentConfig.__doc__ = """The parameters of an agent, as described in the
+paper : k+, k-, the size of the memory and the classification error rate."""
+
+# Largest number of entries of a decision table, and number of parameter sets
+# whose tables are kept for the next agents
+MAX_TABLE_SIZE = 2 ** 16
+DECISION_TABLES_CACHE = 256
+
+# Named agent classes
+AGENT_CLASSES = {
+    "default": AgentConfig(0.1, 0.3, 50, 0.),
+    "forgetful": AgentConfig(0.1, 0.3, 10, 0.),
+    "clumsy": AgentConfig(0.1, 0.3, 50, 0.1),
+    "picky": AgentConfig(0.05, 0.3, 50, 0.),
+    "lazy": AgentConfig(0.1, 0.6, 50, 0.),
+}
+
+
+class DecisionTables:
+    """A DecisionTables class, with the probabilities of picking and dropping
+    an object for every state of a full memory of an agent : the number of
+    times the category of the object is remembered (count) and, when the
+    error rate is enabled, the number of times another category is remembered
+    (other). The memories that are not full yet, and the tables larger than
+    MAX_TABLE_SIZE, use the formulas of the paper."""
+
+    def __init__(self, kplus, kminus, memory_buffer_size, error_rate):
+        """Instanciates a DecisionTables object. Use decision_tables to share
+        the tables between the agents. The tables are only built at the first
+        decision of a full memory.
+
+        Args:
+            - kplus (float): Value of k+ as described in the paper.
+
+            - kminus (float): Value of k- as described in the paper.
+
+            - memory_buffer_size (int): Size of the memory.
+
+            - error_rate (float): The classification error rate.
+        """
+        self.kplus = kplus
+        self.kminus = kminus
+        self.memory_buffer_size = memory_buffer_size
+        self.error_rate = error_rate
+
+        # Length of the memories read in the tables, -1 (never) when the
+        # tables would be too large
+        size = (memory_buffer_size + 1) ** (2 if error_rate else 1)
+        self.full = memory_buffer_size if size <= MAX_TABLE_SIZE else -1
+        self.pick_table = None
+        self.drop_table = None
+
+    def build(self):
+        """Computes the tables, as nested lists of floats indexed by count (and
+        other) : reading a list is faster than reading a scalar in a NumPy
+        array. The frequency is computed with the same floating-point
+        operations as the formulas, so that the decisions are the same."""
+        counts = np.arange(self.memory_buffer_size + 1)
+        if self.error_rate:
+            f = (counts[:, None] + self.error_rate * counts[None, :]) / self.memory_buffer_size
+        else:
+            f = counts / self.memory_buffer_size if self.memory_buffer_size else counts * 0.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.pick_table = np.where(self.kplus + f > 0,
+                                       (self.kplus / (self.kplus + f)) ** 2, 1.).tolist()
+            self.drop_table = np.where(f > 0, (f / (self.kminus + f)) ** 2, 0.).tolist()
+
+    def pick(self, memory, category):
+        """Returns the probability of picking an object of the given category.
+        The counts are read from the Memory directly, this being the innermost
+        loop of the model.
+
+        Args:
+            - memory (Memory): The memory of the agent.
+
+            - category (int): The category code of the object.
+
+        Returns:
+            float: The probability.
+        """
+        count = memory.counts[category]
+        length = memory.length
+        other = length - count - memory.counts[EMPTY] if self.error_rate else 0
+        if length == self.full:
+            if self.pick_table is None:
+                self.build()
+            return self.pick_table[count][other] if self.error_rate else self.pick_table[count]
+        f = (count + self.error_rate * other) / length if length else 0
+        return (self.kplus / (self.kplus + f)) ** 2 if self.kplus + f else 1.
+
+    def drop(self, memory, category):
+        """Returns the probability of dropping an object of the given
+        category.
+
+        Args:
+            - memory (Memory): The memory of the agent.
+
+            - category (int): The category code of the object.
+
+        Returns:
+            float: The probability.
+        """
+        count = memory.counts[category]
+        length = memory.length
+        other = length - count - memory.counts[EMPTY] if self.error_rate else 0
+        if length == self.full:
+            if self.drop_table is None:
+                self.build()
+            return self.drop_table[count][other] if self.error_rate else self.drop_table[count]
+        f = (count + self.error_rate * other) / length if length else 0
+        return (f / (self.kminus + f)) ** 2 if f else 0.
+
+
+@lru_cache(maxsize=DECISION_TABLES_CACHE)
+def decision_tables(kplus, kminus, memory_buffer_size, error_rate):
+    """Returns the DecisionTables of a parameter set, the same instance for all
+    the agents sharing it. The cache is bounded : the tables of a parameter
+    set evicted from it live as long as the agents holding them."""
+    return DecisionTables(kplus, kminus, memory_buffer_size, error_rate)
+
+
+def from_classes(counts, classes=AGENT_CLASSES):
+    """Returns a population made of named agent classes.
+
+    Args:
+        - counts (dict[str, int]): The number of agents of each class.
+
+        - classes (dict[str, AgentConfig], optional): The agent classes.
+        Defaults to AGENT_CLASSES.
+
+    Returns:
+        List[AgentConfig]: The parameters of each agent.
+    """
+    return [classes[name] for name, count in counts.items() for _ in range(count)]
+
+
+def from_distributions(n_agents, distributions, seed=None):
+    """Returns a population whose parameters are drawn independently for each
+    agent. Continuous distributions give each agent its own tables : discrete
+    ones keep their number small.
+
+    Args:
+        - n_agents (int): Number of agents.
+
+        - distributions (dict[str, object]): For each parameter of
+        AgentConfig, either a constant, a list of values drawn uniformly, or a
+        function drawing n values from a numpy Generator, such as
+        lambda rng, n: rng.uniform(0.05, 0.2, n).
+
+        - seed (int, optional): The seed of the draws. Defaults to None.
+
+    Returns:
+        List[AgentConfig]: The parameters of each agent.
+    """
+    rng = np.random.default_rng(seed)
+    columns = []
+    for name in AgentConfig._fields:
+        distribution = distributions[name]
+        if callable(distribution):
+            values = distribution(rng, n_agents)
+        elif isinstance(distribution, (list, tuple)):
+            values = [distribution[i] for i in rng.integers(len(distribution), size=n_agents)]
+        else:
+            values = [distribution] * n_agents
+        cast = int if name == "memory_buffer_size" else float
+        columns.append([cast(value) for value in values])
+    return [AgentConfig(*values) for values in zip(*columns)]
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a Recorder class that records a run as a log of its pick and drop
+events, with periodic keyframes of the object positions, and a Replay class
+that rebuilds the object layout at any round of a recorded run without
+re-simulating it.
+
+A recording is a directory with :
+    - meta.json : the size of the grid, the keyframe interval, whether the
+    events are recorded, the keys and categories of the objects,
+
+    - events.bin : one fixed-size binary record per pick or drop,
+
+    - keyframes.bin : the positions of all the objects, every K rounds,
+
+    - keyframes.idx : for each keyframe, its round and the number of events
+    recorded before it.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import json
+import os
+
+import numpy as np
+
+from object_ import Object
+
+PICK = 0
+DROP = 1
+
+EVENT_DTYPE = np.dtype([("round", "<u4"), ("agent", "<u4"), ("object", "<u4"),
+                        ("row", "<i4"), ("col", "<i4"), ("kind", "u1")])
+INDEX_DTYPE = np.dtype([("round", "<u8"), ("events", "<u8")])
+POSITION_DTYPE = np.dtype("<i4")
+
+
+class Recorder:
+    """A Recorder class, an observer of an environment that appends every pick
+    and drop to the event log, and writes a keyframe every K rounds. The
+    events are buffered in memory and written at each keyframe."""
+
+    def __init__(self, directory, env, every=10000, events=True):
+        """Instanciates a Recorder object, and writes the keyframe of the
+        current round of the environment.
+
+        Args:
+            - directory (str): The directory of the recording, created if
+            needed. A previous recording in it is overwritten.
+
+            - env (Environment or VectorizedEnvironment): The recorded
+            environment.
+
+            - every (int, optional): Number of rounds between two keyframes.
+            Defaults to 10000.
+
+            - events (bool, optional): Whether the picks and drops are logged.
+            Without them, the recording only holds the keyframes, a capture of
+            the layout every K rounds, which costs nothing between two
+            keyframes. Defaults to True.
+        """
+        self.directory = directory
+        self.every = every
+        self.log_events = events
+        os.makedirs(directory, exist_ok=True)
+
+        objects = env.objects
+        self.keys = sorted(objects)
+        meta = {"N": env.N, "M": env.M, "every": every, "events": events, "keys": self.keys,
+                "categories": [objects[key].category for key in self.keys]}
+        with open(os.path.join(directory, "meta.json"), "w") as file:
+            json.dump(meta, file)
+
+        self.events = open(os.path.join(directory, "events.bin"), "wb")
+        self.keyframes = open(os.path.join(directory, "keyframes.bin"), "wb")
+        self.index = open(os.path.join(directory, "keyframes.idx"), "wb")
+        self.buffer = []
+        self.n_events = 0
+
+        self.write_keyframe(env.round, objects)
+
+    def on_pick(self, env, key, object_key, category, position):
+        if self.log_events:
+            self.buffer.append((env.round, key, object_key, *position, PICK))
+
+    def on_drop(self, env, key, object_key, category, position):
+        if self.log_events:
+            self.buffer.append((env.round, key, object_key, *position, DROP))
+
+    def update(self, env):
+        """Writes a keyframe if the round of the environment is a multiple of
+        every. Meant to be called at the end of every round.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The recorded
+            environment.
+        """
+        if env.round % self.every == 0:
+            self.write_keyframe(env.round, env.objects)
+
+    def flush(self):
+        """Writes the buffered events to the event log."""
+        if self.buffer:
+            self.events.write(np.array(self.buffer, dtype=EVENT_DTYPE).tobytes())
+            self.n_events += len(self.buffer)
+            self.buffer = []
+        self.events.flush()
+
+    def write_keyframe(self, round, objects):
+        """Writes the positions of all the objects, (-1, -1) for the carried
+        ones, after flushing the events that precede them.
+
+        Args:
+            - round (int): The round of the keyframe.
+
+            - objects (dict[int, Object]): The objects of the environment.
+        """
+        self.flush()
+        positions = [objects[key].position or (-1, -1) for key in self.keys]
+        self.keyframes.write(np.array(positions, dtype=POSITION_DTYPE).tobytes())
+        self.keyframes.flush()
+        self.index.write(np.array([(round, self.n_events)],
+                                  dtype=INDEX_DTYPE).tobytes())
+        self.index.flush()
+
+    def close(self, env=None):
+        """Flushes the buffered events and closes the files of the recording.
+
+        Args:
+            - env (Environment or VectorizedEnvironment, optional): If given,
+            a last keyframe is written for its current round, unless there is
+            already one. Defaults to None.
+        """
+        if env is not None and env.round % self.every:
+            self.write_keyframe(env.round, env.objects)
+        self.flush()
+        for file in (self.events, self.keyframes, self.index):
+            file.close()
+
+
+class Frame:
+    """A Frame class, the object layout of a recorded run at a given round.
+    It has the N, M and objects attributes of an environment, so that the
+    visualization helpers can draw it."""
+
+    def __init__(self, N, M, round, objects):
+        self.N = N
+        self.M = M
+        self.round = round
+        self.objects = objects
+
+
+class Replay:
+    """A Replay class that reads a recording and rebuilds the object layout at
+    any round, starting from the last keyframe before it and applying the
+    events in between, so that seeking costs at most one keyframe interval of
+    events."""
+
+    def __init__(self, directory):
+        """Instanciates a Replay object
+
+        Args:
+            - directory (str): The directory of the recording.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as file:
+            meta = json.load(file)
+        self.N, self.M, self.every = meta["N"], meta["M"], meta["every"]
+        self.keys = np.array(meta["keys"])
+        self.categories = meta["categories"]
+
+        # Whether the picks and drops were recorded, or only the keyframes
+        self.has_events = meta.get("events", True)
+
+        self.index = np.fromfile(os.path.join(
+            directory, "keyframes.idx"), dtype=INDEX_DTYPE)
+        path = os.path.join(directory, "events.bin")
+        self.events = np.memmap(path, dtype=EVENT_DTYPE, mode="r") \
+            if os.path.getsize(path) else np.zeros(0, dtype=EVENT_DTYPE)
+
+    @property
+    def first_round(self):
+        return int(self.index["round"][0])
+
+    @property
+    def last_round(self):
+        """The last round that can be rebuilt : the last keyframe, or the last
+        recorded event if it is later."""
+        last = int(self.index["round"][-1])
+        if len(self.events):
+            last = max(last, int(self.events["round"][-1]))
+        return last
+
+    def keyframe(self, i):
+        """Reads the positions of the objects of the i-th keyframe.
+
+        Returns:
+            np.ndarray: The (n_objects, 2) array of positions.
+        """
+        n_objects = len(self.keys)
+        return np.fromfile(os.path.join(self.directory, "keyframes.bin"),
+                           dtype=POSITION_DTYPE, count=2 * n_objects,
+                           offset=i * 2 * n_objects * POSITION_DTYPE.itemsize
+                           ).reshape(n_objects, 2)
+
+    def positions_at(self, round):
+        """Rebuilds the positions of the objects at the end of the given round.
+
+        Args:
+            - round (int): The round.
+
+        Returns:
+            np.ndarray: The (n_objects, 2) array of positions, in the order of
+            keys, (-1, -1) for the carried objects.
+        """
+        i = max(np.searchsorted(self.index["round"], round, side="right") - 1, 0)
+        positions = self.keyframe(i)
+
+        # Events after the keyframe, up to the given round
+        start = int(self.index["events"][i])
+        end = start + np.searchsorted(
+            self.events["round"][start:], round, side="right")
+        events = np.asarray(self.events[start:end])
+        if not len(events):
+            return positions
+
+        # Only the last event of each object matters
+        objects, last = np.unique(events["object"][::-1], return_index=True)
+        events = events[len(events) - 1 - last]
+        index = np.searchsorted(self.keys, objects)
+        dropped = events["kind"] == DROP
+        positions[index] = -1
+        positions[index[dropped], 0] = events["row"][dropped]
+        positions[index[dropped], 1] = events["col"][dropped]
+        return positions
+
+    def frame(self, round):
+        """Rebuilds the object layout at the end of the given round.
+
+        Args:
+            - round (int): The round.
+
+        Returns:
+            Frame: The layout, with N, M and objects attributes.
+        """
+        objects = {}
+        rows_cols = self.positions_at(round).tolist()
+        for key, category, (row, col) in zip(self.keys.tolist(), self.categories, rows_cols):
+            position = (row, col) if row >= 0 else None
+            objects[key] = Object(key, category, position, parent=None)
+        return Frame(self.N, self.M, round, objects)
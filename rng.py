@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with the random streams of the multi-agent system. A run is driven by
+one explicit seed, from which independent streams are derived (one for the
+environment, one per agent) with NumPy's SeedSequence, so that a given seed
+reproduces an identical trajectory, and that runs can be split safely across
+processes.
+
+Each stream pre-generates blocks of uniforms that the hot loop consumes one
+at a time, which is cheaper than a call to the global random module.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import itertools
+import random
+
+import numpy as np
+
+# Number of uniforms generated at once by default
+BLOCK_SIZE = 256
+
+
+def blocks(generator, block_size, current):
+    """Generates the blocks of uniforms of a stream, starting with its current
+    one, and keeps the current block and its iterator in current. It is given
+    the state it needs rather than the stream, so that the stream, which holds
+    the generator, is not part of a reference cycle.
+
+    Args:
+        - generator (np.random.Generator): The NumPy generator of the stream.
+
+        - block_size (int): The number of uniforms generated at once.
+
+        - current (list): The current block and the iterator over it.
+    """
+    yield current[1]
+    while True:
+        current[0] = generator.random(block_size).tolist()
+        current[1] = iter(current[0])
+        yield current[1]
+
+
+class BlockRandom(random.Random):
+    """A BlockRandom class, a drop-in replacement of random.Random whose
+    uniforms are drawn by blocks from a NumPy generator. All the methods of
+    random.Random (choice, shuffle, sample...) are available, and consume the
+    same stream.
+    """
+
+    def __init__(self, seed=None, block_size=BLOCK_SIZE):
+        """Instanciates a BlockRandom object
+
+        Args:
+            - seed (int or np.random.SeedSequence, optional): The seed of the
+            stream. Defaults to None, for a stream seeded from the OS entropy.
+
+            - block_size (int, optional): The number of uniforms generated at
+            once. Defaults to BLOCK_SIZE.
+        """
+        self.block_size = block_size
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        """(Re)seeds the stream.
+
+        Args:
+            - a (int or np.random.SeedSequence, optional): The seed. Defaults
+            to None, for a stream seeded from the OS entropy.
+        """
+        self.generator = np.random.default_rng(a)
+        self.start([])
+
+    def start(self, values):
+        """Starts consuming the stream from the given uniforms, then from new
+        blocks.
+
+        Args:
+            - values (List[float]): The first uniforms of the stream.
+        """
+        # The current block and the iterator over it, updated by blocks
+        self.current = [values, iter(values)]
+        self.uniforms = itertools.chain.from_iterable(
+            blocks(self.generator, self.block_size, self.current))
+
+        # The instance attribute shadows the method below, and every method of
+        # random.Random calls it, so that drawing a uniform stays a C call
+        self.random = self.uniforms.__next__
+
+    def getstate(self):
+        """Returns the state of the stream : the state of the NumPy generator
+        and the uniforms of the current block not consumed yet.
+
+        Returns:
+            tuple[dict, List[float]]: The state of the stream.
+        """
+        values, block = self.current
+        remaining = block.__length_hint__()
+        return (self.generator.bit_generator.state,
+                values[len(values) - remaining:])
+
+    def setstate(self, state):
+        """Restores a state returned by getstate, so that the stream goes on
+        exactly as it would have from there.
+
+        Args:
+            - state (tuple[dict, List[float]]): The state of the stream.
+        """
+        generator_state, remaining = state
+        self.generator.bit_generator.state = generator_state
+        self.start(list(remaining))
+
+    def random(self):
+        """Returns the next uniform in [0, 1) of the stream."""
+        return next(self.uniforms)
+
+    def choice(self, seq):
+        """Returns a random element of the non-empty sequence seq, using a
+        single uniform of the stream.
+
+        Args:
+            - seq (Sequence): The sequence to choose from.
+        """
+        return seq[int(self.random() * len(seq))]
+
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a FastForwardScheduler class, that runs the rounds of an
+Environment like Environment.step, except for the agents walking through empty
+space : such an agent only moves randomly and remembers empty cells, so it is
+advanced through a whole multi-step random walk at once, and skipped until the
+end of the walk. This holds for the unladen agents, and for the laden agents
+that do not remember any object of the category they carry, as their
+probability of dropping it is zero.
+
+A walk of s steps is only taken when nothing it would meet can differ from a
+per-step simulation :
+    - no object lies within s cells, so the agent sees only empty cells and
+    cannot pick anything,
+
+    - the grid border is farther than s cells, so the eight directions are
+    always available,
+
+    - every other agent is farther than 2s + 1 cells, so that, as all the
+    agents move at most one cell per round, none of them can block the walk,
+    see the agent at its shortcut position, or drop an object on the walk.
+
+The trajectories are therefore distributed as in a per-step simulation. As
+the walk consumes the stream of the agent as Agent.action would, they are even
+identical to the ones of Environment.step for the same seed.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import numpy as np
+
+from categories import EMPTY
+
+# The eight directions
+DIRECTIONS = [(drow, dcol) for drow in (-1, 0, 1)
+              for dcol in (-1, 0, 1) if drow != 0 or dcol != 0]
+
+# Bounds on the length of a walk : shorter walks are not worth it, and the
+# longer the walks, the costlier the distances to maintain at each pick
+MIN_STEPS = 2
+MAX_STEPS = 12
+
+
+class FastForwardScheduler:
+    """A FastForwardScheduler class that runs the rounds of an environment,
+    fast-forwarding the unladen agents through empty space."""
+
+    def __init__(self, env, max_steps=MAX_STEPS):
+        """Instanciates a FastForwardScheduler object
+
+        Args:
+            - env (Environment): The environment to run.
+
+            - max_steps (int, optional): Maximum number of steps of a walk.
+            Defaults to MAX_STEPS.
+        """
+        self.env = env
+        self.max_steps = max_steps
+
+        # Positions of the agents as seen on the grid, indexed by key - 1, and
+        # first round at which each agent is simulated again step by step.
+        # The latter is kept by the environment, so that its checkpoints hold
+        # the walks in progress.
+        n_agents = len(env.agents)
+        self.rows = np.zeros(n_agents, dtype=np.int64)
+        self.cols = np.zeros(n_agents, dtype=np.int64)
+        for key, agent_data in env.agents.items():
+            self.rows[key - 1], self.cols[key - 1] = agent_data.position
+        if env.walk_ends is None:
+            env.walk_ends = np.zeros(n_agents, dtype=np.int64)
+        self.resume = env.walk_ends
+
+        # Occupancy plane of the objects lying on the grid, and distance from
+        # each cell to the nearest object, capped beyond the longest walk.
+        # Both are kept up to date as an observer of the picks and drops.
+        self.cap = max_steps + 1
+        self.objects = np.zeros((env.N, env.M), dtype=bool)
+        for obj in env.objects.values():
+            if obj.position is not None:
+                self.objects[obj.position] = True
+        self.clearance = clearance(self.objects, self.cap)
+        env.observers.append(self)
+
+        self.skipped_steps = 0
+
+    def on_pick(self, env, key, object_key, category, position):
+        """The distances around the picked object may grow : they are
+        computed again in its neighbourhood, from the objects around it."""
+        self.objects[position] = False
+
+        row, col = position
+        cap = self.cap
+        top, left = max(row - 2 * cap, 0), max(col - 2 * cap, 0)
+        region = clearance(self.objects[top:row + 2 * cap + 1,
+                                        left:col + 2 * cap + 1], cap)
+
+        window = (slice(max(row - cap, 0), row + cap + 1),
+                  slice(max(col - cap, 0), col + cap + 1))
+        self.clearance[window] = region[window[0].start - top:window[0].stop - top,
+                                        window[1].start - left:window[1].stop - left]
+
+    def on_drop(self, env, key, object_key, category, position):
+        """The distances around the dropped object can only shrink."""
+        self.objects[position] = True
+
+        row, col = position
+        cap = self.cap
+        rows = np.arange(max(row - cap, 0), min(row + cap + 1, env.N))
+        cols = np.arange(max(col - cap, 0), min(col + cap + 1, env.M))
+        distances = np.maximum(np.abs(rows - row)[:, None],
+                               np.abs(cols - col)[None, :])
+        window = self.clearance[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+        np.minimum(window, distances, out=window, casting="unsafe")
+
+    def step(self):
+        """Runs one round : every agent, in a random order, either acts as in
+        Environment.step, or is fast-forwarded, or is skipped because it is in
+        the middle of a walk."""
+        env = self.env
+        env.round += 1
+        env.rng.shuffle(env.keys)
+
+        # Only the walk of an agent changes its resume round
+        resume = self.resume.tolist()
+
+        for key in env.keys:
+            if resume[key - 1] > env.round:
+                continue
+
+            agent = env.agents[key].agent
+            steps = self.safe_steps(key, agent)
+            if steps:
+                self.walk(key, steps)
+                continue
+
+            agent.action(env, agent.perception(env))
+            self.rows[key - 1], self.cols[key - 1] = env.agents[key].position
+
+    def safe_steps(self, key, agent):
+        """Returns the number of steps the agent can walk at once, 0 if it
+        must be simulated step by step. The cheapest conditions are checked
+        first.
+
+        Args:
+            - key (int): The key of the agent.
+
+            - agent (Agent): The agent.
+
+        Returns:
+            int: The number of steps.
+        """
+        env = self.env
+        row, col = env.agents[key].position
+
+        # The walk must not reach an object nor the border
+        steps = min(int(self.clearance[row, col]) - 1,
+                    row, env.N - 1 - row, col, env.M - 1 - col)
+        if steps < MIN_STEPS:
+            return 0
+
+        if agent.object is not None and agent.get_frequency(agent.object.category):
+            return 0
+
+        # Agents in the middle of a walk are somewhere within their remaining
+        # steps of the position seen on the grid
+        distances = np.maximum(np.abs(self.rows - row), np.abs(self.cols - col))
+        distances -= np.maximum(self.resume - env.round, 0)
+        distances[key - 1] = np.iinfo(distances.dtype).max
+        steps = min(steps, (int(distances.min()) - 2) // 2)
+        return steps if steps >= MIN_STEPS else 0
+
+    def walk(self, key, steps):
+        """Advances the agent through a random walk of the given number of
+        steps in one go : the directions are drawn from its stream, it is moved
+        to the end of the walk, and an empty cell is remembered for each step.
+        A laden agent makes, and fails, its drop draws on the way.
+
+        Args:
+            - key (int): The key of the agent.
+
+            - steps (int): Number of steps of the walk.
+        """
+        env = self.env
+        agent = env.agents[key].agent
+
+        drow = dcol = 0
+        dropping = False
+        for step in range(1, steps + 1):
+            step_row, step_col = agent.rng.choice(DIRECTIONS)
+            drow += step_row
+            dcol += step_col
+
+            # The draw of the classification error, without effect on an
+            # empty cell, keeps the stream in step with Agent.action
+            if agent.error_rate > 0:
+                agent.rng.random()
+
+            # So does the draw of the drop, whose probability is zero, unless
+            # the draw is exactly zero : the walk then stops there
+            if agent.object is not None:
+                dropping = agent.will_drop(agent.object.category)
+
+            agent.update_memory(EMPTY)
+            if dropping:
+                break
+
+        if drow or dcol:
+            env.move(key, (drow, dcol))
+        if dropping:
+            agent.drop(env, env.get_agent_cell(key))
+
+        self.rows[key - 1], self.cols[key - 1] = env.agents[key].position
+        self.resume[key - 1] = env.round + step
+        self.skipped_steps += step - 1
+
+
+def clearance(objects, cap):
+    """Computes the Chebyshev distance from each cell to the nearest object,
+    capped at cap, by successive dilations of the object occupancy.
+
+    Args:
+        - objects (np.ndarray): The boolean occupancy of the objects.
+
+        - cap (int): The maximum distance computed.
+
+    Returns:
+        np.ndarray: The distances, as uint8.
+    """
+    distances = np.full(objects.shape, cap, dtype=np.uint8)
+    reached = objects.copy()
+    for distance in range(cap):
+        distances[reached & (distances > distance)] = distance
+        if reached.all():
+            break
+        dilated = reached.copy()
+        dilated[1:] |= reached[:-1]
+        dilated[:-1] |= reached[1:]
+        reached = dilated.copy()
+        reached[:, 1:] |= dilated[:, :-1]
+        reached[:, :-1] |= dilated[:, 1:]
+    return distances
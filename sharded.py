@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a ShardedEnvironment class, a VectorizedEnvironment whose rounds
+are run by several worker processes, for grids and agent counts too large for
+a single process.
+
+The N rows of the grid are split into bands (tiles spanning all the columns),
+two per worker. All the state (grid planes, agents, memories, objects) lives
+in shared memory. A round runs in two phases : the workers first advance the
+agents of their even bands, then the agents of their odd bands, so that two
+neighbouring bands are never advanced at the same time. A band is thus free
+to read and write its halo, the boundary rows of its neighbours : this is how
+the occupancy of the boundary rows is exchanged, and how an agent crossing a
+border, with its carried object, is handed off to the neighbouring band, which
+owns it from the next round on.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import os
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from vectorized import VectorizedEnvironment
+
+# Arrays of the environment living in shared memory
+SHARED = VectorizedEnvironment.ARRAYS + ["stepped"]
+
+# A band must be high enough so that the halos of the two bands around it,
+# advanced at the same time, never touch
+MIN_BAND_HEIGHT = 3
+
+
+class ShardedEnvironment(VectorizedEnvironment):
+    """A ShardedEnvironment class, a VectorizedEnvironment advanced by worker
+    processes owning bands of the grid. It must be closed (or used as a
+    context manager) to stop the workers and free the shared memory."""
+
+    def __init__(self, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size=15, error_rate=0, seed=None, category_counts=None, n_workers=None):
+        """Instanciates the ShardedEnvironment object, and starts its workers.
+
+        Args:
+            - N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size,
+            error_rate, seed, category_counts : as for VectorizedEnvironment.
+
+            - n_workers (int, optional): Number of worker processes. Defaults
+            to None, for the number of CPUs.
+        """
+        super().__init__(N, M, na, nb, n_agents, kplus, kminus,
+                         memory_buffer_size, error_rate, seed, category_counts)
+        self.start(n_workers)
+
+    @classmethod
+    def load(cls, path, n_workers=None):
+        """Reads a checkpoint written by VectorizedEnvironment.save, and starts
+        the workers. The streams of the workers are derived from the restored
+        generator : the resumed run is reproducible, but differs from the run
+        that was saved.
+
+        Args:
+            - path (str): The path of the checkpoint file.
+
+            - n_workers (int, optional): Number of worker processes. Defaults
+            to None, for the number of CPUs.
+
+        Returns:
+            ShardedEnvironment: The environment, in the state it was saved.
+        """
+        env = super().load(path)
+        env.start(n_workers)
+        return env
+
+    def start(self, n_workers=None):
+        """Moves the state to shared memory and starts the workers.
+
+        Args:
+            - n_workers (int, optional): Number of worker processes. Defaults
+            to None, for the number of CPUs.
+        """
+        n_workers = min(n_workers or os.cpu_count(),
+                        max(self.N // (2 * MIN_BAND_HEIGHT), 1))
+
+        # Last round at which each agent was advanced, so that an agent handed
+        # off to a band advanced later in the round is not advanced twice
+        self.stepped = np.full(self.n_agents, self.round, dtype=np.int64)
+
+        self.blocks = []
+        spec = {}
+        for name in SHARED:
+            array = getattr(self, name)
+            block = SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+            shared[...] = array
+            setattr(self, name, shared)
+            self.blocks.append(block)
+            spec[name] = (block.name, array.shape, array.dtype.str)
+
+        parameters = {name: getattr(self, name) for name in
+                      ["N", "M", "kplus", "kminus", "memory_buffer_size",
+                       "error_rate", "n_categories"]}
+
+        # Two bands per worker : one advanced in each phase
+        bounds = np.linspace(0, self.N, 2 * n_workers + 1).astype(int).tolist()
+        seeds = np.random.SeedSequence(
+            self.rng.integers(2 ** 63)).spawn(n_workers)
+
+        self.connections = []
+        self.workers = []
+        for worker in range(n_workers):
+            bands = [(bounds[2 * worker], bounds[2 * worker + 1]),
+                     (bounds[2 * worker + 1], bounds[2 * worker + 2])]
+            connection, worker_connection = Pipe()
+            process = Process(target=work, daemon=True,
+                              args=(spec, parameters, bands, seeds[worker], worker_connection))
+            process.start()
+            self.connections.append(connection)
+            self.workers.append(process)
+
+    def step(self):
+        """Runs one round, in two phases, and notifies the observers of the
+        picks and drops that happened in the workers."""
+        self.round += 1
+        for phase in (0, 1):
+            for connection in self.connections:
+                connection.send((self.round, phase,
+                                 self.memory_head, self.memory_len))
+            for connection in self.connections:
+                for event, *arguments in connection.recv():
+                    for observer in self.observers:
+                        getattr(observer, event)(self, *arguments)
+        self.rotate_memory()
+
+    def close(self):
+        """Stops the workers, and frees the shared memory, after copying the
+        state back to the memory of the process."""
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.workers:
+            process.join()
+        self.connections = []
+        self.workers = []
+
+        for name, block in zip(SHARED, self.blocks):
+            setattr(self, name, getattr(self, name).copy())
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventLog:
+    """An EventLog class, the observer of a worker, that keeps the picks and
+    drops to send them to the main process."""
+
+    def __init__(self):
+        self.events = []
+
+    def on_pick(self, env, key, object_key, category, position):
+        self.events.append(("on_pick", key, object_key, category, position))
+
+    def on_drop(self, env, key, object_key, category, position):
+        self.events.append(("on_drop", key, object_key, category, position))
+
+    def flush(self):
+        """Returns the events logged since the last flush."""
+        events, self.events = self.events, []
+        return events
+
+
+def work(spec, parameters, bands, seed, connection):
+    """Main loop of a worker : for each message (round, phase, memory head,
+    memory length) received, advances the agents lying in the band of the
+    phase that were not advanced yet in this round, and answers with the picks
+    and drops. A None message stops the worker.
+
+    Args:
+        - spec (dict): For each shared array, its shared memory block name,
+        its shape and its dtype.
+
+        - parameters (dict): The parameters of the environment.
+
+        - bands (List[tuple[int, int]]): The (first row, last row + 1) of the
+        bands of the worker, for each phase.
+
+        - seed (np.random.SeedSequence): The seed of the worker stream.
+
+        - connection (Connection): The connection to the main process.
+    """
+    tile = VectorizedEnvironment.__new__(VectorizedEnvironment)
+    for name, value in parameters.items():
+        setattr(tile, name, value)
+    tile.rng = np.random.default_rng(seed)
+    events = EventLog()
+    tile.observers = [events]
+
+    blocks = []
+    for name, (block_name, shape, dtype) in spec.items():
+        block = SharedMemory(name=block_name)
+        setattr(tile, name, np.ndarray(shape, dtype, buffer=block.buf))
+        blocks.append(block)
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        tile.round, phase, tile.memory_head, tile.memory_len = message
+
+        first_row, end_row = bands[phase]
+        agents = np.flatnonzero((tile.rows >= first_row) & (tile.rows < end_row)
+                                & (tile.stepped != tile.round))
+        tile.stepped[agents] = tile.round
+        tile.advance(agents)
+        connection.send(events.flush())
+
+    # The arrays must be released before their blocks
+    for name in spec:
+        delattr(tile, name)
+    for block in blocks:
+        block.close()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a Snapshot class, an index of the objects lying on the grid, kept
+up to date at every pick and drop, so that the plots get the coordinates of
+the objects of each category without scanning all the objects.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import numpy as np
+
+# Largest number of bins along a side of a raster
+MAX_BINS = 200
+
+# Number of objects on the grid above which the plots are binned rasters
+RASTER_THRESHOLD = 20000
+
+
+def dominant(counts):
+    """Returns, for each bin of a raster, the index of its most frequent
+    category, NaN for the empty bins, and the share of that category in the
+    bin, its purity."""
+    total = counts.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        purity = counts.max(axis=0) / total
+    return np.where(total > 0, counts.argmax(axis=0), np.nan), np.nan_to_num(purity)
+
+
+def draw_raster(ax, snapshot, max_bins=MAX_BINS):
+    """Draws the raster of a snapshot on a matplotlib axis, each bin colored
+    by its dominant category, more opaque as the bin is purer. The purity is
+    put in the alpha channel of an RGBA image, as matplotlib only takes an
+    array of alphas in imshow from 3.4 on.
+
+    Args:
+        - ax (matplotlib.axes.Axes): The axis.
+
+        - snapshot (Snapshot): The snapshot.
+
+        - max_bins (int, optional): Largest number of bins along a side.
+        Defaults to MAX_BINS.
+    """
+    from matplotlib import cm
+
+    counts, side = snapshot.raster(max_bins)
+    category, purity = dominant(counts)
+
+    # The empty bins (NaN) get the transparent "bad" color of the colormap
+    rgba = cm.get_cmap('tab20')(category / max(len(counts) - 1, 1))
+    rgba[..., 3] = purity
+    ax.imshow(rgba, origin='lower', interpolation='nearest',
+              extent=(0, counts.shape[2] * side, 0, counts.shape[1] * side))
+
+
+class Snapshot:
+    """A Snapshot class, an observer of an environment that keeps, for each
+    category, the coordinates of the objects of that category lying on the
+    grid in two packed arrays. A pick moves the last object of the arrays in
+    the slot of the picked one, a drop appends the dropped one, so that both
+    cost O(1)."""
+
+    def __init__(self, N, M, objects=()):
+        """Instanciates a Snapshot object
+
+        Args:
+            - N (int): Number of rows in the grid.
+
+            - M (int): Number of columns in the grid.
+
+            - objects (Iterable[Object], optional): The objects of the
+            environment. The carried ones are ignored. Defaults to ().
+        """
+        self.N = N
+        self.M = M
+
+        # For each category, the coordinates and keys of its placed objects in
+        # their first count slots, and the slot of each placed object
+        self.rows = {}
+        self.cols = {}
+        self.keys = {}
+        self.count = {}
+        self.slots = {}
+
+        for obj in objects:
+            if obj.position is not None:
+                self.add(obj.key, obj.category, obj.position)
+
+    @classmethod
+    def of(cls, env):
+        """Returns the Snapshot registered as an observer of the environment,
+        or a new one built from its objects if there is none (for instance
+        for a Frame of a replay).
+
+        Args:
+            - env (Environment or VectorizedEnvironment or Frame): The
+            environment.
+
+        Returns:
+            Snapshot: The snapshot of the environment.
+        """
+        for observer in getattr(env, "observers", ()):
+            if isinstance(observer, cls):
+                return observer
+        return cls(env.N, env.M, env.objects.values())
+
+    @property
+    def categories(self):
+        return sorted(self.count)
+
+    def __len__(self):
+        """Number of objects lying on the grid."""
+        return sum(self.count.values())
+
+    def add(self, key, category, position):
+        """Adds an object lying on the grid.
+
+        Args:
+            - key (int): The key of the object.
+
+            - category (int): The category code of the object.
+
+            - position (tuple[int, int]): The cell of the object.
+        """
+        if category not in self.count:
+            self.rows[category] = np.zeros(16, dtype=np.int64)
+            self.cols[category] = np.zeros(16, dtype=np.int64)
+            self.keys[category] = np.zeros(16, dtype=np.int64)
+            self.count[category] = 0
+
+        slot = self.count[category]
+        if slot == len(self.keys[category]):
+            for arrays in (self.rows, self.cols, self.keys):
+                arrays[category] = np.concatenate(
+                    [arrays[category], np.zeros_like(arrays[category])])
+
+        self.rows[category][slot], self.cols[category][slot] = position
+        self.keys[category][slot] = key
+        self.slots[key] = slot
+        self.count[category] = slot + 1
+
+    def remove(self, key, category):
+        """Removes an object from the grid.
+
+        Args:
+            - key (int): The key of the object.
+
+            - category (int): The category code of the object.
+        """
+        slot = self.slots.pop(key)
+        last = self.count[category] - 1
+        if slot != last:
+            moved = int(self.keys[category][last])
+            for arrays in (self.rows, self.cols, self.keys):
+                arrays[category][slot] = arrays[category][last]
+            self.slots[moved] = slot
+        self.count[category] = last
+
+    def on_pick(self, env, key, object_key, category, position):
+        self.remove(object_key, category)
+
+    def on_drop(self, env, key, object_key, category, position):
+        self.add(object_key, category, position)
+
+    def coordinates(self, category):
+        """Returns the coordinates of the objects of a category lying on the
+        grid.
+
+        Args:
+            - category (int): The category code.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The rows and the columns, copies
+            that are not affected by the next picks and drops.
+        """
+        count = self.count.get(category, 0)
+        if not count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return self.rows[category][:count].copy(), self.cols[category][:count].copy()
+
+    def raster(self, max_bins=MAX_BINS):
+        """Bins the objects of each category on a coarse grid of at most
+        max_bins x max_bins bins.
+
+        Args:
+            - max_bins (int, optional): Largest number of bins along a side.
+            Defaults to MAX_BINS.
+
+        Returns:
+            tuple[np.ndarray, int]: The (n_categories, rows, cols) counts, in
+            the order of categories, and the side of a bin, in cells.
+        """
+        side = max(-(-max(self.N, self.M) // max_bins), 1)
+        shape = (-(-self.N // side), -(-self.M // side))
+        counts = np.zeros((len(self.count),) + shape, dtype=np.int64)
+        for i, category in enumerate(self.categories):
+            count = self.count[category]
+            bins = (self.rows[category][:count] // side) * shape[1] \
+                + self.cols[category][:count] // side
+            counts[i] = np.bincount(bins, minlength=shape[0] * shape[1]).reshape(shape)
+        return counts, side
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Headless parameter sweep of the multi-agent system. Every combination of the
+given parameter values is run with several seeds, each run in its own process
+of a pool sized to the machine, without any plot. One CSV row is written per
+run, with its configuration, its seed, its wall time and the final sortedness
+(fraction of same-category neighbours).
+
+The results are kept in a ResultCache (see cache.py, --cache) : the runs
+already simulated are read from it instead of being simulated again, and the
+longer runs resume from the cached shorter ones.
+
+With --engine ensemble, the seeds of a configuration are not run in separate
+processes but as the replicas of a single EnsembleEnvironment, advanced
+together : one row is still written per replica, its wall time being its share
+of the wall time of the ensemble.
+
+Usage : python sweep.py --kplus 0.1 0.2 --kminus 0.3 0.5 --seeds 4 --rounds 100000
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import CACHE_DIR, ResultCache
+from ensemble import EnsembleEnvironment
+from environment import Environment
+from vectorized import VectorizedEnvironment
+
+# Swept parameters, with their type and default values
+PARAMETERS = {
+    "N": (int, [200]),
+    "M": (int, [300]),
+    "na": (int, [750]),
+    "nb": (int, [750]),
+    "n_agents": (int, [100]),
+    "kplus": (float, [0.1]),
+    "kminus": (float, [0.3]),
+    "memory_buffer_size": (int, [50]),
+    "error_rate": (float, [0.]),
+}
+
+FIELDS = list(PARAMETERS) + ["n_rounds", "engine", "seed", "replica",
+                             "wall_time", "sortedness", "cached"]
+
+
+def expand_grid(values):
+    """Expands a parameter grid into the list of all its configurations.
+
+    Args:
+        - values (dict[str, list]): The values of each parameter.
+
+    Returns:
+        List[dict]: One dict per combination of the parameter values.
+    """
+    names = list(values)
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*values.values())]
+
+
+def run(config, n_rounds, engine, seed, cache_dir=None):
+    """Runs one headless simulation and returns its result row. With a
+    cache, the run is only simulated if it is not in the cache.
+
+    Args:
+        - config (dict): The parameters of the Environment.
+
+        - n_rounds (int): Number of rounds to run.
+
+        - engine (str): "python" for Environment, "numpy" for
+        VectorizedEnvironment.
+
+        - seed (int): The seed of the run.
+
+        - cache_dir (str, optional): The directory of the ResultCache.
+        Defaults to None, for no cache.
+
+    Returns:
+        dict: The configuration, the seed, the wall time, the sortedness and
+        whether the result was cached.
+    """
+    start = time.perf_counter()
+
+    if cache_dir:
+        result = ResultCache(cache_dir).run(engine, config, seed, n_rounds,
+                                            keep_state=True)
+        return {**config, "n_rounds": n_rounds, "engine": engine, "seed": seed,
+                "replica": 0, "wall_time": time.perf_counter() - start,
+                "sortedness": result["metrics"]["sortedness"],
+                "cached": result["cached"]}
+
+    engine_class = VectorizedEnvironment if engine == "numpy" else Environment
+    env = engine_class(**config, seed=seed)
+
+    for _ in range(n_rounds):
+        env.step()
+
+    return {**config, "n_rounds": n_rounds, "engine": engine, "seed": seed,
+            "replica": 0, "wall_time": time.perf_counter() - start,
+            "sortedness": env.metrics.same_category_fraction, "cached": False}
+
+
+def run_ensemble(config, n_rounds, seed, n_replicas):
+    """Runs the replicas of a configuration together, in an
+    EnsembleEnvironment, and returns one result row per replica.
+
+    Args:
+        - config (dict): The parameters of each replica.
+
+        - n_rounds (int): Number of rounds to run.
+
+        - seed (int): The seed of the ensemble.
+
+        - n_replicas (int): Number of replicas.
+
+    Returns:
+        List[dict]: The configuration, the seed, the index of the replica, its
+        share of the wall time and its sortedness, for each replica.
+    """
+    start = time.perf_counter()
+
+    env = EnsembleEnvironment(**config, seed=seed, n_replicas=n_replicas)
+    for _ in range(n_rounds):
+        env.step()
+
+    wall_time = (time.perf_counter() - start) / n_replicas
+    return [{**config, "n_rounds": n_rounds, "engine": "ensemble", "seed": seed,
+             "replica": replica, "wall_time": wall_time,
+             "sortedness": metrics["same_category_fraction"], "cached": False}
+            for replica, metrics in enumerate(env.metrics.per_replica())]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    for name, (type_, default) in PARAMETERS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name,
+                            type=type_, nargs="+", default=default)
+    parser.add_argument("--rounds", type=int, default=100000)
+    parser.add_argument("--seeds", type=int, default=1,
+                        help="Number of seeds per configuration")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--engine", choices=["python", "numpy", "ensemble"],
+                        default="python")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache", default=CACHE_DIR,
+                        help="Directory of the result cache")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Simulate every run, without reading or filling the cache")
+    parser.add_argument("--output", default="-",
+                        help="CSV file to write, '-' for the standard output")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configs = expand_grid({name: getattr(args, name) for name in PARAMETERS})
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+
+    output = sys.stdout if args.output == "-" else open(
+        args.output, "w", newline="")
+    writer = csv.DictWriter(output, fieldnames=FIELDS)
+    writer.writeheader()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        if args.engine == "ensemble":
+            futures = [executor.submit(run_ensemble, config, args.rounds,
+                                       args.first_seed, args.seeds)
+                       for config in configs]
+        else:
+            cache_dir = None if args.no_cache else args.cache
+            futures = [executor.submit(run, config, args.rounds, args.engine, seed, cache_dir)
+                       for config in configs for seed in seeds]
+        for future in as_completed(futures):
+            result = future.result()
+            writer.writerows(result if isinstance(result, list) else [result])
+            output.flush()
+
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
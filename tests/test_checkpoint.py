@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the checkpoints : a run saved, loaded and continued goes on
+bit-for-bit as the run that was never interrupted.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import numpy as np
+import pytest
+
+from environment import Environment
+from scheduler import FastForwardScheduler
+from vectorized import VectorizedEnvironment
+
+CONFIG = {"N": 30, "M": 40, "na": 40, "nb": 40, "n_agents": 15,
+          "kplus": 0.1, "kminus": 0.3, "memory_buffer_size": 10}
+
+
+def state(env):
+    """The positions, memories and carried objects of the agents, the
+    positions of the objects, and the order of the agents."""
+    if isinstance(env, VectorizedEnvironment):
+        return [np.asarray(getattr(env, name)).tobytes() for name in env.ARRAYS]
+    agents = {key: (data.position, list(data.agent.memory),
+                    data.agent.object.key if data.agent.object else 0)
+              for key, data in env.agents.items()}
+    objects = {key: obj.position for key, obj in env.objects.items()}
+    return [agents, objects, list(env.keys)]
+
+
+@pytest.mark.parametrize("error_rate", [0., 0.2])
+@pytest.mark.parametrize("engine, options", [
+    (Environment, {}),
+    (Environment, {"sparse": True}),
+    (Environment, {"category_counts": [10, 20, 30]}),
+    (Environment, {"grid_dir": "planes"}),
+    (VectorizedEnvironment, {}),
+    (VectorizedEnvironment, {"category_counts": [10, 20, 30]}),
+])
+def test_resume(tmp_path, engine, options, error_rate):
+    if "grid_dir" in options:
+        options = {"grid_dir": str(tmp_path / options["grid_dir"])}
+    env = engine(**CONFIG, error_rate=error_rate, seed=3, **options)
+    for _ in range(200):
+        env.step()
+
+    path = str(tmp_path / "checkpoint.npz")
+    env.save(path)
+    if engine is Environment:
+        resumed = engine.load(path, grid_dir=str(tmp_path / "resumed"))
+    else:
+        resumed = engine.load(path)
+
+    assert resumed.round == env.round
+    assert state(resumed) == state(env)
+    for _ in range(300):
+        env.step()
+        resumed.step()
+    assert state(resumed) == state(env)
+    assert resumed.metrics.n_clusters == env.metrics.n_clusters
+
+
+def test_resume_fast_forward(tmp_path):
+    env = Environment(**CONFIG, seed=5)
+    step = FastForwardScheduler(env).step
+    for _ in range(250):
+        step()
+
+    path = str(tmp_path / "checkpoint.npz")
+    env.save(path)
+    resumed = Environment.load(path)
+    resumed_step = FastForwardScheduler(resumed).step
+
+    assert (resumed.walk_ends == env.walk_ends).all()
+    for _ in range(250):
+        step()
+        resumed_step()
+    assert state(resumed) == state(env)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the grids : a run on a dense, a sparse or a memory-mapped grid
+follows the same trajectory.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import grid
+from cache import object_positions
+from environment import Environment
+
+CONFIG = {"N": 40, "M": 50, "na": 150, "nb": 150, "n_agents": 25,
+          "kplus": 0.1, "kminus": 0.3, "memory_buffer_size": 10, "seed": 7}
+
+
+def trajectory(env, n_rounds=1500, every=250):
+    """The positions of the objects and of the agents every so many rounds."""
+    states = []
+    for round in range(1, n_rounds + 1):
+        env.step()
+        if round % every == 0:
+            states.append((object_positions(env).tolist(),
+                           [env.agents[key].position for key in sorted(env.agents)]))
+    return states
+
+
+def test_grids_follow_same_trajectory(tmp_path, monkeypatch):
+    dense = trajectory(Environment(**CONFIG, sparse=False))
+    sparse = trajectory(Environment(**CONFIG, sparse=True))
+    mapped = trajectory(Environment(**CONFIG, grid_dir=str(tmp_path / "planes")))
+
+    # Small tiles and cache, so that the tiles are written back and read again
+    monkeypatch.setattr(grid.MappedGrid.__init__, "__defaults__", (8, 4))
+    evicted = trajectory(Environment(**CONFIG, grid_dir=str(tmp_path / "evicted")))
+
+    assert sparse == dense
+    assert mapped == dense
+    assert evicted == dense
+
+
+def test_mapped_planes_match_layout(tmp_path):
+    env = Environment(**CONFIG, grid_dir=str(tmp_path / "planes"))
+    for _ in range(500):
+        env.step()
+    env.grid.flush()
+
+    for key, obj in env.objects.items():
+        if obj.position is not None:
+            assert env.grid.read(1, *obj.position) == key
+    for key, data in env.agents.items():
+        assert env.grid.read(0, *data.position) == key
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the Memory ring buffer, against a plain list of the last categories
+seen, and of Agent.get_frequency, against the formula of the paper computed
+on that list.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import random
+
+import pytest
+
+from agent import Agent
+from categories import EMPTY
+from memory import Memory
+
+
+def frequency(remembered, category, error_rate):
+    """The frequency of a category in a list of remembered categories, the
+    others counting for error_rate each, the empty cells for nothing."""
+    if not remembered:
+        return 0
+    count = remembered.count(category)
+    other = len(remembered) - count - remembered.count(EMPTY)
+    return (count + error_rate * other) / len(remembered)
+
+
+@pytest.mark.parametrize("size", [1, 2, 15, 50])
+@pytest.mark.parametrize("n_categories", [2, 5])
+def test_memory_matches_list(size, n_categories):
+    rng = random.Random(size * 10 + n_categories)
+    memory = Memory(size, n_categories)
+    remembered = []
+    for _ in range(5 * size + 20):
+        category = rng.randint(0, n_categories)
+        memory.push(category)
+        remembered = ([category] + remembered)[:size]
+
+        assert len(memory) == len(remembered)
+        assert list(memory) == remembered
+        for code in range(n_categories + 1):
+            assert memory.count(code) == remembered.count(code)
+
+
+@pytest.mark.parametrize("error_rate", [0., 0.1, 0.5])
+def test_get_frequency(error_rate):
+    rng = random.Random(3)
+    agent = Agent(1, 0.1, 0.3, 10, error_rate, n_categories=3)
+    remembered = []
+    assert agent.get_frequency(1) == 0
+    for _ in range(40):
+        category = rng.randint(0, 3)
+        agent.memory.push(category)
+        remembered = ([category] + remembered)[:10]
+        for code in range(1, 4):
+            assert agent.get_frequency(code) == frequency(remembered, code, error_rate)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the clustering metrics : the ones updated at every pick and drop
+match the ones computed from scratch from the layout.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import pytest
+
+from environment import Environment
+from metrics import ClusterMetrics, same_category_fraction
+from vectorized import VectorizedEnvironment
+
+CONFIG = {"N": 25, "M": 30, "na": 120, "nb": 120, "n_agents": 20,
+          "kplus": 0.1, "kminus": 0.3, "memory_buffer_size": 10}
+
+
+def assert_same_metrics(incremental, env):
+    full = ClusterMetrics(env.objects.values())
+    assert incremental.categories == full.categories
+    assert incremental.n_clusters == full.n_clusters
+    assert {category: count for category, count in incremental.clusters.items() if count} == \
+        {category: count for category, count in full.clusters.items() if count}
+    assert sorted(incremental.size.values()) == sorted(full.size.values())
+    assert (incremental.same_pairs, incremental.total_pairs) == \
+        (full.same_pairs, full.total_pairs)
+    assert incremental.same_category_fraction == pytest.approx(same_category_fraction(env))
+
+
+@pytest.mark.parametrize("engine", [Environment, VectorizedEnvironment])
+@pytest.mark.parametrize("category_counts", [None, [80, 80, 80]])
+def test_incremental_metrics(engine, category_counts):
+    env = engine(**CONFIG, seed=11, category_counts=category_counts)
+    for _ in range(5):
+        for _ in range(200):
+            env.step()
+        assert_same_metrics(env.metrics, env)
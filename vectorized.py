@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a VectorizedEnvironment class, an alternate engine for the
+multi-agent system. Instead of Cell, Agent and Object instances, the state is
+kept in NumPy arrays (grid occupancy, object categories, agent positions,
+memories) and all the agents of a round are advanced together with batched
+array operations.
+
+It exposes the same surface as Environment for the callers (N, M, objects,
+step), so that the visualization helpers work unchanged on it.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import json
+
+import numpy as np
+
+from metrics import ClusterMetrics
+from object_ import Object
+
+# The eight directions, in the same order as Environment.empty_cells
+OFFSETS = np.array([(drow, dcol) for drow in (-1, 0, 1)
+                    for dcol in (-1, 0, 1) if drow != 0 or dcol != 0])
+
+
+class VectorizedEnvironment:
+    """A VectorizedEnvironment class that holds the whole multi-agent
+    experiment in NumPy arrays, and advances all the agents of a round at once.
+    The dynamics are the ones of Agent.action : random move to a free cell,
+    then pick or drop given the memory, then memory update.
+    """
+
+    # State saved in the checkpoints, besides the random generator
+    HEADER = ["N", "M", "kplus", "kminus", "memory_buffer_size", "error_rate",
+              "round", "memory_head", "memory_len"]
+    ARRAYS = ["object_category", "object_rows", "object_cols", "object_grid",
+              "category_grid", "rows", "cols", "agent_grid", "carried",
+              "memory", "memory_counts"]
+
+    def __init__(self, N, M, na, nb, n_agents, kplus, kminus, memory_buffer_size=15, error_rate=0, seed=None, category_counts=None):
+        """Instanciates the VectorizedEnvironment object.
+
+        Args:
+            - N (int): Number of rows in the grid.
+
+            - M (int): Number of columns in the grid.
+
+            - na (int): Number of objects of class A.
+
+            - nb (int): Number of objects of class B.
+
+            - n_agents (int): Number of agents.
+
+            - kplus (float): Value of k+ as described in the paper.
+
+            - kminus (float): Value of k- as described in the paper.
+
+            - memory_buffer_size (int, optional): Size of the memory as
+            described in the paper. Defaults to 15.
+
+            - error_rate (float, optional): Error rate in the object class
+            recognition, as described in the paper. Defaults to 0.
+
+            - seed (int, optional): Seed of the random generator. Defaults to
+            None.
+
+            - category_counts (List[int], optional): The number of objects of
+            each category, for more than two categories. Defaults to None, for
+            [na, nb].
+        """
+        self.N = N
+        self.M = M
+        self.kplus = kplus
+        self.kminus = kminus
+        self.memory_buffer_size = memory_buffer_size
+        self.error_rate = error_rate
+        self.rng = np.random.default_rng(seed)
+
+        if category_counts is None:
+            category_counts = [na, nb]
+        self.n_categories = len(category_counts)
+
+        self.init_objects(category_counts)
+        self.init_agents(n_agents)
+        self.round = 0
+        self.init_observers()
+
+    def init_observers(self):
+        """Registers the observers notified of every pick and drop, the
+        clustering metrics being always maintained."""
+        self.metrics = ClusterMetrics(self.objects.values())
+        self.observers = [self.metrics]
+
+    def init_objects(self, category_counts):
+        """Places the objects of each category at random positions on the
+        grid. Object keys start at 1, the key 0 meaning no object.
+
+        Args:
+            - category_counts (List[int]): The number of objects of each
+            category, the code of a category being its index + 1 (0 meaning
+            no object).
+        """
+        n_objects = sum(category_counts)
+        positions = self.rng.choice(self.N * self.M, n_objects, replace=False)
+        codes = self.rng.permutation(np.repeat(
+            np.arange(1, self.n_categories + 1, dtype=np.int16), category_counts))
+
+        # Indexed by object key
+        self.object_category = np.zeros(n_objects + 1, dtype=np.int16)
+        self.object_category[1:] = codes
+        self.object_rows = np.full(n_objects + 1, -1, dtype=np.int64)
+        self.object_cols = np.full(n_objects + 1, -1, dtype=np.int64)
+        self.object_rows[1:], self.object_cols[1:] = np.divmod(
+            positions, self.M)
+
+        # Grid planes
+        self.object_grid = np.zeros((self.N, self.M), dtype=np.int32)
+        self.category_grid = np.zeros((self.N, self.M), dtype=np.int16)
+        self.object_grid[self.object_rows[1:], self.object_cols[1:]] = \
+            np.arange(1, n_objects + 1)
+        self.category_grid[self.object_rows[1:], self.object_cols[1:]] = codes
+
+    def init_agents(self, n_agents):
+        """Places n_agents agents at n_agents random positions, with an empty
+        memory and no object carried. Agent keys start at 1, the key 0 meaning
+        no agent.
+
+        Args:
+            - n_agents (int): Number of agents.
+        """
+        positions = self.rng.choice(self.N * self.M, n_agents, replace=False)
+        self.rows, self.cols = np.divmod(positions, self.M)
+
+        self.agent_grid = np.zeros((self.N, self.M), dtype=np.int32)
+        self.agent_grid[self.rows, self.cols] = np.arange(1, n_agents + 1)
+
+        # Key of the carried object, 0 if none
+        self.carried = np.zeros(n_agents, dtype=np.int32)
+
+        # Memories are ring buffers of category codes, with running counts
+        self.memory = np.zeros(
+            (n_agents, self.memory_buffer_size), dtype=np.int16)
+        self.memory_head = 0
+        self.memory_len = 0
+        self.memory_counts = np.zeros(
+            (n_agents, self.n_categories + 1), dtype=np.int32)
+
+    @property
+    def n_agents(self):
+        return len(self.rows)
+
+    @property
+    def objects(self):
+        """Dict of Object instances built from the arrays, for compatibility
+        with the callers of Environment. Carried objects have a None position.
+        The parent of the objects is not tracked, and is None."""
+        rows = self.object_rows.tolist()
+        cols = self.object_cols.tolist()
+        codes = self.object_category.tolist()
+        objects = {}
+        for key in range(1, len(codes)):
+            position = (rows[key], cols[key]) if rows[key] >= 0 else None
+            objects[key] = Object(
+                key, codes[key], position, parent=None)
+        return objects
+
+    def step(self):
+        """Runs one round : every agent moves, then picks or drops, then
+        updates its memory."""
+        self.round += 1
+        self.advance(np.arange(self.n_agents))
+        self.rotate_memory()
+
+    def advance(self, agents):
+        """Runs one round for the given agents, apart from the rotation of the
+        memories shared by all the agents.
+
+        Args:
+            - agents (np.ndarray): The indices (key - 1) of the agents.
+        """
+        self.move_agents(agents)
+
+        category = self.category_grid[self.rows[agents], self.cols[agents]]
+
+        # Category pushed in memory, with a potential classification error
+        observed = category.copy()
+        if self.error_rate > 0:
+            errors = (self.rng.random(agents.size) <= self.error_rate) & (
+                observed > 0)
+            observed[errors] = self.misclassify(observed[errors])
+
+        self.pick_and_drop(agents, category)
+        self.update_memory(agents, observed)
+
+    def save(self, path):
+        """Writes a compact binary checkpoint of the environment : its arrays,
+        its parameters and the state of its random generator. Loading it with
+        VectorizedEnvironment.load continues the run bit-for-bit.
+
+        Args:
+            - path (str): The path of the checkpoint file.
+        """
+        header = {name: getattr(self, name) for name in self.HEADER}
+        header["rng_state"] = self.rng.bit_generator.state
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+
+        with open(path, "wb") as file:
+            np.savez_compressed(file, header=json.dumps(header), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a checkpoint written by VectorizedEnvironment.save.
+
+        Args:
+            - path (str): The path of the checkpoint file.
+
+        Returns:
+            VectorizedEnvironment: The environment, in the state it was saved.
+        """
+        env = cls.__new__(cls)
+        with np.load(path) as data:
+            header = json.loads(str(data["header"]))
+            for name in cls.ARRAYS:
+                setattr(env, name, data[name])
+
+        env.rng = np.random.default_rng()
+        env.rng.bit_generator.state = header.pop("rng_state")
+        for name, value in header.items():
+            setattr(env, name, value)
+        env.n_categories = env.memory_counts.shape[1] - 1
+        env.init_observers()
+        return env
+
+    def move_agents(self, agents):
+        """Moves the given agents to a random free cell around them. Conflicts
+        (two agents choosing the same cell) are resolved with a random
+        priority : the winner moves, and the losers draw again among the cells
+        that are still free, as they would if they came later in a sequential
+        round. Every pass moves at least one agent per contested cell, so that
+        the passes go on until every agent moved or has no free cell left.
+
+        Args:
+            - agents (np.ndarray): The indices (key - 1) of the agents.
+        """
+        pending = agents
+
+        while pending.size:
+            target_rows = self.rows[pending, None] + OFFSETS[:, 0]
+            target_cols = self.cols[pending, None] + OFFSETS[:, 1]
+            free = self.in_grid(pending, target_rows, target_cols)
+            free[free] = self.agent_grid[target_rows[free],
+                                         target_cols[free]] == 0
+            n_free = free.sum(axis=1)
+
+            # Agents without any free cell around stay where they are
+            movable = n_free > 0
+            pending = pending[movable]
+            if not pending.size:
+                break
+            free, n_free = free[movable], n_free[movable]
+            target_rows, target_cols = target_rows[movable], target_cols[movable]
+
+            # Uniform choice among the free cells : the k-th free direction
+            k = (self.rng.random(pending.size) * n_free).astype(np.int64)
+            choice = (np.cumsum(free, axis=1) > k[:, None]).argmax(axis=1)
+            index = np.arange(pending.size)
+            new_rows = target_rows[index, choice]
+            new_cols = target_cols[index, choice]
+
+            # The first agent in a random order wins each destination
+            order = self.rng.permutation(pending.size)
+            _, first = np.unique(
+                (new_rows * self.M + new_cols)[order], return_index=True)
+            winners = np.zeros(pending.size, dtype=bool)
+            winners[order[first]] = True
+
+            moving = pending[winners]
+            self.agent_grid[self.rows[moving], self.cols[moving]] = 0
+            self.rows[moving] = new_rows[winners]
+            self.cols[moving] = new_cols[winners]
+            self.agent_grid[self.rows[moving], self.cols[moving]] = moving + 1
+
+            pending = pending[~winners]
+
+    def in_grid(self, agents, rows, cols):
+        """Returns whether the target cells of the given agents are in the
+        grid.
+
+        Args:
+            - agents (np.ndarray): The indices (key - 1) of the agents.
+
+            - rows (np.ndarray): The rows of the targets, one line per agent.
+
+            - cols (np.ndarray): The columns of the targets, one line per
+            agent.
+
+        Returns:
+            np.ndarray: True for the targets in the grid.
+        """
+        return (rows >= 0) & (rows < self.N) & (cols >= 0) & (cols < self.M)
+
+    def misclassify(self, codes):
+        """Returns the given category codes, each replaced by one of the other
+        categories drawn uniformly.
+
+        Args:
+            - codes (np.ndarray): The category codes (non zero) to swap.
+
+        Returns:
+            np.ndarray: The misclassified category codes.
+        """
+        n_categories = self.n_categories
+        if n_categories < 2:
+            return codes
+        shift = self.rng.integers(1, n_categories, size=codes.shape)
+        return ((codes - 1 + shift) % n_categories + 1).astype(codes.dtype)
+
+    def get_frequency(self, agents, categories):
+        """Computes for each given agent the frequency of appearance of the
+        given category in its memory, taking into account the error rate, as
+        Agent.get_frequency does.
+
+        Args:
+            - agents (np.ndarray): The indices (key - 1) of the agents.
+
+            - categories (np.ndarray): One category code per agent.
+
+        Returns:
+            np.ndarray: The frequencies, one per agent.
+        """
+        if not self.memory_len:
+            return np.zeros(agents.size)
+        count = self.memory_counts[agents, categories]
+        count_other = self.memory_len - count - self.memory_counts[agents, 0]
+        return (count + self.error_rate * count_other) / self.memory_len
+
+    def pick_and_drop(self, agents, category):
+        """Applies the pick and drop rules of the paper to the given agents,
+        given the category of the object on their cell (0 if none).
+
+        Args:
+            - agents (np.ndarray): The indices (key - 1) of the agents.
+
+            - category (np.ndarray): The category code under each agent.
+        """
+        draws = self.rng.random(agents.size)
+        carried = self.carried[agents]
+        laden = carried > 0
+
+        # The probabilities of an empty memory are the limits of the formulas,
+        # as in DecisionTables : 0 for a drop, 1 for a pick with k+ = 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # A laden agent on an empty cell may drop its object
+            f = self.get_frequency(agents, self.object_category[carried])
+            drop = laden & (category == 0) & (
+                draws <= np.where(f > 0, (f / (self.kminus + f)) ** 2, 0.))
+
+            # An unladen agent on an object may pick it
+            f = self.get_frequency(agents, category)
+            pick = ~laden & (category > 0) & (
+                draws <= np.where(self.kplus + f > 0, (self.kplus / (self.kplus + f)) ** 2, 1.))
+
+        # Drops
+        dropping = agents[drop]
+        rows, cols = self.rows[dropping], self.cols[dropping]
+        keys = self.carried[dropping]
+        self.object_grid[rows, cols] = keys
+        self.category_grid[rows, cols] = self.object_category[keys]
+        self.object_rows[keys], self.object_cols[keys] = rows, cols
+        self.carried[dropping] = 0
+        if self.observers and keys.size:
+            self.notify("on_drop", dropping, keys, rows, cols)
+
+        # Picks
+        picking = agents[pick]
+        rows, cols = self.rows[picking], self.cols[picking]
+        keys = self.object_grid[rows, cols]
+        self.carried[picking] = keys
+        self.object_grid[rows, cols] = 0
+        self.category_grid[rows, cols] = 0
+        self.object_rows[keys], self.object_cols[keys] = -1, -1
+        if self.observers and keys.size:
+            self.notify("on_pick", picking, keys, rows, cols)
+
+    def notify(self, event, agents, keys, rows, cols):
+        """Notifies the observers of a batch of picks or drops, one call per
+        event, with the same arguments as Environment.on_pick and
+        Environment.on_drop.
+
+        Args:
+            - event (str): "on_pick" or "on_drop".
+
+            - agents (np.ndarray): The indices of the agents.
+
+            - keys (np.ndarray): The keys of the objects.
+
+            - rows (np.ndarray): The rows of the cells.
+
+            - cols (np.ndarray): The columns of the cells.
+        """
+        codes = self.object_category[keys].tolist()
+        events = zip((agents + 1).tolist(), keys.tolist(), codes,
+                     rows.tolist(), cols.tolist())
+        for agent_key, object_key, code, row, col in events:
+            for observer in self.observers:
+                getattr(observer, event)(self, agent_key, object_key,
+                                         code, (row, col))
+
+    def update_memory(self, agents, observed):
+        """Pushes the observed category codes in the memories of the given
+        agents. All the memories are filled at the same pace, so they share
+        their head and length, moved forward by rotate_memory once all the
+        agents have pushed.
+
+        Args:
+            - agents (np.ndarray): The indices (key - 1) of the agents.
+
+            - observed (np.ndarray): One category code per agent.
+        """
+        if self.memory_len == self.memory_buffer_size:
+            oldest = self.memory[agents, self.memory_head]
+            self.memory_counts[agents, oldest] -= 1
+
+        self.memory[agents, self.memory_head] = observed
+        self.memory_counts[agents, observed] += 1
+
+    def rotate_memory(self):
+        """Moves the shared head of the memories forward, after a round."""
+        self.memory_len = min(self.memory_len + 1, self.memory_buffer_size)
+        self.memory_head = (self.memory_head + 1) % self.memory_buffer_size
@@ -2,61 +2,82 @@
 # -*- coding: utf-8 -*-
 
 """
-Module with two helpers functions for visualization purposes.
+Module with two helpers functions for visualization purposes. The coordinates
+of the objects come from the Snapshot of the environment. Above a given
+number of objects on the grid, one marker per object gets too slow to draw,
+and the objects are binned into a raster instead, colored by the dominant
+category of each bin.
 
 @authors: Nathan Etourneau, Paul Flagel
 """
 
 import altair as alt
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
 
+from categories import category_name
+from snapshot import MAX_BINS, RASTER_THRESHOLD, Snapshot, dominant, draw_raster
 
-def update_altair_plot(env):
+
+def scatter_data(snapshot):
+    """Returns a DataFrame with the row, col and category of the objects lying
+    on the grid."""
+    rows, cols, categories = [], [], []
+    for category in snapshot.categories:
+        category_rows, category_cols = snapshot.coordinates(category)
+        rows.append(category_rows)
+        cols.append(category_cols)
+        categories.append(np.full(len(category_rows), category_name(category)))
+    return pd.DataFrame({"row": np.concatenate(rows) if rows else [],
+                         "col": np.concatenate(cols) if cols else [],
+                         "category": np.concatenate(categories) if categories else []})
+
+
+def update_altair_plot(env, raster_threshold=RASTER_THRESHOLD, max_bins=MAX_BINS):
     """Returns an altair plot with the appropriate format."""
-    obj_rows = []
-    obj_cols = []
-    obj_category = []
-    for obj in env.objects.values():
-        if obj.position:
-            row, col = obj.position
-            obj_rows.append(row)
-            obj_cols.append(col)
-            obj_category.append(obj.category)
-
-    data = pd.DataFrame(
-        {"row": obj_rows, "col": obj_cols, "category": obj_category})
-
-    fig = alt.Chart(data).mark_circle().encode(
-        x=alt.X('col', scale=alt.Scale(domain=[0, env.M])),
-        y=alt.Y('row', scale=alt.Scale(domain=[0, env.N])),
-        color=alt.Color('category', legend=None)
+    snapshot = Snapshot.of(env)
+
+    if len(snapshot) <= raster_threshold:
+        fig = alt.Chart(scatter_data(snapshot)).mark_circle().encode(
+            x=alt.X('col', scale=alt.Scale(domain=[0, env.M])),
+            y=alt.Y('row', scale=alt.Scale(domain=[0, env.N])),
+            color=alt.Color('category', legend=None)
+        )
+        return fig
+
+    # One rectangle per non-empty bin, colored by its dominant category,
+    # more opaque as the bin is purer
+    counts, side = snapshot.raster(max_bins)
+    rows, cols = np.nonzero(counts.sum(axis=0))
+    category, purity = dominant(counts)
+    names = [category_name(code) for code in snapshot.categories]
+    data = pd.DataFrame({"row": rows * side, "row2": (rows + 1) * side,
+                         "col": cols * side, "col2": (cols + 1) * side,
+                         "category": [names[int(i)] for i in category[rows, cols]],
+                         "purity": purity[rows, cols]})
+
+    fig = alt.Chart(data).mark_rect().encode(
+        x=alt.X('col', scale=alt.Scale(domain=[0, env.M])), x2='col2',
+        y=alt.Y('row', scale=alt.Scale(domain=[0, env.N])), y2='row2',
+        color=alt.Color('category', legend=None),
+        opacity=alt.Opacity('purity', legend=None)
     )
     return fig
 
 
-def update_matplotlib_plot(env, ax):
+def update_matplotlib_plot(env, ax, raster_threshold=RASTER_THRESHOLD, max_bins=MAX_BINS):
     """Returns a matplotlib figure with the appropriate format."""
     ax.clear()
+    snapshot = Snapshot.of(env)
 
-    obj_rows = []
-    obj_cols = []
-    obj_category = []
-    for obj in env.objects.values():
-        if obj.position is None:
-            continue
-        row, col = obj.position
-
-        obj_rows.append(row)
-        obj_cols.append(col)
-        obj_category.append(obj.category)
-
-    data = pd.DataFrame(
-        {"rows": obj_rows, "cols": obj_cols, "category": obj_category})
+    if len(snapshot) <= raster_threshold:
+        ax = sns.scatterplot(x='col', y='row', data=scatter_data(snapshot),
+                             hue='category', style='category', ec=None)
+    else:
+        draw_raster(ax, snapshot, max_bins)
 
-    ax = sns.scatterplot(x='cols', y='rows', data=data,
-                         hue='category', style='category', ec=None)
     ax.set_xlim(-1, env.M)
     ax.set_ylim(-1, env.N)
     plt.show()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module with a SimulationWorker class, that runs the rounds of an environment in
+a background thread, and publishes rendered frames in a bounded queue at most
+every so many seconds, so that a user interface can follow, pause, resume and
+stop the run without slowing it down. With a RunController, the run stops
+once it has converged, and a frame is only rendered once the layout changed
+enough since the last one.
+
+@authors: Nathan Etourneau, Paul Flagel
+"""
+
+import queue
+import threading
+import time
+
+# Wall-clock seconds between two frames
+FRAME_INTERVAL = 0.5
+
+# Seconds to wait for a stopped worker to finish its round and its callbacks
+STOP_TIMEOUT = 10
+
+# Number of frames waiting for the user interface : when it is late, the
+# oldest frames are dropped
+QUEUE_SIZE = 2
+
+
+class SimulationWorker(threading.Thread):
+    """A SimulationWorker class, a daemon thread that runs an environment up
+    to a given round. A frame is a (round, render(env)) tuple, rendered in the
+    thread of the worker, between two rounds, so that it is consistent."""
+
+    def __init__(self, env, n_rounds, render, after_round=(), at_end=(), interval=FRAME_INTERVAL, queue_size=QUEUE_SIZE, controller=None):
+        """Instanciates a SimulationWorker object. It is started with start.
+
+        Args:
+            - env (Environment or VectorizedEnvironment): The environment.
+
+            - n_rounds (int): The round at which the run ends.
+
+            - render (Callable[[Environment], object]): Renders a frame of the
+            environment.
+
+            - after_round (Iterable[Callable[[Environment], None]], optional):
+            Called after every round. Defaults to ().
+
+            - at_end (Iterable[Callable[[Environment], None]], optional):
+            Called when the run ends or is stopped. Defaults to ().
+
+            - interval (float, optional): Wall-clock seconds between two
+            frames. Defaults to FRAME_INTERVAL.
+
+            - queue_size (int, optional): Size of the queue of frames.
+            Defaults to QUEUE_SIZE.
+
+            - controller (RunController, optional): Stops the run once it has
+            converged, and tells when a frame is worth rendering. It must be
+            an observer of the environment. Defaults to None, for a run up to
+            n_rounds with a frame every interval.
+        """
+        super().__init__(daemon=True)
+        self.env = env
+        self.n_rounds = n_rounds
+        self.render = render
+        self.after_round = list(after_round)
+        self.at_end = list(at_end)
+        self.interval = interval
+        self.controller = controller
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.latest = None
+
+        self.running = threading.Event()
+        self.running.set()
+        self.stopped = threading.Event()
+        self.error = None
+
+    @property
+    def paused(self):
+        return not self.running.is_set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def stop(self):
+        """Stops the run after the current round, even if it is paused."""
+        self.stopped.set()
+        self.running.set()
+
+    def run(self):
+        env = self.env
+        last_frame = 0.
+        try:
+            while env.round < self.n_rounds:
+                if not self.running.is_set():
+                    # The state shown while paused is the current one
+                    self.publish()
+                    self.running.wait()
+                if self.stopped.is_set():
+                    break
+
+                env.step()
+                for callback in self.after_round:
+                    callback(env)
+
+                if self.controller and self.controller.update(env):
+                    break
+
+                if time.monotonic() - last_frame >= self.interval and (
+                        self.controller is None or self.controller.frame_due(env)):
+                    self.publish()
+                    last_frame = time.monotonic()
+        except Exception as error:
+            self.error = error
+        finally:
+            for callback in self.at_end:
+                callback(env)
+            self.publish()
+
+    def publish(self):
+        """Renders a frame and puts it in the queue, dropping the oldest frame
+        if the queue is full."""
+        frame = self.latest = (self.env.round, self.render(self.env))
+        if self.controller:
+            self.controller.frame_drawn(self.env)
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def frames_until_done(self, timeout=0.1):
+        """Yields the frames as they are published, until the run is over and
+        the last frame has been yielded. If no frame is waiting, the latest
+        one is yielded first, so that a new follower has something to show.
+
+        Args:
+            - timeout (float, optional): Seconds between two checks of the end
+            of the run. Defaults to 0.1.
+
+        Yields:
+            tuple[int, object]: The round and the render of the frame.
+        """
+        if self.frames.empty() and self.latest:
+            yield self.latest
+        while self.is_alive() or not self.frames.empty():
+            try:
+                yield self.frames.get(timeout=timeout)
+            except queue.Empty:
+                continue